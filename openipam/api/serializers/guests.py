@@ -3,7 +3,7 @@ from django.utils import timezone
 
 from rest_framework import serializers
 
-from openipam.hosts.models import GuestTicket, Host
+from openipam.hosts.models import GuestTicket
 from openipam.network.models import Lease
 from openipam.api.serializers.base import IPAddressField, MACAddressField
 
@@ -26,17 +26,12 @@ class GuestTicketListCreateSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        instance = GuestTicket()
-        instance.user = User.objects.get(
-            username__iexact=validated_data.get("username")
+        return GuestTicket.objects.issue(
+            user=User.objects.get(username__iexact=validated_data.get("username")),
+            starts=validated_data.get("starts"),
+            ends=validated_data.get("ends"),
+            description=validated_data.get("description"),
         )
-        instance.starts = validated_data.get("starts")
-        instance.ends = validated_data.get("ends")
-        instance.description = validated_data.get("description")
-        instance.set_ticket()
-        instance.save()
-
-        return instance
 
     class Meta:
         model = GuestTicket
@@ -73,22 +68,17 @@ class GuestRegisterSerializer(serializers.Serializer):
             else:
                 data["mac_address"] = lease.host_id
 
-            host_exists = Host.objects.filter(
-                mac=mac_address, expires__gte=timezone.now()
-            ).first()
-            if host_exists:
-                raise serializers.ValidationError(
-                    [
-                        "The MAC Address for this guest is already registered on the network.",
-                        "MAC: %s, IP: %s" % (mac_address, data.get("ip_address")),
-                    ]
-                )
+        # Hosts already registered under the mac are handled by the upsert in
+        # Host.guests.register.
         return data
 
     def validate_ticket(self, value):
-        valid_ticket = GuestTicket.objects.filter(
-            ticket=value, starts__lte=timezone.now(), ends__gte=timezone.now()
-        ).first()
+        now = timezone.now()
+        valid_ticket = (
+            GuestTicket.objects.filter(ticket=value, starts__lte=now, ends__gte=now)
+            .only("user", "starts", "ends")
+            .first()
+        )
 
         if not valid_ticket:
             raise serializers.ValidationError(
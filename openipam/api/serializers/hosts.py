@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models import Manager, Q
 from django.db import connection
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -17,6 +17,7 @@ from openipam.hosts.models import (
     StructuredAttributeValue,
     Disabled,
 )
+from openipam.hosts.loaders import HostPageLoader
 from openipam.network.models import Network, Address, Pool, DhcpGroup
 from openipam.api.serializers.base import (
     MACAddressField,
@@ -49,9 +50,23 @@ class HostBasicListSerializer(serializers.ModelSerializer):
         )
 
 
+class HostListPageSerializer(serializers.ListSerializer):
+    """
+    Loads attributes, disabled flags and owners for the whole page before
+    rendering it, so the page costs the same number of queries at any size.
+    """
+
+    def to_representation(self, data):
+        hosts = list(data.all() if isinstance(data, Manager) else data)
+        self.context["host_loader"] = HostPageLoader(hosts)
+        return super(HostListPageSerializer, self).to_representation(hosts)
+
+
 class HostListSerializer(serializers.ModelSerializer):
     addresses = serializers.SerializerMethodField()
+    master_ip_address = serializers.SerializerMethodField()
     attributes = serializers.SerializerMethodField()
+    owners = serializers.SerializerMethodField()
     disabled_flag = serializers.SerializerMethodField()
     is_disabled = serializers.SerializerMethodField()
 
@@ -62,10 +77,18 @@ class HostListSerializer(serializers.ModelSerializer):
         if not show_attributes:
             self.fields.pop("attributes")
 
+        show_owners = self.context["request"].GET.get("owners", None)
+        if not show_owners:
+            self.fields.pop("owners")
+
+    def get_loader(self, obj):
+        loader = self.context.get("host_loader")
+        return loader if loader is not None else HostPageLoader([obj])
+
     def get_addresses(self, obj):
         addresses = {
             "leased": [
-                str(lease.address)
+                str(lease.address_id)
                 for lease in [x for x in obj.leases.all() if x.ends > timezone.now()]
             ],
             "registered": [str(address.address) for address in obj.addresses.all()],
@@ -76,7 +99,7 @@ class HostListSerializer(serializers.ModelSerializer):
             addresses["registered_detail"].append(
                 {
                     "address": str(address.address),
-                    "network": str(address.network),
+                    "network": str(address.network_id),
                     "pool": address.pool,
                     "reserved": address.reserved,
                 }
@@ -84,31 +107,20 @@ class HostListSerializer(serializers.ModelSerializer):
         return addresses
 
     def get_master_ip_address(self, obj):
-        return obj.master_ip_address
+        return self.get_loader(obj).master_ip_address(obj)
 
     def get_attributes(self, obj):
-        def dictfetchall(cursor):
-            desc = cursor.description
-            return [
-                dict(list(zip([col[0] for col in desc], row)))
-                for row in cursor.fetchall()
-            ]
+        return self.get_loader(obj).attributes(obj)
 
-        c = connection.cursor()
-        c.execute(
-            """
-            SELECT name, value from attributes_to_hosts
-                WHERE mac = %s
-        """,
-            [str(obj.mac)],
-        )
-
-        rows = dictfetchall(c)
-        return rows
+    def get_owners(self, obj):
+        users, groups = self.get_loader(obj).owners(obj)
+        return {"users": users, "groups": groups}
 
     def get_disabled_flag(self, obj):
+        disabled_host = None
         if getattr(obj, "is_disabled", False):
-            disabled_host = obj.disabled_host
+            disabled_host = self.get_loader(obj).disabled(obj)
+        if disabled_host:
             return {
                 "status": True,
                 "reason": disabled_host.reason,
@@ -123,6 +135,7 @@ class HostListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Host
+        list_serializer_class = HostListPageSerializer
         fields = (
             "mac",
             "hostname",
@@ -134,6 +147,7 @@ class HostListSerializer(serializers.ModelSerializer):
             "is_disabled",
             "is_dynamic",
             "attributes",
+            "owners",
             "disabled_flag",
         )
 
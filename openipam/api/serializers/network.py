@@ -131,32 +131,7 @@ class NetworkCreateUpdateSerializer(serializers.ModelSerializer):
         network = Network.objects.filter(network=instance.network).first()
 
         if network:
-            addresses = []
-            for address in network.network:
-                reserved = False
-                if address in (
-                    network.gateway,
-                    network.network[0],
-                    network.network[-1],
-                ):
-                    reserved = True
-                pool = (
-                    DefaultPool.objects.get_pool_default(address)
-                    if not reserved
-                    else None
-                )
-                addresses.append(
-                    # TODO: Need to set pool eventually.
-                    Address(
-                        address=address,
-                        network=network,
-                        reserved=reserved,
-                        pool=pool,
-                        changed_by=self.context["request"].user,
-                    )
-                )
-            if addresses:
-                Address.objects.bulk_create(addresses)
+            Address.objects.populate_network(network, self.context["request"].user)
 
         return instance
 
@@ -6,6 +6,14 @@ Replace this with more appropriate tests for your application.
 """
 
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.urlresolvers import reverse
+from django.db import connection
+
+from rest_framework.test import APIClient
+
+from openipam.hosts.models import Attribute, FreeformAttributeToHost, Disabled
+from openipam.core.tests.test_models import IPAMTestCase
 
 
 class SimpleTest(TestCase):
@@ -14,3 +22,73 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class HostListQueryCountTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            }
+        ]
+        self.dns_domains = [{"name": "valid", "type": "NATIVE"}]
+        self.dns_records = []
+        self.hosts = []
+        self.pools = []
+        self.address_types = []
+
+        super(HostListQueryCountTest, self).setUp()
+
+        self.attribute = Attribute.objects.create(
+            name="asset-tag", changed_by=self.user_model
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user_model)
+
+    def add_hosts(self, start, count):
+        for i in range(start, start + count):
+            host = self._add_host_record(
+                {
+                    "hostname": "host-%s.valid" % i,
+                    "mac": "ffffff0000%02x" % i,
+                    "address": "192.168.0.%s" % (i + 10),
+                },
+                self.user_model,
+            )
+            FreeformAttributeToHost.objects.create(
+                host=host,
+                attribute=self.attribute,
+                value="tag-%s" % i,
+                changed_by=self.user_model,
+            )
+            Disabled.objects.create(
+                mac=host.mac, reason="testing", changed_by=self.user_model
+            )
+            host.assign_owner(self.user_model)
+
+    def get_host_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("api_host_list"), {"attributes": 1, "owners": 1, "limit": 0}
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"], len(queries)
+
+    def test_page_query_count_is_constant(self):
+        self.add_hosts(0, 2)
+        small_page, small_queries = self.get_host_list()
+        self.assertEqual(len(small_page), 2)
+
+        self.add_hosts(2, 18)
+        large_page, large_queries = self.get_host_list()
+        self.assertEqual(len(large_page), 20)
+
+        self.assertEqual(small_queries, large_queries)
+
+        host = large_page[0]
+        self.assertEqual(len(host["attributes"]), 1)
+        self.assertEqual(host["owners"]["users"], [self.user_model.username])
+        self.assertTrue(host["disabled_flag"]["status"])
+        self.assertEqual(host["disabled_flag"]["reason"], "testing")
@@ -3,7 +3,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.db.models import Q
 from django.core.exceptions import ValidationError
-from django.db import DataError
+from django.db import DataError, transaction
+from django.utils.decorators import method_decorator
 
 from rest_framework.views import APIView
 from rest_framework import generics
@@ -25,6 +26,8 @@ from openipam.hosts.models import (
     StructuredAttributeValue,
     Disabled,
 )
+from openipam.hosts.exports import HostExport
+from openipam.dns.models import DnsRecord
 from openipam.network.models import Lease
 from openipam.api.views.base import APIPagination, APIMaxPagination
 from openipam.api.serializers import hosts as host_serializers
@@ -70,10 +73,12 @@ class HostList(generics.ListAPIView):
     * `is_expired` -- 1 or 0 to see expired hosts
     * `ip_address` -- IP Address to filter on
     * `attributes` -- 1 or 0 to show attributes on a host.
+    * `owners` -- 1 or 0 to show the user and group owners of a host.
     * `attribute` -- Name:Value to filter on attributes
     * `limit` -- Number to enforce limit of records, default is 50, 0 shows all records (up to max of 5000).
     * `datetime` -- Date/Time of registered device.
     * `skip_related` -- speed up serialization when only basic host data is required, for faster responses, when set to any non-null value
+    * `export` -- csv or json to stream every matching host as a download, without paging.
 
     **Example**:
 
@@ -90,7 +95,9 @@ class HostList(generics.ListAPIView):
 
     def get_queryset(self):
         if not (self.request.GET.get("skip_related", False)):
-            return Host.objects.prefetch_related("addresses", "leases", "pools").all()
+            return Host.objects.prefetch_related(
+                "addresses", "addresses__pool", "leases", "pools"
+            ).all()
         return Host.objects.all()
 
     def get_serializer_class(self):
@@ -98,6 +105,13 @@ class HostList(generics.ListAPIView):
             return host_serializers.HostListSerializer
         return host_serializers.HostBasicListSerializer
 
+    def list(self, request, *args, **kwargs):
+        export_format = request.GET.get("export")
+        if export_format in HostExport.content_types:
+            queryset = self.filter_queryset(Host.objects.all())
+            return HostExport(queryset).response(export_format)
+        return super(HostList, self).list(request, *args, **kwargs)
+
     # def get_paginate_by(self, queryset=None):
     #     param = self.request.QUERY_PARAMS.get(self.paginate_by_param)
     #     if param and param == '0':
@@ -297,10 +311,17 @@ class HostDelete(generics.DestroyAPIView):
 class HostBulkDelete(APIView):
     """
     Delete hosts from a from a list of mac addresses (mac_addr[])
+
+    Hosts are deleted and committed in batches of `batch_size` (optional).
     """
 
     permission_classes = (IsAuthenticated, IPAMAPIAdminPermission)
 
+    # Each batch commits on its own rather than in one request transaction.
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        return super(HostBulkDelete, self).dispatch(request, *args, **kwargs)
+
     def post(self, request):
         if "mac_addr[]" not in request.data or not len(
             list(filter(lambda x: x, request.data.getlist("mac_addr[]")))
@@ -310,16 +331,29 @@ class HostBulkDelete(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        Host.objects.filter(pk__in=request.data.getlist("mac_addr[]")).delete(
-            request.user
+        try:
+            batch_size = int(request.data.get("batch_size", 0)) or None
+        except ValueError:
+            return Response(
+                {"error": "batch_size must be a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        deleted = Host.objects.filter(pk__in=request.data.getlist("mac_addr[]")).delete(
+            request.user, batch_size=batch_size
         )
 
-        return Response({"success": True}, status=status.HTTP_200_OK)
+        return Response(
+            {"success": True, "deleted": deleted}, status=status.HTTP_200_OK
+        )
 
 
 class BulkFixHostDNSRecords(APIView):
     """
     Attempts to re-populate a list of hosts' DNS records from their mac addresses (mac_addr[])
+
+    Returns, per host, whether its master A/AAAA and PTR records could be
+    repaired and how many records were created, updated and deleted.
     """
 
     permission_classes = (IsAuthenticated, IPAMAPIAdminPermission)
@@ -334,29 +368,12 @@ class BulkFixHostDNSRecords(APIView):
             )
 
         hosts = Host.objects.filter(
-            pk__in=request.data.getlist("mac_addr[]"),
-            dns_records__isnull=True,
-        )
+            pk__in=request.data.getlist("mac_addr[]")
+        ).prefetch_related("addresses", "pools")
 
-        populate_record_status = []
-        for host in hosts:
-            try:
-                dns_records = host.get_dns_records()
-                if dns_records:
-                    for record in dns_records:
-                        record.host = host
-                        record.changed_by = request.user
-                        record.save()
-                    continue
-
-                host.delete_dns_records(user=request.user)
-                host.add_dns_records(user=request.user)
-
-                populate_record_status.append({"mac": str(host.mac), "success": True})
-            except Exception as e:
-                populate_record_status.append(
-                    {"mac": str(host.mac), "success": False, "error": e}
-                )
+        populate_record_status = DnsRecord.objects.reconcile_host_records(
+            hosts, request.user
+        )
 
         return Response(populate_record_status, status=status.HTTP_200_OK)
 
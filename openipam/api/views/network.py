@@ -108,33 +108,7 @@ class IPAMNetwork(APIView):
 
         # Create addresses if network was created, otherwise pass.
         if created:
-            # Create addresses for captive portal network
-            addresses = []
-            for address in network.network:
-                reserved = False
-                if address in (
-                    network.gateway,
-                    network.network[0],
-                    network.network[-1],
-                ):
-                    reserved = True
-                pool = (
-                    DefaultPool.objects.get_pool_default(address)
-                    if not reserved
-                    else None
-                )
-                addresses.append(
-                    # TODO: Need to set pool eventually.
-                    Address(
-                        address=address,
-                        network=network,
-                        reserved=reserved,
-                        pool=pool,
-                        changed_by=user,
-                    )
-                )
-            if addresses:
-                Address.objects.bulk_create(addresses)
+            Address.objects.populate_network(network, user)
 
         return network
 
@@ -15,21 +15,17 @@ from django.db import connection
 from django.db.models.aggregates import Count
 from django.contrib.auth.models import Permission
 from django.apps import apps
-from django.db.models import Q
 from django.utils import timezone
+from django.utils.http import http_date
 from django.contrib.auth import get_user_model
 
-from openipam.hosts.models import Host, Attribute
-from openipam.network.models import Network, Lease, Address
-from openipam.dns.models import DnsRecord
+from openipam.hosts.models import Attribute
 from openipam.conf.ipam_settings import CONFIG
-
-from functools import reduce
+from openipam.report.models import StatRollup
+from openipam.report.stats import get_stats, dashboard_stats
 
 import qsstats
 
-import operator
-
 from datetime import timedelta
 
 import dateutil.parser
@@ -49,8 +45,10 @@ class StatsAPIView(APIView):
         end = request.GET.get("end")
 
         model_klass = apps.get_model(app_label=app, model_name=model)
-        queryset = model_klass.objects.all()
-        qs_stats = qsstats.QuerySetStats(queryset, column, aggregate=Count("pk"))
+        series = StatRollup.objects.get_series(model_klass, column)
+        qs_stats = qsstats.QuerySetStats(
+            model_klass.objects.all(), column, aggregate=Count("pk")
+        )
 
         time_series = []
         if start and end:
@@ -61,22 +59,42 @@ class StatsAPIView(APIView):
                 raise ParseError("'start' and 'end' must be ISO date strings")
             if start >= end:
                 raise ValidationError("'start' must be less than 'end'")
-            if start - end > timedelta(days=31):
+            if end - start > timedelta(days=31):
                 raise ValidationError(
                     "'start' and 'end' must be less than or equal to 31 days apart"
                 )
-            time_series = qs_stats.time_series(start, end)
+            if series:
+                start, end = [
+                    timezone.make_aware(date) if timezone.is_naive(date) else date
+                    for date in (start, end)
+                ]
+            # Older days than the rollups recount are counted live.
+            if series and StatRollup.objects.covers(start):
+                time_series = StatRollup.objects.time_series(series, start, end)
+            else:
+                time_series = qs_stats.time_series(start, end)
 
-        xdata = (
-            ["Today", "This Week", "This Month"]
-            if not (start and end)
-            else [int(x[0].timestamp()) for x in time_series]
-        )
-        ydata = (
-            [qs_stats.this_day(), qs_stats.this_week(), qs_stats.this_month()]
-            if not (start and end)
-            else [x[1] for x in time_series]
-        )
+        if start and end:
+            xdata = [int(x[0].timestamp()) for x in time_series]
+            ydata = [x[1] for x in time_series]
+        else:
+            xdata = ["Today", "This Week", "This Month"]
+            if series:
+                day = timezone.localtime(timezone.now()).replace(
+                    hour=0, minute=0, second=0, microsecond=0
+                )
+                ydata = StatRollup.objects.totals(
+                    series,
+                    day=day,
+                    week=day - timedelta(days=day.weekday()),
+                    month=day.replace(day=1),
+                )
+            else:
+                ydata = [
+                    qs_stats.this_day(),
+                    qs_stats.this_week(),
+                    qs_stats.this_month(),
+                ]
 
         extra_serie1 = {
             "tooltip": {
@@ -107,88 +125,10 @@ class DashboardAPIView(APIView):
     renderer_classes = (BrowsableAPIRenderer, JSONRenderer)
 
     def get(self, request, format=None, **kwargs):
-        wireless_networks = Network.objects.filter(
-            dhcp_group__name__in=["aruba_wireless", "aruba_wireless_eastern"]
-        )
-        wireless_networks_available_qs = [
-            Q(address__net_contained=network.network) for network in wireless_networks
-        ]
-
-        data = (
-            {
-                "name": "All Hosts",
-                "count": Host.objects.all().count(),
-                "tip": "All hosts in openIPAM.",
-            },
-            {
-                "name": "Expired Hosts",
-                "count": Host.objects.filter(expires__lte=timezone.now()).count(),
-                "tip": "All hosts who's expiry date is before today's date.",
-            },
-            {
-                "name": "Static Hosts",
-                "count": Host.objects.filter(
-                    addresses__isnull=False, expires__gte=timezone.now()
-                ).count(),
-                "tip": "Static hosts which are not expired.",
-            },
-            {
-                "name": "Dynamic Hosts",
-                "count": Host.objects.filter(
-                    pools__isnull=True, expires__gte=timezone.now()
-                ).count(),
-                "tip": "Dynamic hosts which are not expired.",
-            },
-            {
-                "name": "Active Leases",
-                "count": Lease.objects.filter(ends__gte=timezone.now()).count(),
-                "tip": "All leases who end in the future.",
-            },
-            {
-                "name": "Abandoned Leases",
-                "count": Lease.objects.filter(abandoned=True).count(),
-                "tip": "Leases that have been abandoned.",
-            },
-            {
-                "name": "Networks: (Total / Wireless)",
-                "count": f"{Network.objects.all().count()} / {wireless_networks.count()}",
-                "tip": "A total of all networks / wireless networks.",
-            },
-            {
-                "name": "Available Wireless Addresses",
-                "count": Address.objects.filter(
-                    reduce(operator.or_, wireless_networks_available_qs),
-                    leases__ends__lt=timezone.now(),
-                ).count(),
-                "tip": "A total of wireless addresses available.",
-            },
-            {
-                "name": "DNS A Records",
-                "count": DnsRecord.objects.filter(
-                    dns_type__name__in=["A", "AAAA"]
-                ).count(),
-                "tip": "Total of all A records.",
-            },
-            {
-                "name": "DNS CNAME Records",
-                "count": DnsRecord.objects.filter(dns_type__name="CNAME").count(),
-                "tip": "Total of all CNAME records.",
-            },
-            {
-                "name": "DNS MX Records",
-                "count": DnsRecord.objects.filter(dns_type__name="MX").count(),
-                "tip": "Total of all MX records.",
-            },
-            {
-                "name": "Active Users Within 1 Year",
-                "count": User.objects.filter(
-                    last_login__gte=(timezone.now() - timedelta(days=365))
-                ).count(),
-                "tip": "Active Users within the last year.",
-            },
-        )
-
-        return Response(data, status=status.HTTP_200_OK)
+        snapshot = get_stats()
+        response = Response(dashboard_stats(snapshot), status=status.HTTP_200_OK)
+        response["Last-Modified"] = http_date(snapshot["as_of"].timestamp())
+        return response
 
 
 class ServerHostCSVRenderer(CSVRenderer):
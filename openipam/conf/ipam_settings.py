@@ -7,6 +7,7 @@ CONFIG_DEFAULTS = {
     "GUEST_GROUP": "guests",
     "GUEST_HOSTNAME_FORMAT": ["g-", ".guests.example.com"],
     "GUEST_POOL": "routable-dynamic",
+    "GUEST_TICKET_POOL_SIZE": 1000,
     "APPS": [
         app.split(".")[1]
         for app in [x for x in settings.INSTALLED_APPS if x.split(".")[0] == "openipam"]
@@ -40,6 +41,21 @@ CONFIG_DEFAULTS = {
     "STATIC_HOST_EXPIRY_THRESHOLD_WEEKS": 5 * 52,
     "DYNAMIC_HOST_EXPIRY_THRESHOLD_WEEKS": 2 * 52,
     "NAC_PROFILE_IS_SERVER_PREFIX": "expose_",
+    "HOST_SEARCH_LIMIT": 1000,
+    "CACHE_VERSION_CHECK_SECONDS": 5,
+    "CACHE_MAX_AGE_SECONDS": 300,
+    "HOST_DELETE_BATCH_SIZE": 500,
+    "DNS_ZONE_EXPORT_DIR": "zones",
+    "DNS_ZONE_DEFAULT_TTL": 14400,
+    "STATS_CACHE_TTL": 300,
+    "STATS_WIRELESS_DHCP_GROUPS": ["aruba_wireless", "aruba_wireless_eastern"],
+    "STATS_ROLLUP_DAYS": 31,
+    "STATS_ROLLUP_SERIES": [
+        ("hosts", "Host", "changed"),
+        ("network", "Lease", "starts"),
+        ("dns", "DnsRecord", "changed"),
+        ("user", "User", "last_login"),
+    ],
 }
 
 USER_CONFIG = getattr(settings, "OPENIPAM", {})
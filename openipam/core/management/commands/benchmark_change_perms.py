@@ -0,0 +1,162 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from guardian.shortcuts import get_objects_for_user
+
+from openipam.dns.models import DnsRecord, Domain
+from openipam.hosts.models import Host, User
+from openipam.network.models import Network
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Compare the guardian materialized and subquery change permission lookups "
+        "for domains, networks and DNS records.  Synthetic object permissions are "
+        "granted in a transaction that is always rolled back."
+    )
+
+    # (app label, model table, pk expression, codename) granted with --synthetic.
+    synthetic_perms = (
+        ("hosts", "hosts", "mac::text", "is_owner_host"),
+        ("dns", "domains", "id::text", "is_owner_domain"),
+        ("network", "networks", "network::text", "is_owner_network"),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("-u", "--user", help="User name to look up objects for")
+        parser.add_argument(
+            "-n",
+            "--synthetic",
+            type=int,
+            default=0,
+            help="Number of hosts, domains and networks to grant the user first",
+        )
+        parser.add_argument(
+            "-r", "--runs", type=int, default=3, help="Number of runs per lookup"
+        )
+
+    def grant_synthetic_perms(self, user, count):
+        cursor = connection.cursor()
+        try:
+            for app_label, table, pk, codename in self.synthetic_perms:
+                cursor.execute(
+                    """
+                    INSERT INTO guardian_userobjectpermission
+                        (object_pk, content_type_id, permission_id, user_id)
+                        SELECT objects.pk, auth_permission.content_type_id,
+                            auth_permission.id, %%(user)s
+                        FROM (SELECT %(pk)s AS pk FROM %(table)s LIMIT %%(count)s) AS objects,
+                            auth_permission
+                        INNER JOIN django_content_type
+                            ON auth_permission.content_type_id = django_content_type.id
+                        WHERE django_content_type.app_label = %%(app_label)s
+                            AND auth_permission.codename = %%(codename)s
+                        ON CONFLICT DO NOTHING
+                """
+                    % {"pk": pk, "table": table},
+                    {
+                        "user": user.pk,
+                        "count": count,
+                        "app_label": app_label,
+                        "codename": codename,
+                    },
+                )
+        finally:
+            cursor.close()
+
+    def legacy_domains(self, user):
+        names = get_objects_for_user(
+            user, ["dns.is_owner_domain", "dns.change_domain"], any_perm=True
+        ).values_list("name", flat=True)
+        return Domain.objects.filter(name__in=list(names))
+
+    def legacy_networks(self, user):
+        networks = get_objects_for_user(
+            user, ["network.is_owner_network", "network.change_network"], any_perm=True
+        ).values_list("pk", flat=True)
+        return Network.objects.filter(network__in=list(networks))
+
+    def legacy_records(self, user):
+        hosts = get_objects_for_user(
+            user, ["hosts.is_owner_host", "hosts.change_host"], any_perm=True
+        )
+        domains = get_objects_for_user(
+            user, ["dns.is_owner_domain", "dns.change_domain"], any_perm=True
+        ).values_list("name", flat=True)
+        networks = get_objects_for_user(
+            user, ["network.is_owner_network", "network.change_network"], any_perm=True
+        ).values_list("network", flat=True)
+        return DnsRecord.objects.filter(
+            Q(ip_content__host__in=[host.mac for host in hosts])
+            | Q(text_content__in=[host.hostname for host in hosts])
+            | Q(ip_content__network__in=networks)
+            | Q(domain__name__in=list(domains))
+        )
+
+    def time_lookup(self, name, lookup, runs):
+        timings = []
+        for run in range(runs):
+            start = time.time()
+            count = len(list(lookup().values_list("pk", flat=True)))
+            timings.append(time.time() - start)
+        self.stdout.write(
+            "%-20s %8d rows  best %.3fs  avg %.3fs"
+            % (name, count, min(timings), sum(timings) / len(timings))
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["user"]).first()
+        if not user:
+            raise CommandError("User does not exist")
+        if user.is_superuser:
+            raise CommandError("Superusers skip the object permission lookups")
+
+        with transaction.atomic():
+            if options["synthetic"]:
+                start = time.time()
+                self.grant_synthetic_perms(user, options["synthetic"])
+                self.stdout.write(
+                    "Granted up to %s hosts, domains and networks in %.2fs"
+                    % (options["synthetic"], time.time() - start)
+                )
+
+            lookups = (
+                (
+                    "domains",
+                    lambda: self.legacy_domains(user),
+                    lambda: Domain.objects.by_change_perms(user),
+                ),
+                (
+                    "networks",
+                    lambda: self.legacy_networks(user),
+                    lambda: Network.objects.by_change_perms(user),
+                ),
+                (
+                    "dns records",
+                    lambda: self.legacy_records(user),
+                    lambda: DnsRecord.objects.by_change_perms(user),
+                ),
+                (
+                    "owned hosts",
+                    lambda: Host.objects.filter(
+                        pk__in=list(
+                            get_objects_for_user(
+                                user,
+                                "hosts.is_owner_host",
+                                use_groups=True,
+                                with_superuser=False,
+                            ).values_list("pk", flat=True)
+                        )
+                    ),
+                    lambda: Host.objects.by_owner(user, use_groups=True),
+                ),
+            )
+            for name, legacy, subquery in lookups:
+                self.time_lookup("%s guardian" % name, legacy, options["runs"])
+                self.time_lookup("%s subquery" % name, subquery, options["runs"])
+
+            transaction.set_rollback(True)
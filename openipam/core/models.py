@@ -39,6 +39,19 @@ class FeatureRequest(models.Model):
         ordering = ("-submitted",)
 
 
+class CacheVersion(models.Model):
+    """Version of an in-process cache, see core.utils.cache_version."""
+
+    key = models.CharField(max_length=255, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return "%s %s" % (self.key, self.version)
+
+    class Meta:
+        db_table = "cache_versions"
+
+
 class FilteredSelectMultiple(forms.SelectMultiple):
     """
     removing 2 select fields widget
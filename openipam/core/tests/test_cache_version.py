@@ -0,0 +1,46 @@
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from openipam.core.utils import cache_version
+from openipam.core.utils.cache_version import (
+    bump_cache_version,
+    changes_pending,
+    get_cache_version,
+    invalidate_on_commit,
+)
+
+
+class CacheVersionTest(TestCase):
+    key = "test_cache_version"
+
+    def setUp(self):
+        cache_version._checked.pop(self.key, None)
+
+    def test_bump_moves_version(self):
+        version = get_cache_version(self.key)
+        bump_cache_version(self.key)
+        self.assertNotEqual(get_cache_version(self.key), version)
+
+    def test_bump_seen_by_other_processes(self):
+        version = get_cache_version(self.key)
+        bump_cache_version(self.key)
+        # Another process only has its own memo, which the bump cannot reach.
+        cache_version._checked[self.key] = (version[0], 0)
+        self.assertNotEqual(get_cache_version(self.key)[0], version[0])
+
+    def test_invalidate_pending_until_commit(self):
+        # TestCase never commits, so the bump stays pending.
+        version = get_cache_version(self.key)
+        invalidate_on_commit(self.key)
+        self.assertTrue(changes_pending(self.key))
+        self.assertEqual(get_cache_version(self.key), version)
+
+    def test_rollback_clears_pending(self):
+        try:
+            with transaction.atomic():
+                invalidate_on_commit(self.key)
+                self.assertTrue(changes_pending(self.key))
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertFalse(changes_pending(self.key))
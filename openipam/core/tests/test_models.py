@@ -1,7 +1,12 @@
+from django.contrib.auth.models import Group, Permission
 from django.test import TestCase
 
-from openipam.hosts.models import Host
+from guardian.shortcuts import assign_perm, get_objects_for_group, get_objects_for_user
+
+from openipam.core.utils.cache_version import reset_cache_versions
+from openipam.hosts.models import Host, OUI
 from openipam.network.models import (
+    DefaultPool,
     Network,
     Address,
     Pool,
@@ -20,6 +25,18 @@ import datetime
 from six import string_types
 
 
+def reset_in_process_caches():
+    """
+    Drops the per-process lookup caches, which outlive the rollback at the
+    end of each test and would otherwise hand out rows it removed.
+    """
+    reset_cache_versions()
+    Domain.objects.reset()
+    DefaultPool.objects.reset()
+    Host.guests.reset()
+    OUI.objects.reset()
+
+
 class IPAMTestCase(TestCase):
     user = {
         "username": "admin",
@@ -84,7 +101,7 @@ class IPAMTestCase(TestCase):
         host = Host.objects.create(changed_by=user, **host)
         if address:
             a_obj = Address.objects.get(address=address)
-            a_obj.mac = host.mac
+            a_obj.host = host
             a_obj.pool = None
             a_obj.save()
         if pool:
@@ -109,6 +126,8 @@ class IPAMTestCase(TestCase):
         return at
 
     def setUp(self):
+        reset_in_process_caches()
+
         user = User.objects.create(**self.user)
         self.user_model = user
 
@@ -129,3 +148,112 @@ class IPAMTestCase(TestCase):
 
         for host in self.hosts:
             self._add_host_record(host.copy(), user)
+
+
+class PermissionLookupMixin(object):
+    """
+    Checks a model's permission lookups against guardian's
+    get_objects_for_user and get_objects_for_group.  Subclasses set model,
+    owner_perm and change_perms, and implement create_objects, owned,
+    owned_by_group and changeable with the lookups under test.
+    """
+
+    model = None
+    owner_perm = None
+    change_perms = None
+
+    def create_objects(self, user):
+        raise NotImplementedError
+
+    def owned(self, user, use_groups):
+        raise NotImplementedError
+
+    def owned_by_group(self, group):
+        raise NotImplementedError
+
+    def changeable(self, user):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.admin = User.objects.create(username="perm-admin", is_superuser=True)
+        self.user = User.objects.create(username="perm-user")
+        self.group = Group.objects.create(name="perm-group")
+        self.objects = self.create_objects(self.admin)
+
+    def refresh(self, user):
+        # Permission caches live on the user instance.
+        return User.objects.get(pk=user.pk)
+
+    def assertSameObjects(self, lookup, expected):
+        self.assertEqual(set(obj.pk for obj in lookup), set(obj.pk for obj in expected))
+
+    def assertOwnedMatches(self, user):
+        for use_groups in (False, True):
+            self.assertSameObjects(
+                self.owned(user, use_groups),
+                get_objects_for_user(
+                    user,
+                    self.owner_perm,
+                    klass=self.model,
+                    use_groups=use_groups,
+                    with_superuser=False,
+                ),
+            )
+
+    def assertChangeableMatches(self, user):
+        self.assertSameObjects(
+            self.changeable(user),
+            get_objects_for_user(
+                user, self.change_perms, klass=self.model, any_perm=True
+            ),
+        )
+
+    def test_user_object_permission(self):
+        assign_perm(self.owner_perm, self.user, self.objects[0])
+        user = self.refresh(self.user)
+
+        self.assertOwnedMatches(user)
+        self.assertChangeableMatches(user)
+        self.assertSameObjects(self.owned(user, False), self.objects[:1])
+
+    def test_group_object_permission(self):
+        assign_perm(self.owner_perm, self.group, self.objects[1])
+        self.user.groups.add(self.group)
+        user = self.refresh(self.user)
+
+        self.assertOwnedMatches(user)
+        self.assertChangeableMatches(user)
+        self.assertSameObjects(self.owned(user, True), self.objects[1:2])
+        self.assertSameObjects(self.owned(user, False), [])
+
+    def test_global_permission(self):
+        app_label, codename = self.change_perms[-1].split(".")
+        self.user.user_permissions.add(
+            Permission.objects.get(content_type__app_label=app_label, codename=codename)
+        )
+        assign_perm(self.owner_perm, self.user, self.objects[0])
+        user = self.refresh(self.user)
+
+        self.assertOwnedMatches(user)
+        self.assertChangeableMatches(user)
+        self.assertSameObjects(self.changeable(user), self.objects)
+
+    def test_superuser_without_superuser(self):
+        assign_perm(self.owner_perm, self.admin, self.objects[2])
+        admin = self.refresh(self.admin)
+
+        self.assertOwnedMatches(admin)
+        self.assertChangeableMatches(admin)
+        self.assertSameObjects(self.owned(admin, False), self.objects[2:])
+
+    def test_group(self):
+        assign_perm(self.owner_perm, self.group, self.objects[0])
+        assign_perm(self.owner_perm, self.group, self.objects[2])
+
+        self.assertSameObjects(
+            self.owned_by_group(self.group),
+            get_objects_for_group(self.group, self.owner_perm, klass=self.model),
+        )
+        self.assertSameObjects(
+            self.owned_by_group(self.group), [self.objects[0], self.objects[2]]
+        )
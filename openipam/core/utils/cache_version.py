@@ -0,0 +1,93 @@
+from django.db import connection, transaction
+
+from openipam.conf.ipam_settings import CONFIG
+
+import time
+
+# key -> (version, time it was read), so each process reads the
+# cache_versions table at most once per CACHE_VERSION_CHECK_SECONDS.
+_checked = {}
+
+
+def get_cache_version(key):
+    """
+    Returns the current version token for key.  In-process caches compare
+    it to the token they loaded with.  Versions live in the cache_versions
+    table, so a bump is seen by every process once it commits, within
+    CACHE_VERSION_CHECK_SECONDS.  The token also rolls over every
+    CACHE_MAX_AGE_SECONDS, so a change made without a bump is picked up
+    within that time.
+    """
+    now = time.time()
+    checked = _checked.get(key)
+    if checked is None or now - checked[1] > CONFIG.get("CACHE_VERSION_CHECK_SECONDS"):
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT version FROM cache_versions WHERE key = %s", [key])
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        checked = _checked[key] = (row[0] if row else 0, now)
+    return checked[0], int(now // CONFIG.get("CACHE_MAX_AGE_SECONDS"))
+
+
+def bump_cache_version(key):
+    """
+    Moves key to a new version, so every process reloads its copy.  The bump
+    is part of the current transaction; callers saving the data the copies
+    are built from defer it with transaction.on_commit.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO cache_versions (key, version) VALUES (%s, 1)
+                ON CONFLICT (key) DO UPDATE SET version = cache_versions.version + 1
+        """,
+            [key],
+        )
+    finally:
+        cursor.close()
+    _checked.pop(key, None)
+
+
+def invalidate_on_commit(key):
+    """
+    Records that the current transaction changed the data cached under key,
+    and bumps its version once the transaction commits.  Until then
+    changes_pending(key) is true on this connection, so in-process copies
+    are built from the transaction's own rows and not kept, and a rollback
+    leaves the kept copy as it was.
+    """
+    if changes_pending(key):
+        return
+
+    def bump():
+        getattr(connection, "pending_cache_versions", {}).pop(key, None)
+        bump_cache_version(key)
+
+    if not hasattr(connection, "pending_cache_versions"):
+        connection.pending_cache_versions = {}
+    connection.pending_cache_versions[key] = bump
+    transaction.on_commit(bump)
+
+
+def changes_pending(key):
+    """Whether the open transaction has changed key's data without committing."""
+    bump = getattr(connection, "pending_cache_versions", {}).get(key)
+    if bump is None:
+        return False
+    # A rollback, of the transaction or the savepoint the change was made
+    # in, discards the callback along with the change.
+    if connection.in_atomic_block and any(
+        func is bump for savepoint_ids, func in connection.run_on_commit
+    ):
+        return True
+    connection.pending_cache_versions.pop(key, None)
+    return False
+
+
+def reset_cache_versions():
+    """Forgets the versions this process has read, for tests."""
+    _checked.clear()
+    getattr(connection, "pending_cache_versions", {}).clear()
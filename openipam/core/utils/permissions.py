@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+
+
+class PermissionSubquery(object):
+    """
+    SQL selecting the objects of model that a user, or a set of groups,
+    holds any of perms on, read straight from guardian's object permission
+    tables.  It is embedded in the query that needs it, so permitted object
+    lists are never loaded into Python and fed back as IN lists.
+
+    perms are "app_label.codename" strings.  For a user, object permissions
+    held through their groups count when use_groups is set, and with
+    with_superuser a superuser, or a user holding one of perms globally,
+    is permitted every object, as with guardian's get_objects_for_user.
+    """
+
+    # Guardian keys object permissions by the primary key as text, compared
+    # against pk::text; hosts back this with the hosts_mac_text_idx index.
+    object_pks_sql = """
+        SELECT uop.object_pk FROM guardian_userobjectpermission AS uop
+            INNER JOIN auth_permission ON uop.permission_id = auth_permission.id
+            INNER JOIN django_content_type
+                ON auth_permission.content_type_id = django_content_type.id
+            WHERE (django_content_type.app_label, auth_permission.codename) IN %s
+                AND uop.user_id = %s
+    """
+
+    group_object_pks_sql = """
+        SELECT gop.object_pk FROM guardian_groupobjectpermission AS gop
+            INNER JOIN auth_permission ON gop.permission_id = auth_permission.id
+            INNER JOIN django_content_type
+                ON auth_permission.content_type_id = django_content_type.id
+            WHERE (django_content_type.app_label, auth_permission.codename) IN %%s
+                AND gop.group_id IN (%s)
+    """
+
+    def __init__(
+        self, model, perms, user=None, groups=None, use_groups=True, with_superuser=True
+    ):
+        self.model = model
+        self.perms = tuple(tuple(perm.split(".", 1)) for perm in perms)
+        self.user = user
+        self.group_ids = [group.pk for group in groups] if groups is not None else None
+        self.use_groups = use_groups
+        self.is_global = bool(
+            user is not None
+            and with_superuser
+            and (user.is_superuser or any(user.has_perm(perm) for perm in perms))
+        )
+
+    @classmethod
+    def for_user_or_group(cls, model, perms, user_or_group, **kwargs):
+        if isinstance(user_or_group, get_user_model()):
+            return cls(model, perms, user=user_or_group, **kwargs)
+        elif isinstance(user_or_group, Group):
+            return cls(model, perms, groups=[user_or_group], **kwargs)
+        else:
+            raise Exception("A valid user or goup must is required.")
+
+    def object_pks(self):
+        """(sql, params) selecting the permitted primary keys as text."""
+        subqueries = []
+        params = []
+        if self.user is not None:
+            subqueries.append(self.object_pks_sql)
+            params += [self.perms, self.user.pk]
+            if self.use_groups:
+                subqueries.append(
+                    self.group_object_pks_sql
+                    % "SELECT group_id FROM users_groups WHERE user_id = %s"
+                )
+                params += [self.perms, self.user.pk]
+        elif self.group_ids:
+            subqueries.append(
+                self.group_object_pks_sql % ", ".join(["%s"] * len(self.group_ids))
+            )
+            params += [self.perms] + self.group_ids
+        else:
+            return "SELECT NULL::text WHERE FALSE", []
+        return " UNION ".join(subqueries), params
+
+    def pks(self):
+        """(sql, params) selecting the permitted primary keys."""
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        sql = "SELECT %s FROM %s" % (quote(opts.pk.column), quote(opts.db_table))
+        if self.is_global:
+            return sql, []
+        object_pks, params = self.object_pks()
+        return (
+            "%s WHERE %s::text IN (%s)" % (sql, quote(opts.pk.column), object_pks),
+            params,
+        )
+
+    def condition(self, column=None):
+        """
+        (sql, params) for a WHERE condition that column, which refers to
+        model, is a permitted object.  Without column, the condition is on
+        model's own primary key.
+        """
+        if column is None:
+            if self.is_global:
+                return "TRUE", []
+            quote = connection.ops.quote_name
+            opts = self.model._meta
+            object_pks, params = self.object_pks()
+            return (
+                "%s.%s::text IN (%s)"
+                % (quote(opts.db_table), quote(opts.pk.column), object_pks),
+                params,
+            )
+        pks, params = self.pks()
+        return "%s IN (%s)" % (column, pks), params
+
+    def filter(self, qs, column=None):
+        """qs limited to rows whose column, by default its pk, is permitted."""
+        if column is None and self.is_global:
+            return qs.all()
+        sql, params = self.condition(column)
+        return qs.extra(where=[sql], params=params)
+
+
+def filter_by_any(qs, conditions):
+    """qs limited to rows matching any of the (sql, params) conditions."""
+    params = []
+    for sql, condition_params in conditions:
+        params += condition_params
+    return qs.extra(
+        where=["(%s)" % " OR ".join(sql for sql, condition_params in conditions)],
+        params=params,
+    )
@@ -21,6 +21,7 @@ from django.utils.functional import Promise
 from django.utils.translation import ugettext as _
 from django.utils.cache import add_never_cache_headers
 from django.views.generic.base import TemplateView
+from django.db import connection
 from django.db.utils import DataError
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -34,6 +35,7 @@ from openipam.conf.ipam_settings import CONFIG
 
 import duo_web
 
+import hashlib
 import os
 import random
 import sys
@@ -335,10 +337,47 @@ class BaseDatatableView(JSONResponseMixin, TemplateView):
     columns = []
     order_columns = []
     max_display_length = 100  # max limit of records returned, do not allow to kill our server by huge sets of data
+    # Unfiltered counts the planner expects to be larger than this are
+    # estimated instead of counted, None always counts.
+    estimate_count_above = None
+    count_estimated = False
+    total_estimated = False
+    # Request parameters, besides the column searches, that filter_queryset
+    # narrows the rows by.  Views that estimate must list all of them.
+    search_params = ()
 
     def initialize(*args, **kwargs):
         pass
 
+    def count_records(self, qs):
+        """qs.count(), or the planner's row estimate for large results"""
+        self.count_estimated = False
+        if self.estimate_count_above is None:
+            return qs.count()
+
+        sql, params = qs.order_by().query.sql_with_params()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+        if estimate <= self.estimate_count_above:
+            return qs.count()
+        self.count_estimated = True
+        return estimate
+
+    def is_filtered(self):
+        """Whether the request asks filter_queryset to narrow the rows"""
+        return any(
+            column.get("search", {}).get("value")
+            for column in self.json_data.get("columns", [])
+        ) or any(self.json_data.get(param) for param in self.search_params)
+
     def get_order_columns(self):
         """Return list of columns used for ordering"""
         return self.order_columns
@@ -422,12 +461,20 @@ class BaseDatatableView(JSONResponseMixin, TemplateView):
             qs = self.get_initial_queryset()
 
             # number of records before filtering
-            records_total = qs.count()
+            records_total = self.count_records(qs)
+            self.total_estimated = self.count_estimated
 
             qs = self.filter_queryset(qs)
 
-            # number of records after filtering
-            records_filtered = qs.count()
+            # number of records after filtering.  Searches are counted
+            # exactly, the count is shown and paged on, and only views that
+            # estimate skip counting the rows of an unfiltered request again.
+            if self.estimate_count_above is None or self.is_filtered():
+                records_filtered = qs.count()
+                self.count_estimated = False
+            else:
+                records_filtered = records_total
+            self.records_filtered = records_filtered
 
             qs = self.ordering(qs)
             qs = self.paging(qs)
@@ -439,6 +486,8 @@ class BaseDatatableView(JSONResponseMixin, TemplateView):
                 "draw": int(self.json_data.get("draw", 0)),
                 "recordsTotal": records_total,
                 "recordsFiltered": records_filtered,
+                "recordsEstimated": self.count_estimated,
+                "recordsTotalEstimated": self.total_estimated,
                 "data": data,
             }
         except (ValidationError, DataError):
@@ -450,3 +499,105 @@ class BaseDatatableView(JSONResponseMixin, TemplateView):
             }
 
         return ret
+
+
+class SeekPagingMixin(object):
+    """
+    Datatables paging that seeks past the last row of the previous page
+    when the client walks the list in order of one of seek_columns, and
+    scans from the far end for pages past the middle, so deep pages avoid
+    large OFFSETs.  Rows are ordered with the primary key breaking ties,
+    so a seek key is the last row's column value and primary key.
+    """
+
+    # Columns that pages can be sought on, by datatables column index.
+    seek_columns = {}
+    # Request parameters, besides the column searches, that filter rows.
+    seek_filter_params = ()
+    next_seek = None
+
+    def ordering(self, qs):
+        qs = super(SeekPagingMixin, self).ordering(qs)
+        # Break ties on pk so forward and reverse scans agree on row order.
+        order_by = list(qs.query.order_by)
+        pk_name = qs.model._meta.pk.name
+        if order_by and order_by[-1].lstrip("-") not in ("pk", pk_name):
+            direction = "-" if order_by[-1].startswith("-") else ""
+            qs = qs.order_by(*(order_by + [direction + pk_name]))
+        return qs
+
+    def get_seek_filter(self):
+        # A seek key is only valid for the filters it was taken under.
+        return hashlib.md5(
+            json.dumps(
+                [[c["search"]["value"] for c in self.json_data.get("columns", [])]]
+                + [self.json_data.get(param) for param in self.seek_filter_params]
+            ).encode()
+        ).hexdigest()
+
+    def seek(self, qs, field, descending, key):
+        """Rows of qs after key, a (field value, pk) pair, in (field, pk) order."""
+        opts = qs.model._meta
+        if field in ("pk", opts.pk.name):
+            return qs.filter(**{"pk__%s" % ("lt" if descending else "gt"): key[1]})
+
+        quote = connection.ops.quote_name
+        return qs.extra(
+            where=[
+                "(%(table)s.%(column)s, %(table)s.%(pk)s) %(op)s (%%s, %%s)"
+                % {
+                    "table": quote(opts.db_table),
+                    "column": quote(opts.get_field(field).column),
+                    "pk": quote(opts.pk.column),
+                    "op": "<" if descending else ">",
+                }
+            ],
+            params=key,
+        )
+
+    def paging(self, qs):
+        limit = min(int(self.json_data.get("length", 10)), self.max_display_length)
+        if limit == -1:
+            return qs
+        start = int(self.json_data.get("start", 0))
+        total = self.records_filtered
+
+        order_data = self.json_data.get("order", [])
+        seek_field = None
+        if len(order_data) == 1:
+            seek_order = [order_data[0]["column"], order_data[0]["dir"]]
+            seek_field = self.seek_columns.get(seek_order[0])
+            seek_filter = self.get_seek_filter()
+
+        seek = self.json_data.get("seek") or {}
+        if (
+            seek_field
+            and seek.get("start") == start
+            and seek.get("order") == seek_order
+            and seek.get("filter") == seek_filter
+            and seek.get("key")
+        ):
+            rows = list(
+                self.seek(qs, seek_field, seek_order[1] == "desc", seek["key"])[:limit]
+            )
+        elif start > total // 2 and qs.ordered and not self.count_estimated:
+            end = min(start + limit, total)
+            rows = list(qs.reverse()[total - end : max(total - start, 0)])
+            rows.reverse()
+        else:
+            rows = list(qs[start : start + limit])
+
+        if seek_field and rows:
+            self.next_seek = {
+                "start": start + len(rows),
+                "order": seek_order,
+                "filter": seek_filter,
+                "key": [str(getattr(rows[-1], seek_field)), str(rows[-1].pk)],
+            }
+        return rows
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(SeekPagingMixin, self).get_context_data(*args, **kwargs)
+        if self.next_seek:
+            context["seek"] = self.next_seek
+        return context
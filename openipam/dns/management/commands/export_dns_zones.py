@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from openipam.dns.zones import ZoneExporter
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Write BIND zone files for the domains whose records changed since the "
+        "last export, e.g. hourly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir", help="Directory for the zone files (DNS_ZONE_EXPORT_DIR)"
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            default=False,
+            help="Export every zone, changed or not.",
+        )
+        parser.add_argument(
+            "--diffs",
+            action="store_true",
+            default=False,
+            help="Also write the records removed and added in each changed zone.",
+        )
+        parser.add_argument(
+            "--domain",
+            action="append",
+            dest="domains",
+            help="Only consider this domain, may be given more than once.",
+        )
+
+    def handle(self, *args, **options):
+        exporter = ZoneExporter(
+            output_dir=options["output_dir"], diffs=options["diffs"]
+        )
+        stats = exporter.export(full=options["full"], names=options["domains"])
+        for name, reason in stats["skipped"]:
+            self.stdout.write("Skipped %s: %s" % (name, reason))
+        self.stdout.write(
+            "Exported %(exported)s of %(changed)s changed zones (%(zones)s checked) "
+            "in %(seconds).2fs" % stats
+        )
@@ -2,60 +2,53 @@ from django.db.models import Manager, Q
 from django.core.exceptions import ValidationError
 from django.db.models.query import QuerySet
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import Group
 from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
 from django.contrib.contenttypes.models import ContentType
 from django.utils.encoding import force_text
 from django.core.cache import cache
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
 
-from functools import reduce
+from openipam.core.utils.cache_version import (
+    changes_pending,
+    get_cache_version,
+    invalidate_on_commit,
+)
+from openipam.core.utils.permissions import PermissionSubquery, filter_by_any
 
-from guardian.shortcuts import get_objects_for_user, get_objects_for_group
+from collections import defaultdict
 
-import operator
+from netaddr import EUI
 
+import copy
 
-class DomainQuerySet(QuerySet):
-    def can_view(self, user, use_groups=False, ids_only=False, names_only=False):
-        # Temporarily set superuser to false so we can get only permission relations
-        User = get_user_model()
-        perm_user = User.objects.get(pk=user.pk)
 
-        domains = get_objects_for_user(
-            perm_user, "dns.view_domain", use_groups=use_groups, with_superuser=False
+class DomainQuerySet(QuerySet):
+    def _domain_perms(self, user_or_group, perms, **kwargs):
+        return PermissionSubquery.for_user_or_group(
+            self.model, perms, user_or_group, **kwargs
         )
 
+    def _as_requested(self, qs, ids_only=False, names_only=False):
         if names_only:
-            domain_names = [domain.name for domain in domains]
-            return tuple(domain_names)
-
+            return tuple(qs.values_list("name", flat=True))
         if ids_only:
-            domain_names = [domain.pk for domain in domains]
-            return tuple(domains)
-        else:
-            return domains
-
-    def by_owner(self, user, use_groups=False, ids_only=False, names_only=False):
-        # Temporarily set superuser to false so we can get only permission relations
-        User = get_user_model()
-        perm_user = User.objects.get(pk=user.pk)
-
-        domains = get_objects_for_user(
-            perm_user,
-            "dns.is_owner_domain",
-            use_groups=use_groups,
-            with_superuser=False,
-        )
+            return tuple(qs.values_list("pk", flat=True))
+        return qs
 
-        if names_only:
-            domain_names = [domain.name for domain in domains]
-            return tuple(domain_names)
+    def can_view(self, user, use_groups=False, ids_only=False, names_only=False):
+        # Only object permission relations, whether or not user is a superuser.
+        domains = self._domain_perms(
+            user, ["dns.view_domain"], use_groups=use_groups, with_superuser=False
+        ).filter(self)
+        return self._as_requested(domains, ids_only=ids_only, names_only=names_only)
 
-        if ids_only:
-            domain_names = [domain.pk for domain in domains]
-            return tuple(domains)
-        else:
-            return domains
+    def by_owner(self, user, use_groups=False, ids_only=False, names_only=False):
+        # Only object permission relations, whether or not user is a superuser.
+        domains = self._domain_perms(
+            user, ["dns.is_owner_domain"], use_groups=use_groups, with_superuser=False
+        ).filter(self)
+        return self._as_requested(domains, ids_only=ids_only, names_only=names_only)
 
     def by_change_perms(self, user_or_group, pk=None, ids_only=False, names_only=False):
         User = get_user_model()
@@ -70,31 +63,14 @@ class DomainQuerySet(QuerySet):
             else:
                 return self.all()
         else:
-            if isinstance(user_or_group, User):
-                get_objects_for_user_or_group = get_objects_for_user
-            elif isinstance(user_or_group, Group):
-                get_objects_for_user_or_group = get_objects_for_group
-            else:
-                raise Exception("A valid user or goup must is required.")
-
-            domain_perms = get_objects_for_user_or_group(
-                user_or_group,
-                ["dns.is_owner_domain", "dns.change_domain"],
-                any_perm=True,
-            ).values_list("name", flat=True)
-
-            qs = self.filter(name__in=list(domain_perms))
+            qs = self._domain_perms(
+                user_or_group, ["dns.is_owner_domain", "dns.change_domain"]
+            ).filter(self)
 
             if pk:
-                qs = qs.filter(pk=pk).first()
+                return qs.filter(pk=pk).first()
 
-            if names_only:
-                return tuple([domain.name for domain in qs])
-
-            if ids_only:
-                return tuple([domain.pk for domain in qs])
-            else:
-                return qs
+            return self._as_requested(qs, ids_only=ids_only, names_only=names_only)
 
     def by_dns_change_perms(self, user, pk=None):
         if user.has_perm("dns.change_domain") or user.has_perm("dns.is_owner_domain"):
@@ -104,17 +80,14 @@ class DomainQuerySet(QuerySet):
             else:
                 return self.all()
         else:
-            domain_perms = get_objects_for_user(
+            qs = self._domain_perms(
                 user,
                 [
                     "dns.is_owner_domain",
                     "dns.add_records_to_domain",
                     "dns.change_domain",
                 ],
-                any_perm=True,
-            ).values_list("name", flat=True)
-
-            qs = self.filter(name__in=list(domain_perms))
+            ).filter(self)
 
             if pk:
                 qs = qs.filter(pk=pk).first()
@@ -122,8 +95,72 @@ class DomainQuerySet(QuerySet):
             return qs
 
 
+class DomainManager(Manager):
+    """
+    Resolves names to their most specific domain against an in-process trie
+    of domain names, keyed by reversed labels, so "a.b.example.com" walks
+    com -> example -> b -> a.  The trie is rebuilt from one query when its
+    version moves, which domain saves and deletes do once they commit (see
+    core.utils.cache_version).  A save drops this process's trie at once,
+    and until the change commits lookups use a trie of the transaction's
+    own rows that is not kept.
+    """
+
+    version_key = "ipam_domain_trie_version"
+    _trie = {"version": None, "root": {}}
+
+    def invalidate(self):
+        self.reset()
+        invalidate_on_commit(self.version_key)
+
+    def reset(self):
+        self._trie.update(version=None, root={})
+
+    def _build_trie(self):
+        root = {}
+        for domain in self.get_queryset():
+            node = root
+            for label in reversed(domain.name.lower().split(".")):
+                node = node.setdefault(label, {})
+            node[None] = domain
+        return root
+
+    def _get_trie(self):
+        if changes_pending(self.version_key):
+            return self._build_trie()
+        version = get_cache_version(self.version_key)
+        trie = self._trie
+        if trie["version"] != version:
+            trie.update(version=version, root=self._build_trie())
+        return trie["root"]
+
+    @staticmethod
+    def _longest_match(root, name):
+        node = root
+        domain = None
+        for label in reversed(name.strip().lower().split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            domain = node.get(None, domain)
+        # Callers may change what they get, so hand out copies.
+        return copy.copy(domain) if domain else None
+
+    def resolve_many(self, names):
+        """Returns a dict of each name to its most specific domain, or None."""
+        root = self._get_trie()
+        return dict((name, self._longest_match(root, name)) for name in set(names))
+
+    def resolve(self, name):
+        return self.resolve_many([name])[name]
+
+
 class DNSQuerySet(QuerySet):
     def by_change_perms(self, user_or_group, pk=None, ids_only=False):
+        from openipam.dns.models import Domain
+        from openipam.hosts.models import Host
+        from openipam.network.models import Network
+
         User = get_user_model()
 
         if isinstance(user_or_group, User) and user_or_group.has_perm(
@@ -135,47 +172,47 @@ class DNSQuerySet(QuerySet):
             else:
                 return self.all()
         else:
-            if isinstance(user_or_group, User):
-                get_objects_for_user_or_group = get_objects_for_user
-            elif isinstance(user_or_group, Group):
-                get_objects_for_user_or_group = get_objects_for_group
-            else:
-                raise Exception("A valid user or goup must is required.")
-
-            host_perms = get_objects_for_user_or_group(
+            host_pks, host_params = PermissionSubquery.for_user_or_group(
+                Host, ["hosts.is_owner_host", "hosts.change_host"], user_or_group
+            ).pks()
+            network_pks, network_params = PermissionSubquery.for_user_or_group(
+                Network,
+                ["network.is_owner_network", "network.change_network"],
                 user_or_group,
-                ["hosts.is_owner_host", "hosts.change_host"],
-                any_perm=True,
+            ).pks()
+            domains = PermissionSubquery.for_user_or_group(
+                Domain, ["dns.is_owner_domain", "dns.change_domain"], user_or_group
             )
-            host_perms_mac_list = [host.mac for host in host_perms]
-            host_perms_name_list = [host.hostname for host in host_perms]
-            domain_perms = get_objects_for_user_or_group(
-                user_or_group,
-                ["dns.is_owner_domain", "dns.change_domain"],
-                any_perm=True,
-            ).values_list("name", flat=True)
-            network_perms = get_objects_for_user_or_group(
-                user_or_group,
-                ["network.is_owner_network", "network.change_network"],
-                any_perm=True,
-            ).values_list("network", flat=True)
 
-            qs = self.filter(
-                Q(ip_content__host__in=host_perms_mac_list)
-                | Q(text_content__in=host_perms_name_list)
-                | Q(ip_content__network__in=network_perms)
+            # Records on the hosts' addresses, pointing at the hosts' names,
+            # on addresses in the networks, or in the domains.
+            qs = filter_by_any(
+                self,
+                [
+                    (
+                        "dns_records.ip_content IN "
+                        "(SELECT address FROM addresses WHERE mac IN (%s))" % host_pks,
+                        host_params,
+                    ),
+                    (
+                        "dns_records.text_content IN "
+                        "(SELECT hostname FROM hosts WHERE mac IN (%s))" % host_pks,
+                        host_params,
+                    ),
+                    (
+                        "dns_records.ip_content IN "
+                        "(SELECT address FROM addresses WHERE network IN (%s))"
+                        % network_pks,
+                        network_params,
+                    ),
+                    domains.condition("dns_records.did"),
+                ],
             )
 
-            domain_q_list = [Q(domain__name=domain) for domain in domain_perms]
-            if domain_q_list:
-                domain_qs = self.filter(reduce(operator.or_, domain_q_list))
-                qs = qs | domain_qs
-
             if pk:
-                qs = qs.filter(mac=pk)
-                return qs[0] if qs else None
+                return qs.filter(pk=pk).first()
             elif ids_only:
-                return tuple([dnsrecord.pk for dnsrecord in qs])
+                return tuple(qs.values_list("pk", flat=True))
             else:
                 return qs
 
@@ -191,10 +228,20 @@ class DnsManager(Manager):
         ttl=None,
         record=None,
         domain=None,
+        validation_context=None,
     ):
+        """
+        Adds or updates one record.  Pass a DnsRecordContext for the user as
+        validation_context to share permission and lookup loads between
+        many calls, see bulk_add_or_update_records.
+        """
         from openipam.network.models import Address
         from openipam.hosts.models import Host
         from openipam.dns.validators import validate_fqdn
+        from openipam.dns.validation import DnsRecordContext
+
+        if validation_context is None:
+            validation_context = DnsRecordContext(user)
 
         try:
             if name:
@@ -224,7 +271,7 @@ class DnsManager(Manager):
                 raise ValidationError("Content is required to create a DNS record.")
 
             if dns_record.dns_type.is_a_record:
-                address = Address.objects.select_related("host").get(address=content)
+                address = validation_context.get_address(content)
                 dns_record.ip_content = address
                 dns_record.host = dns_record.ip_content.host
             else:
@@ -254,6 +301,8 @@ class DnsManager(Manager):
             else:
                 dns_record.set_domain_from_name()
 
+            validation_context.add_host(dns_record.host)
+            dns_record.validation_context = validation_context
             dns_record.full_clean()
 
             dns_record.save()
@@ -275,6 +324,309 @@ class DnsManager(Manager):
         except Address.DoesNotExist:
             raise ValidationError("Static IP does not exist for content: %s" % content)
 
+    def bulk_add_or_update_records(self, user, records):
+        """
+        Adds or updates many records for one user.  records is a list of
+        dicts of add_or_update_record arguments.  Permissions, addresses and
+        A record names are loaded once for the batch, every record is
+        validated, and either all are saved or a ValidationError listing
+        each failure is raised.  Returns [(record, created), ...].
+        """
+        from openipam.dns.validation import DnsRecordContext
+
+        context = DnsRecordContext(
+            user, hosts=[record.get("host") for record in records]
+        )
+        typed = [record for record in records if record.get("dns_type") is not None]
+        context.load_addresses(
+            record["content"]
+            for record in typed
+            if record["dns_type"].is_a_record and record.get("content")
+        )
+        context.load_a_record_names(
+            record["content"]
+            for record in typed
+            if record["dns_type"].name in ["HINFO", "SSHFP"] and record.get("content")
+        )
+
+        results = []
+        errors = []
+        with transaction.atomic():
+            for record in records:
+                try:
+                    results.append(
+                        self.add_or_update_record(
+                            user=user, validation_context=context, **record
+                        )
+                    )
+                except ValidationError as e:
+                    errors.extend(
+                        "%s: %s" % (record.get("name"), message)
+                        for message in e.messages
+                    )
+            if errors:
+                raise ValidationError(errors)
+        return results
+
+    # Writes many record changes in one statement, see reconcile_host_records.
+    update_records_sql = """
+        UPDATE dns_records
+        SET tid = updated.tid,
+            text_content = updated.text_content,
+            ip_content = updated.ip_content::inet,
+            mac = updated.mac::macaddr,
+            changed = %s,
+            changed_by = %s
+        FROM unnest(%s::integer[], %s::integer[], %s::text[], %s::text[], %s::text[])
+            AS updated(id, tid, text_content, ip_content, mac)
+        WHERE dns_records.id = updated.id
+    """
+
+    # Hosts applied per savepoint by reconcile_host_records.
+    reconcile_chunk_size = 500
+
+    def reconcile_host_records(self, hosts, user):
+        """
+        Brings the master A/AAAA and PTR records of many static hosts in line
+        with their addresses in a fixed number of queries.  Matching records
+        are linked to their host, wrong ones are updated in place, missing
+        ones are bulk created, and records a host keeps for addresses it no
+        longer has are deleted.  Changes are applied in chunks of hosts, and
+        a chunk that fails is retried host by host, so a failing host gets
+        success False and its error while the others still apply.  Returns
+        a status dict per host.
+        """
+        from openipam.dns.models import Domain, DnsType
+        from openipam.hosts.loaders import HostPageLoader
+
+        hosts = list(hosts)
+        loader = HostPageLoader(hosts)
+        ptr_type = DnsType.objects.PTR
+        a_types = {4: DnsType.objects.A, 6: DnsType.objects.AAAA}
+        a_type_ids = set(dns_type.pk for dns_type in a_types.values())
+
+        statuses = {}
+        wanted = {}
+        for host in hosts:
+            key = loader.key(host)
+            statuses[key] = {
+                "mac": str(host.mac),
+                "success": True,
+                "created": 0,
+                "updated": 0,
+                "deleted": 0,
+            }
+            if not host.is_static:
+                continue
+            master = loader.master_ip_address(host)
+            address = next(
+                (a for a in host.addresses.all() if str(a.address) == master), None
+            )
+            if address is None:
+                statuses[key].update(
+                    success=False, error="Host %s has no address." % host.hostname
+                )
+                continue
+            wanted[key] = (host, address)
+
+        names = set()
+        for host, address in wanted.values():
+            names.update([host.hostname, address.address.reverse_pointer])
+        domains = Domain.objects.resolve_many(names)
+
+        existing = self.filter(
+            dns_type__in=[ptr_type] + list(a_types.values()), dns_view__isnull=True
+        ).filter(Q(host__in=list(wanted)) | Q(name__in=names))
+        by_name = defaultdict(list)
+        by_host = defaultdict(list)
+        for record in existing:
+            by_name[record.name].append(record)
+            if record.host_id:
+                by_host[EUI(record.host_id)].append(record)
+
+        creates = []
+        updates = {}
+        deletes = {}
+        for key, (host, address) in wanted.items():
+            status = statuses[key]
+            ptr_name = address.address.reverse_pointer
+            a_type = a_types[address.address.version]
+
+            bad_domains = [
+                name
+                for name in (ptr_name, host.hostname)
+                if not domains.get(name) or domains[name].type == "SLAVE"
+            ]
+            if bad_domains:
+                status.update(
+                    success=False,
+                    error="No authoritative domain for %s." % ", ".join(bad_domains),
+                )
+                continue
+
+            kept = set()
+
+            ptrs = [r for r in by_name[ptr_name] if r.dns_type_id == ptr_type.pk]
+            if ptrs:
+                record = ptrs[0]
+                if (
+                    record.text_content != host.hostname
+                    or not record.host_id
+                    or (EUI(record.host_id) != key)
+                ):
+                    record.text_content = host.hostname
+                    record.host_id = host.mac
+                    updates[record.pk] = (key, record)
+                kept.add(record.pk)
+            else:
+                creates.append(
+                    (
+                        key,
+                        self.model(
+                            name=ptr_name,
+                            domain=domains[ptr_name],
+                            dns_type=ptr_type,
+                            text_content=host.hostname,
+                            host_id=host.mac,
+                            changed_by=user,
+                        ),
+                    )
+                )
+
+            arecords = [
+                r for r in by_name[host.hostname] if r.dns_type_id in a_type_ids
+            ]
+            record = next(
+                (r for r in arecords if r.ip_content_id == address.address), None
+            ) or next(
+                (r for r in arecords if r.host_id and EUI(r.host_id) == key), None
+            )
+            if record:
+                if (
+                    record.ip_content_id != address.address
+                    or record.dns_type_id != a_type.pk
+                    or not record.host_id
+                    or EUI(record.host_id) != key
+                ):
+                    record.ip_content_id = address.address
+                    record.dns_type_id = a_type.pk
+                    record.host_id = host.mac
+                    updates[record.pk] = (key, record)
+                kept.add(record.pk)
+            else:
+                creates.append(
+                    (
+                        key,
+                        self.model(
+                            name=host.hostname,
+                            domain=domains[host.hostname],
+                            dns_type=a_type,
+                            ip_content_id=address.address,
+                            host_id=host.mac,
+                            changed_by=user,
+                        ),
+                    )
+                )
+
+            # Records left on addresses the host no longer has.
+            ptr_names = set(a.address.reverse_pointer for a in host.addresses.all())
+            addresses = set(a.address for a in host.addresses.all())
+            for record in by_host[key]:
+                if record.pk in kept or record.pk in updates:
+                    continue
+                if (
+                    record.dns_type_id == ptr_type.pk and record.name not in ptr_names
+                ) or (
+                    record.dns_type_id in a_type_ids
+                    and record.ip_content_id not in addresses
+                ):
+                    deletes[record.pk] = key
+
+        now = timezone.now()
+        content_type = ContentType.objects.get_for_model(self.model)
+
+        def apply(keys):
+            """Applies the changes planned for the hosts in keys in one savepoint."""
+            host_deletes = [pk for pk, key in deletes.items() if key in keys]
+            host_updates = [
+                (key, record) for key, record in updates.values() if key in keys
+            ]
+            host_creates = [(key, record) for key, record in creates if key in keys]
+
+            with transaction.atomic():
+                if host_deletes:
+                    stale = self.filter(pk__in=host_deletes)
+                    stale.update(changed=now, changed_by=user)
+                    stale.delete()
+
+                if host_updates:
+                    records = [record for key, record in host_updates]
+                    cursor = connection.cursor()
+                    try:
+                        cursor.execute(
+                            self.update_records_sql,
+                            [
+                                now,
+                                user.pk,
+                                [record.pk for record in records],
+                                [record.dns_type_id for record in records],
+                                [record.text_content for record in records],
+                                [
+                                    str(record.ip_content_id)
+                                    if record.ip_content_id
+                                    else None
+                                    for record in records
+                                ],
+                                [str(record.host_id) for record in records],
+                            ],
+                        )
+                    finally:
+                        cursor.close()
+
+                created = self.bulk_create([record for key, record in host_creates])
+
+                LogEntry.objects.bulk_create(
+                    [
+                        LogEntry(
+                            action_time=now,
+                            user_id=user.pk,
+                            content_type_id=content_type.pk,
+                            object_id=str(record.pk),
+                            object_repr=force_text(record)[:200],
+                            action_flag=action_flag,
+                            change_message="",
+                        )
+                        for action_flag, records in (
+                            (ADDITION, created),
+                            (CHANGE, [record for key, record in host_updates]),
+                        )
+                        for record in records
+                    ]
+                )
+
+            for pk in host_deletes:
+                statuses[deletes[pk]]["deleted"] += 1
+            for key, record in host_updates:
+                statuses[key]["updated"] += 1
+            for key, record in host_creates:
+                statuses[key]["created"] += 1
+
+        planned = [key for key in wanted if statuses[key]["success"]]
+        for start in range(0, len(planned), self.reconcile_chunk_size):
+            chunk = set(planned[start : start + self.reconcile_chunk_size])
+            try:
+                apply(chunk)
+            except DatabaseError:
+                # Retry host by host, so a conflicting record, say one
+                # created concurrently, only fails its own host.
+                for key in chunk:
+                    try:
+                        apply(set([key]))
+                    except DatabaseError as e:
+                        statuses[key].update(success=False, error=str(e).strip())
+
+        return list(statuses.values())
+
 
 class DnsTypeManager(Manager):
     @property
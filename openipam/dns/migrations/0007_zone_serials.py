@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Per-domain record counts and last change times, which ZoneExporter
+# compares against zone_serials, come from these without touching the rows.
+zone_change_indexes_sql = """
+CREATE INDEX dns_records_did_changed_idx ON dns_records (did, changed);
+CREATE INDEX dhcp_dns_records_did_changed_idx ON dhcp_dns_records (did, changed);
+"""
+
+reverse_zone_change_indexes_sql = """
+DROP INDEX IF EXISTS dns_records_did_changed_idx;
+DROP INDEX IF EXISTS dhcp_dns_records_did_changed_idx;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("dns", "0006_auto_20170324_1644")]
+
+    operations = [
+        migrations.CreateModel(
+            name="ZoneSerial",
+            fields=[
+                (
+                    "domain",
+                    models.OneToOneField(
+                        db_column="did",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="zone_serial",
+                        serialize=False,
+                        to="dns.Domain",
+                    ),
+                ),
+                ("serial", models.BigIntegerField(default=0)),
+                ("record_count", models.IntegerField(default=0)),
+                ("last_changed", models.DateTimeField(blank=True, null=True)),
+                ("exported", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={"db_table": "zone_serials"},
+        ),
+        migrations.RunSQL(zone_change_indexes_sql, reverse_zone_change_indexes_sql),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Substring and regex searches on record names and content in the DNS list
+# use the trigram indexes; content is matched by icontains, which compares
+# upper(text_content::text).  Paging in name order seeks on (name, id).
+dns_record_search_indexes_sql = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX dns_records_name_trgm_idx ON dns_records USING gin (name gin_trgm_ops);
+CREATE INDEX dns_records_text_content_trgm_idx
+    ON dns_records USING gin (upper(text_content::text) gin_trgm_ops);
+CREATE INDEX dns_records_name_id_idx ON dns_records (name, id);
+"""
+
+reverse_dns_record_search_indexes_sql = """
+DROP INDEX IF EXISTS dns_records_name_trgm_idx;
+DROP INDEX IF EXISTS dns_records_text_content_trgm_idx;
+DROP INDEX IF EXISTS dns_records_name_id_idx;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("dns", "0007_zone_serials")]
+
+    operations = [
+        migrations.RunSQL(
+            dns_record_search_indexes_sql, reverse_dns_record_search_indexes_sql
+        )
+    ]
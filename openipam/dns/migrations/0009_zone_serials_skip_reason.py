@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [("dns", "0008_dns_record_search_indexes")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="zoneserial",
+            name="serial",
+            field=models.BigIntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AddField(
+            model_name="zoneserial",
+            name="skip_reason",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -1,11 +1,11 @@
 from django.db import models
-from django.db.models import Q
 from django.core.exceptions import ValidationError
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_save, post_delete
 
 from openipam.dns.managers import (
     DnsManager,
     DnsTypeManager,
+    DomainManager,
     DomainQuerySet,
     DNSQuerySet,
 )
@@ -16,12 +16,9 @@ from openipam.dns.validators import (
     validate_sshfp_content,
 )
 from openipam.user.signals import remove_obj_perms_connected_with_user
-
-from guardian.shortcuts import get_objects_for_user
+from openipam.dns.signals import invalidate_domain_trie
 
 import re
-import operator
-from functools import reduce
 
 
 class Domain(models.Model):
@@ -35,7 +32,7 @@ class Domain(models.Model):
     changed = models.DateTimeField(auto_now=True)
     changed_by = models.ForeignKey("user.User", db_column="changed_by")
 
-    objects = DomainQuerySet.as_manager()
+    objects = DomainManager.from_queryset(DomainQuerySet)()
 
     def __str__(self):
         return self.name
@@ -48,6 +45,25 @@ class Domain(models.Model):
         )
 
 
+class ZoneSerial(models.Model):
+    """What a domain's zone file was last exported from, see ZoneExporter."""
+
+    domain = models.OneToOneField(
+        "Domain", primary_key=True, db_column="did", related_name="zone_serial"
+    )
+    serial = models.BigIntegerField(default=0, blank=True, null=True)
+    record_count = models.IntegerField(default=0)
+    last_changed = models.DateTimeField(blank=True, null=True)
+    exported = models.DateTimeField(blank=True, null=True)
+    skip_reason = models.CharField(max_length=255, blank=True, null=True)
+
+    def __str__(self):
+        return "%s %s" % (self.domain_id, self.serial)
+
+    class Meta:
+        db_table = "zone_serials"
+
+
 class DnsRecord(models.Model):
     domain = models.ForeignKey("Domain", db_column="did", verbose_name="Domain")
     host = models.ForeignKey(
@@ -118,13 +134,12 @@ class DnsRecord(models.Model):
                 % self.dns_type.name
             )
 
+        context = self.get_validation_context()
+
         # Make sure PTR for desired host has the address already assigned.
         if self.dns_type.is_ptr_record:
-            from openipam.network.models import Address
-
             host_addresses = [
-                str(address.address)
-                for address in Address.objects.filter(host=self.host)
+                address for address, network in context.host_addresses(self.host)
             ]
             address = self.name.split(".")
             address.reverse()
@@ -137,11 +152,7 @@ class DnsRecord(models.Model):
 
         # If these records, then they must have valid A records first, and user must have Host permission
         if self.dns_type.name in ["HINFO", "SSHFP"]:
-            arecords = DnsRecord.objects.filter(
-                dns_type__in=[DnsType.objects.A, DnsType.objects.AAAA],
-                name=self.text_content,
-            ).first()
-            if not arecords:
+            if not context.a_record_exists(self.text_content):
                 raise ValidationError(
                     "Invalid DNS Record.  A record for '%s' needs to exist first."
                     % self.text_content
@@ -150,13 +161,26 @@ class DnsRecord(models.Model):
         # Run permission checks
         self.clean_permissions()
 
-    def clean_permissions(self):
-        from openipam.network.models import Address
+    def get_validation_context(self):
+        """
+        The DnsRecordContext this record validates against.  Records changed
+        together share one through validation_context, otherwise each builds
+        its own.
+        """
+        from openipam.dns.validation import DnsRecordContext
 
+        context = getattr(self, "validation_context", None)
+        if context is None or context.user != self.changed_by:
+            context = DnsRecordContext(self.changed_by, hosts=[self.host])
+            self.validation_context = context
+        return context
+
+    def clean_permissions(self):
         user = self.changed_by
+        context = self.get_validation_context()
 
         # Validate ability to add dns records
-        if not self.pk and not user.has_perm("dns.add_dnsrecord"):
+        if not self.pk and not context.can_add_records:
             raise ValidationError(
                 "Invalid credentials: user %s does not have permissions"
                 " to add DNS records. Please contact an IPAM administrator."
@@ -164,27 +188,16 @@ class DnsRecord(models.Model):
             )
 
         # Validate permissions on DNS Type
-        valid_dns_types = get_objects_for_user(
-            user,
-            ["dns.add_records_to_dnstype", "dns.change_dnstype"],
-            any_perm=True,
-            use_groups=True,
-        )
-        if self.dns_type not in valid_dns_types:
+        if not context.can_use_dns_type(self.dns_type):
             raise ValidationError(
                 "Invalid credentials: user %s does not have permissions"
                 " to add '%s' records" % (user, self.dns_type.name)
             )
 
-        valid_domains = Domain.objects.by_dns_change_perms(user).filter(
-            pk=self.domain.pk
-        )
-        valid_addresses = Address.objects.by_dns_change_perms(user)
-
         # Users must either have domain permissions when except for PTRs what are being created from host saves.
         if self.dns_type.is_ptr_record and self.host.is_dirty():
             pass
-        elif not valid_domains or self.domain not in valid_domains:
+        elif not context.can_change_domain(self.domain):
             raise ValidationError(
                 "Invalid credentials: user %s does not have permissions"
                 " to add DNS records to the domain provided. Please contact an IPAM administrator "
@@ -192,8 +205,8 @@ class DnsRecord(models.Model):
             )
 
         # If A or AAAA, then users must have Address / Network permission
-        if self.dns_type.is_a_record and not valid_addresses.filter(
-            address=self.ip_content.address
+        if self.dns_type.is_a_record and not context.can_change_address(
+            self.ip_content
         ):
             raise ValidationError(
                 "Invalid credentials: user %s does not have permissions"
@@ -202,7 +215,7 @@ class DnsRecord(models.Model):
             )
 
         # If PTR, then users must have Address / Network permission
-        if self.dns_type.is_ptr_record and not valid_addresses.filter(host=self.host):
+        if self.dns_type.is_ptr_record and not context.can_change_host(self.host):
             raise ValidationError(
                 "Invalid credentials: user %s does not have permissions"
                 " to add or modify DNS Records for Host '%s'"
@@ -393,46 +406,33 @@ class DnsRecord(models.Model):
             except ValidationError as e:
                 raise ValidationError({"name": e})
 
-            names = self.name.strip().split(".")
-            names_list = []
-            while names:
-                names_list.append(Q(name=".".join(names)))
-                names.pop(0)
-            if names_list:
-                domain = (
-                    Domain.objects.filter(reduce(operator.or_, names_list))
-                    .extra(select={"length": "Length(name)"})
-                    .order_by("-length")
-                    .first()
-                )
+            domain = Domain.objects.resolve(self.name)
 
-                if (
-                    domain
-                    and self.dns_type
-                    and self.dns_type.is_cname_record
-                    and domain.name == self.name
-                ):
-                    raise ValidationError(
-                        {
-                            "name": [
-                                "Cannot create CNAME record with name equivalent to existing domain "
-                                + domain.name
-                            ]
-                        }
-                    )
-                elif domain:
-                    self.domain = domain
-                else:
-                    raise ValidationError(
-                        {
-                            "name": [
-                                "Cannot create name %s: no matching domain exists"
-                                % self.name
-                            ]
-                        }
-                    )
+            if (
+                domain
+                and self.dns_type
+                and self.dns_type.is_cname_record
+                and domain.name.lower() == self.name.strip().lower()
+            ):
+                raise ValidationError(
+                    {
+                        "name": [
+                            "Cannot create CNAME record with name equivalent to existing domain "
+                            + domain.name
+                        ]
+                    }
+                )
+            elif domain:
+                self.domain = domain
             else:
-                self.domain = None
+                raise ValidationError(
+                    {
+                        "name": [
+                            "Cannot create name %s: no matching domain exists"
+                            % self.name
+                        ]
+                    }
+                )
 
             if not self.domain:
                 raise ValidationError({"name": ["Invalid domain name: %s" % self.name]})
@@ -631,3 +631,5 @@ class RecordMunged(models.Model):
 
 # Register Signals
 pre_delete.connect(remove_obj_perms_connected_with_user, sender=DnsType)
+post_save.connect(invalidate_domain_trie, sender=Domain)
+post_delete.connect(invalidate_domain_trie, sender=Domain)
@@ -0,0 +1,6 @@
+# Domain lookups resolve against a cached trie of domain names; other
+# processes rebuild it once the change is visible.
+def invalidate_domain_trie(sender, instance, **kwargs):
+    from openipam.dns.models import Domain
+
+    Domain.objects.invalidate()
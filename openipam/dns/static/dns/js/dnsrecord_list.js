@@ -26,6 +26,7 @@ $(function () {
         var cacheUpper = null;
         var cacheLastRequest = null;
         var cacheLastJson = null;
+        var cacheSeek = null;
 
         return function (request, drawCallback, settings) {
             var ajax = false;
@@ -37,6 +38,7 @@ $(function () {
                 // API requested that the cache be cleared
                 ajax = true;
                 settings.clearCache = false;
+                cacheSeek = null;
             }
             else if (cacheLower < 0 || requestStart < cacheLower || requestEnd > cacheUpper) {
                 // outside cached data - need to make a request
@@ -48,6 +50,7 @@ $(function () {
             ) {
                 // properties changed (ordering, columns, searching)
                 ajax = true;
+                cacheSeek = null;
             }
 
             // Store the request for checking next time around
@@ -69,6 +72,15 @@ $(function () {
                 request.start = requestStart;
                 request.length = requestLength * conf.pages;
 
+                // Let the server seek past the last row it sent rather than
+                // counting an offset, when this block follows on from it.
+                if (cacheSeek && cacheSeek.start == requestStart) {
+                    request.seek = cacheSeek;
+                }
+                else {
+                    delete request.seek;
+                }
+
                 // Provide the same `data` options as DataTables.
                 if ($.isFunction(conf.data)) {
                     // As a function it is executed with the data object as an arg
@@ -92,6 +104,7 @@ $(function () {
                     "cache": false,
                     "success": function (json) {
                         cacheLastJson = $.extend(true, {}, json);
+                        cacheSeek = json.seek || null;
 
                         if (cacheLower != requestStart) {
                             json.data.splice(0, requestStart - cacheLower);
@@ -161,6 +174,17 @@ $(function () {
         "stateSave": true,
         "dom": '<"header well well-sm"r>t<"paginator well well-sm"lpi<"clear">>',
         "order": [[1, "asc"]],
+        "infoCallback": function (settings, start, end, max, total, pre) {
+            // Large totals are the planner's estimate, not a count.
+            var json = this.api().ajax.json();
+            if (json && json.recordsEstimated) {
+                pre = pre.replace(" of ", " of about ");
+            }
+            if (json && json.recordsTotalEstimated) {
+                pre = pre.replace(" from ", " from about ");
+            }
+            return pre;
+        },
         "language": {
             "lengthMenu": "Show _MENU_ records",
             "search": ""
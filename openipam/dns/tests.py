@@ -5,7 +5,31 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
+
+from guardian.shortcuts import assign_perm
+
+from openipam.core.tests.test_models import (
+    IPAMTestCase,
+    PermissionLookupMixin,
+    reset_in_process_caches,
+)
+from openipam.dns.models import Domain, DnsRecord, ZoneSerial
+from openipam.dns.validation import DnsRecordContext
+from openipam.dns.zones import ZoneExporter
+from openipam.hosts.models import Host
+from openipam.network.models import Address, Network
+from openipam.user.models import User
+
+from ipaddress import ip_address
+from netaddr import EUI
+
+import shutil
+import tempfile
 
 
 class SimpleTest(TestCase):
@@ -14,3 +38,398 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+# Trie versions are bumped on commit, so the test needs real commits.
+class DomainTrieTest(TransactionTestCase):
+    def setUp(self):
+        # Versions restart when the tables are flushed between tests.
+        reset_in_process_caches()
+        self.user = get_user_model().objects.create(username="trie-test")
+        for name, domain_type in (
+            ("example.com", "NATIVE"),
+            ("lab.example.com", "NATIVE"),
+            ("slave.example.com", "SLAVE"),
+        ):
+            Domain.objects.create(name=name, type=domain_type, changed_by=self.user)
+
+    def test_resolves_longest_match(self):
+        resolved = Domain.objects.resolve_many(
+            ["host.lab.example.com", "host.example.com", "Example.COM", "example.org"]
+        )
+        self.assertEqual(resolved["host.lab.example.com"].name, "lab.example.com")
+        self.assertEqual(resolved["host.example.com"].name, "example.com")
+        self.assertEqual(resolved["Example.COM"].name, "example.com")
+        self.assertIsNone(resolved["example.org"])
+
+    def test_rebuilt_on_domain_change(self):
+        self.assertEqual(Domain.objects.resolve("a.b.example.com").name, "example.com")
+        Domain.objects.create(name="b.example.com", type="NATIVE", changed_by=self.user)
+        self.assertEqual(
+            Domain.objects.resolve("a.b.example.com").name, "b.example.com"
+        )
+        Domain.objects.get(name="b.example.com").delete()
+        self.assertEqual(Domain.objects.resolve("a.b.example.com").name, "example.com")
+
+    def test_slave_domain_rejected_without_query(self):
+        Domain.objects.resolve("warm.example.com")
+        record = DnsRecord(name="host.slave.example.com")
+        with self.assertNumQueries(0):
+            with self.assertRaises(ValidationError):
+                record.set_domain_from_name()
+
+
+# Inside a test transaction nothing commits, as with a request that saves
+# domains and then resolves names before it returns.
+class DomainTrieTransactionTest(TestCase):
+    def setUp(self):
+        reset_in_process_caches()
+        self.user = get_user_model().objects.create(username="trie-test")
+        Domain.objects.create(name="example.com", type="NATIVE", changed_by=self.user)
+
+    def test_sees_uncommitted_domains(self):
+        domain = Domain.objects.create(
+            name="lab.example.com", type="NATIVE", changed_by=self.user
+        )
+        self.assertEqual(Domain.objects.resolve("host.lab.example.com").pk, domain.pk)
+
+    def test_forgets_rolled_back_domains(self):
+        Domain.objects.resolve("host.example.com")
+        try:
+            with transaction.atomic():
+                Domain.objects.create(
+                    name="lab.example.com", type="NATIVE", changed_by=self.user
+                )
+                self.assertEqual(
+                    Domain.objects.resolve("host.lab.example.com").name,
+                    "lab.example.com",
+                )
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertEqual(
+            Domain.objects.resolve("host.lab.example.com").name, "example.com"
+        )
+
+
+class ListZoneExporter(ZoneExporter):
+    """Reads its rows from a list, records_munged is not built by migrations."""
+
+    def __init__(self, rows, **kwargs):
+        super(ListZoneExporter, self).__init__(**kwargs)
+        self.rows = rows
+
+    def get_rows(self, zone_ids):
+        return iter([row for row in self.rows if row[0] in zone_ids])
+
+
+class ZoneExporterTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="zone-admin")
+        self.domains = dict(
+            (name, Domain.objects.create(name=name, type="NATIVE", changed_by=user))
+            for name in ["zone.valid", "nosoa.valid", "empty.valid"]
+        )
+        zone_id = self.domains["zone.valid"].pk
+        nosoa_id = self.domains["nosoa.valid"].pk
+        rows = [
+            (
+                zone_id,
+                "zone.valid",
+                "SOA",
+                "ns1.zone.valid hostmaster.zone.valid 1",
+                3600,
+                None,
+            ),
+            (zone_id, "www.zone.valid", "A", "192.168.0.3", 3600, None),
+            (nosoa_id, "www.nosoa.valid", "A", "192.168.0.4", 3600, None),
+        ]
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        self.exporter = ListZoneExporter(rows, output_dir=self.output_dir)
+        self.names = list(self.domains)
+
+    def test_skipped_zones_are_recorded(self):
+        stats = self.exporter.export(names=self.names)
+        self.assertEqual(stats["exported"], 1)
+        self.assertEqual(
+            stats["skipped"],
+            [
+                ("empty.valid", ZoneExporter.NO_RECORDS),
+                ("nosoa.valid", ZoneExporter.NO_SOA),
+            ],
+        )
+
+        skipped = ZoneSerial.objects.get(domain=self.domains["nosoa.valid"])
+        self.assertIsNone(skipped.serial)
+        self.assertEqual(skipped.skip_reason, ZoneExporter.NO_SOA)
+        exported = ZoneSerial.objects.get(domain=self.domains["zone.valid"])
+        self.assertIsNotNone(exported.serial)
+        self.assertIsNone(exported.skip_reason)
+
+    def test_unchanged_zones_are_not_exported_again(self):
+        self.exporter.export(names=self.names)
+
+        stats = self.exporter.export(names=self.names)
+        self.assertEqual(stats["changed"], 0)
+        self.assertEqual(stats["exported"], 0)
+        self.assertEqual(stats["skipped"], [])
+
+
+class ReconcileHostRecordsTest(IPAMTestCase):
+    mac0, mac1, mac2, mac3, mac4 = [EUI("ffffff00000%s" % i) for i in range(5)]
+
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            }
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"} for i in ["valid", "168.192.in-addr.arpa"]
+        ]
+        # Records of host-1 that need fixing.
+        self.dns_records = [
+            {
+                "name": "11.0.168.192.in-addr.arpa",
+                "dns_type": "PTR",
+                "text_content": "old-name.valid",
+            },
+            {"name": "host-1.valid", "dns_type": "A", "ip_content": "192.168.0.11"},
+        ]
+        self.hosts = [
+            {
+                "hostname": "host-0.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.10",
+            },
+            {
+                "hostname": "host-1.valid",
+                "mac": "ffffff000001",
+                "address": "192.168.0.11",
+            },
+            {
+                "hostname": "host-2.valid",
+                "mac": "ffffff000002",
+                "address": "192.168.0.12",
+            },
+            {
+                "hostname": "host-3.nowhere",
+                "mac": "ffffff000003",
+                "address": "192.168.0.13",
+            },
+            {"hostname": "host-4.valid", "mac": "ffffff000004"},
+        ]
+        self.pools = []
+        self.address_types = []
+        super(ReconcileHostRecordsTest, self).setUp()
+
+        # A record host-2 keeps for an address it no longer has.
+        self._add_dns_record(
+            {
+                "name": "old-host-2.valid",
+                "dns_type": "A",
+                "ip_content": "192.168.0.20",
+                "host": Host.objects.get(pk="ffffff000002"),
+            },
+            self.user_model,
+        )
+
+    def reconcile(self):
+        hosts = Host.objects.all().prefetch_related("addresses", "pools")
+        return dict(
+            (EUI(status["mac"]), status)
+            for status in DnsRecord.objects.reconcile_host_records(
+                hosts, self.user_model
+            )
+        )
+
+    def counts(self, status):
+        return (status["created"], status["updated"], status["deleted"])
+
+    def assertRecords(self, hostname, address):
+        host = Host.objects.get(hostname=hostname)
+        ptr = DnsRecord.objects.get(
+            name=ip_address(address).reverse_pointer, dns_type__name="PTR"
+        )
+        self.assertEqual((ptr.text_content, ptr.host_id), (hostname, host.pk))
+        a_record = DnsRecord.objects.get(name=hostname, dns_type__name="A")
+        self.assertEqual(
+            (str(a_record.ip_content_id), a_record.host_id), (address, host.pk)
+        )
+
+    def test_counts(self):
+        statuses = self.reconcile()
+
+        self.assertEqual(self.counts(statuses[self.mac0]), (2, 0, 0))
+        self.assertEqual(self.counts(statuses[self.mac1]), (0, 2, 0))
+        self.assertEqual(self.counts(statuses[self.mac2]), (2, 0, 1))
+        for mac in [self.mac0, self.mac1, self.mac2]:
+            self.assertTrue(statuses[mac]["success"])
+
+        self.assertRecords("host-0.valid", "192.168.0.10")
+        self.assertRecords("host-1.valid", "192.168.0.11")
+        self.assertRecords("host-2.valid", "192.168.0.12")
+        self.assertFalse(DnsRecord.objects.filter(name="old-host-2.valid").exists())
+
+    def test_second_run_changes_nothing(self):
+        self.reconcile()
+        statuses = self.reconcile()
+        for mac in [self.mac0, self.mac1, self.mac2]:
+            self.assertEqual(self.counts(statuses[mac]), (0, 0, 0))
+
+    def test_failing_hosts(self):
+        statuses = self.reconcile()
+
+        self.assertFalse(statuses[self.mac3]["success"])
+        self.assertIn("No authoritative domain", statuses[self.mac3]["error"])
+        self.assertFalse(statuses[self.mac4]["success"])
+        self.assertIn("has no address", statuses[self.mac4]["error"])
+        self.assertFalse(DnsRecord.objects.filter(name="host-3.nowhere").exists())
+
+        # The other hosts still applied.
+        self.assertTrue(statuses[self.mac0]["success"])
+        self.assertTrue(DnsRecord.objects.filter(name="host-0.valid").exists())
+
+
+class DnsRecordContextTest(IPAMTestCase):
+    """The context permits the same records as the permission querysets."""
+
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.{}.0/24".format(i),
+                "name": "rfc1918-192-168-{}".format(i),
+                "gateway": "192.168.{}.1".format(i),
+            }
+            for i in range(2)
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"}
+            for i in ["valid", "invalid", "168.192.in-addr.arpa"]
+        ]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "owned-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.3",
+            },
+            {
+                "hostname": "network-host.valid",
+                "mac": "ffffff000001",
+                "address": "192.168.1.3",
+            },
+        ]
+        self.pools = []
+        self.address_types = []
+        super(DnsRecordContextTest, self).setUp()
+
+        self.owner = User.objects.create(username="host-owner")
+        assign_perm(
+            "hosts.is_owner_host", self.owner, Host.objects.get(pk="ffffff000000")
+        )
+        assign_perm(
+            "dns.add_records_to_domain", self.owner, Domain.objects.get(name="valid")
+        )
+
+        self.network_user = User.objects.create(username="network-user")
+        assign_perm(
+            "network.add_records_to_network",
+            self.network_user,
+            Network.objects.get(network="192.168.1.0/24"),
+        )
+
+        self.global_user = User.objects.create(username="global-user")
+        self.global_user.user_permissions.add(
+            Permission.objects.get(
+                content_type__app_label="network", codename="change_network"
+            ),
+            Permission.objects.get(
+                content_type__app_label="dns", codename="change_domain"
+            ),
+        )
+
+    def assertMatchesQuerysets(self, user):
+        # Fetched again so permission caches start empty.
+        user = User.objects.get(pk=user.pk)
+        context = DnsRecordContext(user, hosts=Host.objects.all())
+        addresses = Address.objects.by_dns_change_perms(user)
+        domains = Domain.objects.by_dns_change_perms(user)
+
+        for address in Address.objects.filter(
+            address__in=["192.168.0.2", "192.168.0.3", "192.168.1.2", "192.168.1.3"]
+        ):
+            self.assertEqual(
+                context.can_change_address(address),
+                addresses.filter(pk=address.pk).exists(),
+                address,
+            )
+        for host in Host.objects.all():
+            self.assertEqual(
+                context.can_change_host(host),
+                addresses.filter(host=host).exists(),
+                host,
+            )
+        for domain in Domain.objects.all():
+            self.assertEqual(
+                context.can_change_domain(domain),
+                domains.filter(pk=domain.pk).exists(),
+                domain,
+            )
+        return context
+
+    def test_host_owner(self):
+        context = self.assertMatchesQuerysets(self.owner)
+        self.assertTrue(context.can_change_host(Host.objects.get(pk="ffffff000000")))
+        self.assertFalse(context.can_change_host(Host.objects.get(pk="ffffff000001")))
+        self.assertTrue(context.can_change_domain(Domain.objects.get(name="valid")))
+        self.assertFalse(context.can_change_domain(Domain.objects.get(name="invalid")))
+
+    def test_network_permission(self):
+        context = self.assertMatchesQuerysets(self.network_user)
+        self.assertTrue(
+            context.can_change_address(Address.objects.get(address="192.168.1.2"))
+        )
+        self.assertFalse(
+            context.can_change_address(Address.objects.get(address="192.168.0.3"))
+        )
+
+    def test_global_permission(self):
+        context = self.assertMatchesQuerysets(self.global_user)
+        self.assertTrue(
+            context.can_change_address(Address.objects.get(address="192.168.0.2"))
+        )
+        self.assertTrue(context.can_change_domain(Domain.objects.get(name="invalid")))
+
+
+class DomainPermissionLookupTest(PermissionLookupMixin, TestCase):
+    model = Domain
+    owner_perm = "dns.is_owner_domain"
+    change_perms = ["dns.is_owner_domain", "dns.change_domain"]
+
+    def create_objects(self, user):
+        return [
+            Domain.objects.create(
+                name="perm-%s.valid" % i, type="NATIVE", changed_by=user
+            )
+            for i in range(3)
+        ]
+
+    def owned(self, user, use_groups):
+        return Domain.objects.by_owner(user, use_groups=use_groups)
+
+    def owned_by_group(self, group):
+        return Domain.objects.by_change_perms(group)
+
+    def changeable(self, user):
+        return Domain.objects.by_change_perms(user)
+
+    def test_ids_only(self):
+        assign_perm(self.owner_perm, self.user, self.objects[0])
+
+        self.assertEqual(
+            Domain.objects.by_owner(self.user, ids_only=True), (self.objects[0].pk,)
+        )
@@ -0,0 +1,149 @@
+from django.utils.functional import cached_property
+
+from guardian.shortcuts import get_objects_for_user
+
+from netaddr import EUI
+
+
+class DnsRecordContext(object):
+    """
+    What validating DNS records for one user needs from the database: the
+    DNS types, domains and addresses the user may add records to, the
+    addresses of the records' hosts and which names have A records.  Each
+    is loaded once and shared by every record validated against the
+    context, so a batch costs the same queries as a single record.
+    """
+
+    def __init__(self, user, hosts=()):
+        self.user = user
+        self._hosts = set(EUI(host.pk) for host in hosts if host)
+        self._host_addresses = {}
+        self._host_perms = {}
+        self._addresses = {}
+        self._address_perms = {}
+        self._a_record_names = set()
+
+    def add_host(self, host):
+        """Registers a host whose addresses should load with the next batch."""
+        if host and host.pk:
+            self._hosts.add(EUI(host.pk))
+
+    @cached_property
+    def can_add_records(self):
+        return self.user.has_perm("dns.add_dnsrecord")
+
+    @cached_property
+    def dns_type_ids(self):
+        return set(
+            get_objects_for_user(
+                self.user,
+                ["dns.add_records_to_dnstype", "dns.change_dnstype"],
+                any_perm=True,
+                use_groups=True,
+            ).values_list("pk", flat=True)
+        )
+
+    @cached_property
+    def domain_ids(self):
+        """Ids of the domains the user may add records to."""
+        from openipam.dns.models import Domain
+
+        return set(
+            Domain.objects.by_dns_change_perms(self.user).values_list("pk", flat=True)
+        )
+
+    def can_use_dns_type(self, dns_type):
+        return dns_type.pk in self.dns_type_ids
+
+    def can_change_domain(self, domain):
+        return domain.pk in self.domain_ids
+
+    def can_change_address(self, address):
+        """Whether address is in Address.objects.by_dns_change_perms(user)."""
+        from openipam.network.models import Address
+
+        key = str(address.address)
+        if key not in self._address_perms:
+            missing = (set(self._addresses) | set([key])) - set(self._address_perms)
+            permitted = set(
+                str(permitted)
+                for permitted in Address.objects.by_dns_change_perms(self.user)
+                .filter(address__in=list(missing))
+                .values_list("address", flat=True)
+            )
+            for missing_address in missing:
+                self._address_perms[missing_address] = missing_address in permitted
+        return self._address_perms[key]
+
+    def can_change_host(self, host):
+        """Whether Address.objects.by_dns_change_perms(user) has any of host's."""
+        from openipam.network.models import Address
+
+        key = EUI(host.pk)
+        if key not in self._host_perms:
+            missing = (self._hosts | set([key])) - set(self._host_perms)
+            permitted = set(
+                EUI(mac)
+                for mac in Address.objects.by_dns_change_perms(self.user)
+                .filter(host__in=list(missing))
+                .values_list("host", flat=True)
+            )
+            for mac in missing:
+                self._host_perms[mac] = mac in permitted
+        return self._host_perms[key]
+
+    def host_addresses(self, host):
+        """[(address, network), ...] assigned to host, as strings."""
+        from openipam.network.models import Address
+
+        key = EUI(host.pk)
+        if key not in self._host_addresses:
+            missing = (self._hosts | set([key])) - set(self._host_addresses)
+            for mac in missing:
+                self._host_addresses[mac] = []
+            rows = Address.objects.filter(host__in=list(missing)).values_list(
+                "host", "address", "network"
+            )
+            for mac, address, network in rows:
+                self._host_addresses[EUI(mac)].append((str(address), str(network)))
+        return self._host_addresses[key]
+
+    def load_addresses(self, addresses):
+        from openipam.network.models import Address
+
+        for address in Address.objects.select_related("host").filter(
+            address__in=[str(address) for address in addresses]
+        ):
+            self._addresses[str(address.address)] = address
+
+    def get_address(self, address):
+        """The Address for address, raising Address.DoesNotExist if missing."""
+        from openipam.network.models import Address
+
+        if str(address) not in self._addresses:
+            self._addresses[str(address)] = Address.objects.select_related("host").get(
+                address=address
+            )
+        return self._addresses[str(address)]
+
+    def a_record_exists(self, name):
+        from openipam.dns.models import DnsRecord, DnsType
+
+        # Records created earlier in the batch are not in the loaded set,
+        # so a miss is checked again.
+        if name not in self._a_record_names:
+            if DnsRecord.objects.filter(
+                dns_type__in=[DnsType.objects.A, DnsType.objects.AAAA], name=name
+            ).exists():
+                self._a_record_names.add(name)
+        return name in self._a_record_names
+
+    def load_a_record_names(self, names):
+        from openipam.dns.models import DnsRecord, DnsType
+
+        self._a_record_names.update(
+            DnsRecord.objects.filter(
+                dns_type__in=[DnsType.objects.A, DnsType.objects.AAAA],
+                name__in=list(names),
+            ).values_list("name", flat=True)
+        )
@@ -3,7 +3,7 @@ from django.views.generic import TemplateView
 from django.shortcuts import redirect
 from django.core.urlresolvers import reverse_lazy
 from django.core.exceptions import ValidationError
-from django.db.models import Q
+from django.db.models import Q, Value, BooleanField, Exists, OuterRef
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 from django.utils.http import urlunquote
@@ -17,7 +17,7 @@ from django.shortcuts import get_object_or_404
 from openipam.dns.forms import DSNCreateFrom
 from openipam.dns.models import DnsRecord, DnsType
 from openipam.dns.actions import delete_records
-from openipam.core.views import BaseDatatableView
+from openipam.core.views import BaseDatatableView, SeekPagingMixin
 from openipam.core.utils.messages import process_errors
 
 from guardian.shortcuts import get_objects_for_user
@@ -29,7 +29,7 @@ import json
 User = get_user_model()
 
 
-class DNSListJson(PermissionRequiredMixin, BaseDatatableView):
+class DNSListJson(PermissionRequiredMixin, SeekPagingMixin, BaseDatatableView):
     permission_required = "dns.view_dnsrecord"
 
     order_columns = (
@@ -41,6 +41,13 @@ class DNSListJson(PermissionRequiredMixin, BaseDatatableView):
         "host",
     )
 
+    seek_columns = {1: "name"}
+    seek_filter_params = ("search_filter", "change_filter")
+    search_params = ("search_filter",)
+
+    # Exact counts of millions of records cost more than the page itself.
+    estimate_count_above = 50000
+
     # set max limit of records returned, this is used to protect our site if someone tries to attack our site
     # and make it return huge amount of data
     max_display_length = 1500
@@ -114,10 +121,12 @@ class DNSListJson(PermissionRequiredMixin, BaseDatatableView):
                     qs = qs.filter(name__contains=search_item.lower())
 
             if name_search:
+                # Names are stored lowercase, so LIKE on the name matches
+                # case-insensitively and is served by the trigram index.
                 if name_search.startswith("~"):
-                    qs = qs.filter(name__iregex=name_search[1:]).distinct()
+                    qs = qs.filter(name__iregex=name_search[1:])
                 else:
-                    qs = qs.filter(name__icontains=name_search.lower()).distinct()
+                    qs = qs.filter(name__contains=name_search.lower())
             if type_search:
                 qs = qs.filter(dns_type=type_search)
             if content_search:
@@ -156,12 +165,21 @@ class DNSListJson(PermissionRequiredMixin, BaseDatatableView):
 
         return qs
 
+    def paging(self, qs):
+        # Whether each record on the page may be changed is selected with
+        # the page itself, only the rows returned evaluate the subquery.
+        user = self.request.user
+        if self.json_data.get("change_filter") or user.has_perm("dns.change_dnsrecord"):
+            qs = qs.annotate(changeable=Value(True, output_field=BooleanField()))
+        else:
+            qs = qs.annotate(
+                changeable=Exists(
+                    DnsRecord.objects.by_change_perms(user).filter(pk=OuterRef("pk"))
+                )
+            )
+        return super(DNSListJson, self).paging(qs)
+
     def prepare_results(self, qs):
-        change_permissions = (
-            DnsRecord.objects.filter(pk__in=[record.pk for record in qs])
-            .by_change_perms(self.request.user)
-            .values_list("pk", flat=True)
-        )
         global_delete_permission = self.request.user.has_perm("dns.change_dnsrecord")
 
         # Currently un-used
@@ -295,9 +313,7 @@ class DNSListJson(PermissionRequiredMixin, BaseDatatableView):
         json_data = []
 
         for dns_record in qs:
-            has_change_permission = (
-                True if dns_record.pk in change_permissions else False
-            )
+            has_change_permission = dns_record.changeable
             dns_view_href = get_dns_view_href(dns_record)
             json_data.append(
                 [
@@ -401,7 +417,8 @@ class DNSListView(PermissionRequiredMixin, TemplateView):
 
             return redirect("list_dns")
         else:
-            # Permission checks are done inside add_or_update_record
+            records = []
+
             # New records
             for index, record in enumerate(new_records):
                 if (
@@ -411,46 +428,37 @@ class DNSListView(PermissionRequiredMixin, TemplateView):
                 ):
                     continue
 
-                try:
-                    if not new_types[index]:
-                        raise ValidationError("A Dns Type is required.")
-
-                    dns_record, created = DnsRecord.objects.add_or_update_record(
-                        user=request.user,
-                        name=new_names[index],
-                        content=new_contents[index],
-                        dns_type=DnsType.objects.get(pk=int(new_types[index])),
-                        ttl=new_ttls[index],
-                    )
-
-                except ValidationError as e:
-                    if hasattr(e, "error_dict"):
-                        for key, errors in list(e.message_dict.items()):
-                            for error in errors:
-                                error_list.append(str(error).capitalize())
-                    else:
-                        error_list.append(str(e.message).capitalize())
+                if not new_types[index]:
+                    error_list.append("A Dns Type is required.")
                     continue
 
+                records.append(
+                    {
+                        "name": new_names[index],
+                        "content": new_contents[index],
+                        "dns_type": DnsType.objects.get(pk=int(new_types[index])),
+                        "ttl": new_ttls[index],
+                    }
+                )
+
             # Updated records
             for record in selected_records:
-                try:
-                    dns_record, created = DnsRecord.objects.add_or_update_record(
-                        user=request.user,
-                        name=request.POST.get("name-%s" % record, ""),
-                        content=request.POST.get("content-%s" % record, ""),
-                        ttl=request.POST.get("ttl-%s" % record, ""),
-                        record=record,
-                    )
+                records.append(
+                    {
+                        "name": request.POST.get("name-%s" % record, ""),
+                        "content": request.POST.get("content-%s" % record, ""),
+                        "ttl": request.POST.get("ttl-%s" % record, ""),
+                        "record": record,
+                    }
+                )
 
+            # Permissions and lookups are loaded once for the whole batch,
+            # and either every record is saved or none are.
+            if records and not error_list:
+                try:
+                    DnsRecord.objects.bulk_add_or_update_records(request.user, records)
                 except ValidationError as e:
-                    if hasattr(e, "error_dict"):
-                        for key, errors in list(e.message_dict.items()):
-                            for error in errors:
-                                error_list.append(str(error).capitalize())
-                    else:
-                        error_list.append(str(e.message).capitalize())
-                    continue
+                    error_list.extend(e.messages)
 
             if error_list:
                 error_list = list(set(error_list))
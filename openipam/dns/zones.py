@@ -0,0 +1,291 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from openipam.conf.ipam_settings import CONFIG
+from openipam.dns.models import RecordMunged
+
+from collections import namedtuple
+from itertools import chain, groupby
+from operator import itemgetter
+
+import os
+import time
+
+Zone = namedtuple(
+    "Zone",
+    "id name record_count last_changed serial exported_count exported_changed",
+)
+
+# Types whose content ends in a host name, written absolute in zone files.
+HOSTNAME_TYPES = ("CNAME", "NS", "PTR", "MX", "SRV")
+QUOTED_TYPES = ("TXT", "SPF")
+SOA_DEFAULTS = ["10800", "3600", "604800", "3600"]
+
+
+def absolute(name):
+    return name if name.endswith(".") else name + "."
+
+
+class ZoneExporter(object):
+    """
+    Writes a BIND zone file per authoritative domain from records_munged.
+    A domain is exported again only when its record count or latest
+    changed stamp, over dns_records and dhcp_dns_records, differs from what
+    zone_serials holds for its last export, so a run touches only the zones
+    that changed.  Zones skipped for having no records or no SOA are
+    recorded too, with their skip reason and no new serial, so they are not
+    retried until they change.  Rows are streamed from a server-side
+    cursor, and with diffs each rewritten zone also gets an IXFR-style file
+    of the records removed and added since its previous serial.
+    """
+
+    zones_sql = """
+        SELECT domains.id, domains.name,
+            coalesce(records.count, 0) + coalesce(dhcp_records.count, 0),
+            greatest(records.changed, dhcp_records.changed),
+            zone_serials.serial, zone_serials.record_count, zone_serials.last_changed
+        FROM domains
+        LEFT JOIN (
+            SELECT did, count(*) AS count, max(changed) AS changed
+            FROM dns_records GROUP BY did
+        ) AS records ON records.did = domains.id
+        LEFT JOIN (
+            SELECT did, count(*) AS count, max(changed) AS changed
+            FROM dhcp_dns_records GROUP BY did
+        ) AS dhcp_records ON dhcp_records.did = domains.id
+        LEFT JOIN zone_serials ON zone_serials.did = domains.id
+        WHERE domains.type <> 'SLAVE' %(where)s
+    """
+
+    save_serials_sql = """
+        INSERT INTO zone_serials (
+            did, serial, record_count, last_changed, exported, skip_reason
+        )
+            SELECT did, serial, record_count, last_changed, %s, NULL
+            FROM unnest(%s::integer[], %s::bigint[], %s::integer[], %s::timestamptz[])
+                AS zone(did, serial, record_count, last_changed)
+        ON CONFLICT (did) DO UPDATE
+            SET serial = EXCLUDED.serial,
+                record_count = EXCLUDED.record_count,
+                last_changed = EXCLUDED.last_changed,
+                exported = EXCLUDED.exported,
+                skip_reason = NULL
+    """
+
+    # A skipped zone keeps the serial of its last export, or none.
+    save_skipped_sql = """
+        INSERT INTO zone_serials (
+            did, serial, record_count, last_changed, exported, skip_reason
+        )
+            SELECT did, NULL, record_count, last_changed, %s, skip_reason
+            FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[], %s::text[])
+                AS zone(did, record_count, last_changed, skip_reason)
+        ON CONFLICT (did) DO UPDATE
+            SET record_count = EXCLUDED.record_count,
+                last_changed = EXCLUDED.last_changed,
+                exported = EXCLUDED.exported,
+                skip_reason = EXCLUDED.skip_reason
+    """
+
+    NO_RECORDS = "no records"
+    NO_SOA = "no SOA record"
+
+    def __init__(self, output_dir=None, default_ttl=None, diffs=False):
+        self.output_dir = output_dir or CONFIG.get("DNS_ZONE_EXPORT_DIR")
+        self.default_ttl = default_ttl or CONFIG.get("DNS_ZONE_DEFAULT_TTL")
+        self.diffs = diffs
+
+    def get_zones(self, names=None):
+        where = "AND domains.name = ANY(%(names)s)" if names else ""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.zones_sql % {"where": where}, {"names": names})
+            return [Zone(*row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def is_changed(zone):
+        # exported_count is only NULL for a zone never exported or skipped.
+        return (
+            zone.exported_count is None
+            or zone.record_count != zone.exported_count
+            or zone.last_changed != zone.exported_changed
+        )
+
+    @staticmethod
+    def next_serial(serial):
+        today = int(timezone.now().strftime("%Y%m%d00"))
+        return max((serial or 0) + 1, today)
+
+    def get_rows(self, zone_ids):
+        """Yields (domain id, name, type, content, ttl, prio), SOA first per zone."""
+        # Only the default view, zone_serials tracks one serial per domain.
+        records = RecordMunged.objects.filter(
+            domain_id__in=zone_ids, view_id__isnull=True
+        )
+        return (
+            records.extra(select={"not_soa": "type <> 'SOA'"})
+            .order_by("domain_id", "not_soa", "name", "type", "content")
+            .values_list("domain_id", "name", "type", "content", "ttl", "prio")
+            .iterator()
+        )
+
+    def render_record(self, name, record_type, content, ttl, prio, serial):
+        content = content or ""
+        if record_type == "SOA":
+            parts = content.split()
+            parts[:2] = [absolute(part) for part in parts[:2]]
+            if len(parts) >= 3:
+                parts[2] = str(serial)
+            else:
+                parts += [str(serial)] + SOA_DEFAULTS
+            content = " ".join(parts)
+        elif record_type in HOSTNAME_TYPES:
+            if record_type in ("MX", "SRV") and prio is not None:
+                content = "%s %s" % (prio, content)
+            parts = content.split()
+            if parts:
+                parts[-1] = absolute(parts[-1])
+            content = " ".join(parts)
+        elif record_type in QUOTED_TYPES and not content.startswith('"'):
+            content = '"%s"' % content.replace('"', '\\"')
+        return "%s\t%s\tIN\t%s\t%s\n" % (
+            absolute(name),
+            ttl if ttl is not None and ttl >= 0 else self.default_ttl,
+            record_type,
+            content,
+        )
+
+    def zone_path(self, zone):
+        return os.path.join(self.output_dir, "%s.zone" % zone.name)
+
+    def read_records(self, path):
+        """The record lines of a zone file, without its SOA."""
+        if not os.path.exists(path):
+            return set()
+        with open(path) as zone_file:
+            return set(
+                line
+                for line in zone_file
+                if line and not line.startswith(("$", ";")) and "\tSOA\t" not in line
+            )
+
+    def write_zone(self, zone, serial, rows):
+        """Writes the zone file.  Returns False when the zone has no SOA record."""
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None or first[2] != "SOA":
+            return False
+
+        path = self.zone_path(zone)
+        previous = self.read_records(path) if self.diffs else None
+        current = set()
+
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, "w") as zone_file:
+            zone_file.write("$ORIGIN %s\n" % absolute(zone.name))
+            zone_file.write("$TTL %s\n" % self.default_ttl)
+            for domain_id, name, record_type, content, ttl, prio in chain(
+                [first], rows
+            ):
+                line = self.render_record(name, record_type, content, ttl, prio, serial)
+                zone_file.write(line)
+                if previous is not None and record_type != "SOA":
+                    current.add(line)
+        os.replace(tmp_path, path)
+
+        if previous is not None and zone.serial:
+            self.write_diff(zone, serial, previous, current)
+        return True
+
+    def write_diff(self, zone, serial, previous, current):
+        path = os.path.join(
+            self.output_dir, "%s.%s-%s.diff" % (zone.name, zone.serial, serial)
+        )
+        with open(path, "w") as diff_file:
+            diff_file.write(
+                "; %s changes from serial %s to %s\n" % (zone.name, zone.serial, serial)
+            )
+            for line in sorted(previous - current):
+                diff_file.write("-" + line)
+            for line in sorted(current - previous):
+                diff_file.write("+" + line)
+
+    def save_serials(self, exported):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.save_serials_sql,
+                [
+                    timezone.now(),
+                    [zone.id for zone, serial in exported],
+                    [serial for zone, serial in exported],
+                    [zone.record_count for zone, serial in exported],
+                    [zone.last_changed for zone, serial in exported],
+                ],
+            )
+        finally:
+            cursor.close()
+
+    def save_skipped(self, skipped):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.save_skipped_sql,
+                [
+                    timezone.now(),
+                    [zone.id for zone, reason in skipped],
+                    [zone.record_count for zone, reason in skipped],
+                    [zone.last_changed for zone, reason in skipped],
+                    [reason for zone, reason in skipped],
+                ],
+            )
+        finally:
+            cursor.close()
+
+    def export(self, full=False, names=None):
+        """
+        Exports the changed zones, or every zone with full.  Returns a dict
+        of counts, the (name, reason) of each skipped zone and the seconds
+        taken.
+        """
+        start = time.time()
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        zones = self.get_zones(names)
+        changed = dict(
+            (zone.id, zone) for zone in zones if full or self.is_changed(zone)
+        )
+        exported = []
+        skipped = []
+
+        if changed:
+            with transaction.atomic():
+                serials = dict(
+                    (zone.id, self.next_serial(zone.serial))
+                    for zone in changed.values()
+                )
+                for zone_id, rows in groupby(
+                    self.get_rows(list(changed)), key=itemgetter(0)
+                ):
+                    zone = changed.pop(zone_id)
+                    if self.write_zone(zone, serials[zone_id], rows):
+                        exported.append((zone, serials[zone_id]))
+                    else:
+                        skipped.append((zone, self.NO_SOA))
+                # Whatever is left had no rows in the view.
+                skipped.extend((zone, self.NO_RECORDS) for zone in changed.values())
+                if exported:
+                    self.save_serials(exported)
+                if skipped:
+                    self.save_skipped(skipped)
+
+        return {
+            "zones": len(zones),
+            "changed": len(exported) + len(skipped),
+            "exported": len(exported),
+            "skipped": sorted((zone.name, reason) for zone, reason in skipped),
+            "seconds": time.time() - start,
+        }
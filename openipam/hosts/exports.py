@@ -0,0 +1,128 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from openipam.hosts.models import HostUserView, HostGroupView
+
+from collections import defaultdict
+from itertools import islice
+
+from netaddr import EUI, IPAddress, IPNetwork
+
+import csv
+import ipaddress
+
+
+class EchoBuffer(object):
+    """File-like object that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    # Addresses come back from netfields as ipaddress objects and macs as
+    # netaddr ones; both are written as they print, as in the CSV export.
+    address_types = (
+        EUI,
+        IPAddress,
+        IPNetwork,
+        ipaddress.IPv4Address,
+        ipaddress.IPv6Address,
+        ipaddress.IPv4Network,
+        ipaddress.IPv6Network,
+    )
+
+    def default(self, o):
+        if isinstance(o, self.address_types):
+            return str(o)
+        return super(ExportJSONEncoder, self).default(o)
+
+
+class HostExport(object):
+    """
+    Streams a host queryset as CSV or JSON.  Rows are read from a
+    server-side cursor and owners are joined a chunk at a time from grouped
+    dictionaries, so memory stays flat however many hosts are exported.
+    """
+
+    # (key, CSV header, values() lookup)
+    columns = (
+        ("hostname", "Hostname", "hostname"),
+        ("mac", "Mac", "mac"),
+        ("expires", "Expires", "expires"),
+        ("ip_address", "IP Address", "addresses__address"),
+        ("mac_last_seen", "Mac Last Seen", "mac_history__stopstamp"),
+        ("ip_last_seen", "IP Last Seen", "ip_history__stopstamp"),
+        ("users", "Users", None),
+        ("groups", "Groups", None),
+        ("description", "Description", "description"),
+    )
+    content_types = {"csv": "text/csv", "json": "application/json"}
+    chunk_size = 2000
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def get_owners(self, macs):
+        users = defaultdict(list)
+        for mac, username, email in HostUserView.objects.filter(
+            host__in=macs
+        ).values_list("host", "user__username", "user__email"):
+            users[mac].append(f"{username} <{email}>" if email else username)
+
+        groups = defaultdict(list)
+        for mac, group_name in HostGroupView.objects.filter(host__in=macs).values_list(
+            "host", "group_name"
+        ):
+            groups[mac].append(group_name)
+
+        return (
+            {mac: ",".join(names) for mac, names in users.items()},
+            {mac: ",".join(names) for mac, names in groups.items()},
+        )
+
+    def chunks(self):
+        """Yields lists of rows, ordered as the columns."""
+        lookups = [lookup for key, header, lookup in self.columns if lookup]
+        values = self.queryset.values(*lookups).iterator()
+        while True:
+            hosts = list(islice(values, self.chunk_size))
+            if not hosts:
+                break
+            users, groups = self.get_owners(set(host["mac"] for host in hosts))
+            for host in hosts:
+                host["users"] = users.get(host["mac"], "")
+                host["groups"] = groups.get(host["mac"], "")
+            yield [
+                [host[lookup or key] for key, header, lookup in self.columns]
+                for host in hosts
+            ]
+
+    def csv_lines(self):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow([header for key, header, lookup in self.columns])
+        for rows in self.chunks():
+            yield "".join(writer.writerow(row) for row in rows)
+
+    def json_lines(self):
+        encoder = ExportJSONEncoder()
+        keys = [key for key, header, lookup in self.columns]
+        separator = ""
+        yield "["
+        for rows in self.chunks():
+            yield separator + ",\n".join(
+                encoder.encode(dict(zip(keys, row))) for row in rows
+            )
+            separator = ",\n"
+        yield "]"
+
+    def response(self, export_format="csv", filename="hosts"):
+        lines = self.json_lines() if export_format == "json" else self.csv_lines()
+        response = StreamingHttpResponse(
+            lines, content_type=self.content_types[export_format]
+        )
+        response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (
+            filename,
+            export_format,
+        )
+        return response
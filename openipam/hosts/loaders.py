@@ -0,0 +1,110 @@
+from django.db.models import F
+
+from openipam.hosts.models import (
+    AttributeToHost,
+    Disabled,
+    HostUserView,
+    HostGroupView,
+)
+from openipam.network.models import Address
+
+from collections import defaultdict
+
+from netaddr import EUI
+
+
+class HostPageLoader(object):
+    """
+    Loads the related rows a host listing renders for a whole page of hosts,
+    one query per kind, keyed by MAC.  Each kind is loaded on first use, so
+    a page only pays for what it shows.
+    """
+
+    def __init__(self, hosts):
+        self.hosts = list(hosts)
+        self.macs = [self.key(host) for host in self.hosts]
+        self._loaded = {}
+
+    @staticmethod
+    def key(host):
+        # Saved hosts carry their MAC as a string, loaded ones as an EUI.
+        return EUI(host.mac)
+
+    def _get(self, kind):
+        if kind not in self._loaded:
+            load = getattr(self, "_load_%s" % kind)
+            self._loaded[kind] = load() if self.hosts else {}
+        return self._loaded[kind]
+
+    def attributes(self, host):
+        return self._get("attributes").get(self.key(host), [])
+
+    def disabled(self, host):
+        return self._get("disabled").get(self.key(host))
+
+    def owners(self, host):
+        users = self._get("user_owners").get(self.key(host), [])
+        groups = self._get("group_owners").get(self.key(host), [])
+        return users, groups
+
+    def master_ip_address(self, host):
+        if not host.is_static or len(host.ip_addresses) < 2:
+            return host.master_ip_address
+        masters = self._get("master_addresses")
+        return masters.get(self.key(host), host.ip_addresses[0])
+
+    def _load_attributes(self):
+        attributes = defaultdict(list)
+        rows = AttributeToHost.objects.filter(mac__in=self.macs).values_list(
+            "mac", "name", "value"
+        )
+        for mac, name, value in rows:
+            attributes[mac].append({"name": name, "value": value})
+        return attributes
+
+    def _load_disabled(self):
+        macs = [
+            self.key(host) for host in self.hosts if getattr(host, "is_disabled", True)
+        ]
+        if not macs:
+            return {}
+        disabled = Disabled.objects.select_related("changed_by").filter(mac__in=macs)
+        return {disabled_host.mac: disabled_host for disabled_host in disabled}
+
+    def _load_user_owners(self):
+        owners = defaultdict(list)
+        rows = HostUserView.objects.filter(host__in=self.macs).values_list(
+            "host", "user__username"
+        )
+        for mac, username in rows:
+            owners[mac].append(username)
+        return owners
+
+    def _load_group_owners(self):
+        owners = defaultdict(list)
+        rows = HostGroupView.objects.filter(host__in=self.macs).values_list(
+            "host", "group_name"
+        )
+        for mac, group_name in rows:
+            owners[mac].append(group_name)
+        return owners
+
+    def _load_master_addresses(self):
+        # Static hosts with several addresses use the one their A record
+        # points at, the lowest if more than one does.
+        macs = [
+            self.key(host)
+            for host in self.hosts
+            if host.is_static and len(host.ip_addresses) > 1
+        ]
+        if not macs:
+            return {}
+        rows = (
+            Address.objects.filter(host__in=macs, arecords__name=F("host__hostname"))
+            .order_by("address")
+            .values_list("host", "address")
+        )
+        masters = {}
+        for mac, address in rows:
+            masters.setdefault(mac, str(address))
+        return masters
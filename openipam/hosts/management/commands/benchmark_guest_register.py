@@ -0,0 +1,154 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rest_framework.test import APIRequestFactory
+
+from openipam.api.views.guests import GuestRegister
+from openipam.conf.ipam_settings import CONFIG
+from openipam.hosts.models import GuestTicket, Host
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import json
+import time
+import urllib.request
+import urllib.error
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Load test guest registration.  Posts registrations for generated macs, "
+        "in process or against a running server, and reports requests/second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ticket", help="A valid guest ticket to register with")
+        parser.add_argument(
+            "-n", "--requests", type=int, default=1000, help="Number of requests"
+        )
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Number of requests in flight at once",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Register each mac this many times, to exercise the upsert",
+        )
+        parser.add_argument(
+            "--mac-prefix",
+            default="02:00:5e",
+            help="Locally administered OUI the generated macs start with",
+        )
+        parser.add_argument(
+            "--ip-address", default="10.0.0.1", help="IP address sent with each request"
+        )
+        parser.add_argument(
+            "--url",
+            help="Full URL of a running guest register endpoint; "
+            "requests go through the view in process when omitted",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            default=False,
+            help="Keep the registered hosts instead of deleting them afterwards",
+        )
+
+    def get_macs(self, prefix, count):
+        return [
+            "%s:%02x:%02x:%02x" % (prefix, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF)
+            for i in range(count)
+        ]
+
+    def post_local(self, payload):
+        view = GuestRegister.as_view()
+        request = self.factory.post("/api/guests/register/", payload, format="json")
+        try:
+            return view(request).status_code
+        finally:
+            connection.close()
+
+    def post_remote(self, payload):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def timed(self, payload):
+        start = time.time()
+        status = self.post(payload)
+        return status, (time.time() - start) * 1000
+
+    def handle(self, *args, **options):
+        if not GuestTicket.objects.filter(ticket=options["ticket"]).exists():
+            raise CommandError("Guest ticket '%s' does not exist." % options["ticket"])
+
+        self.url = options["url"]
+        if self.url:
+            self.post = self.post_remote
+        else:
+            if not CONFIG.get("GUESTS_ENABLED"):
+                raise CommandError("GUESTS_ENABLED must be set to register guests.")
+            self.factory = APIRequestFactory()
+            self.post = self.post_local
+
+        macs = self.get_macs(options["mac_prefix"], options["requests"])
+        payloads = [
+            {
+                "name": "Load Test",
+                "ticket": options["ticket"],
+                "ip_address": options["ip_address"],
+                "mac_address": mac,
+            }
+            for mac in macs * options["repeat"]
+        ]
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(executor.map(self.timed, payloads))
+        elapsed = time.time() - start
+
+        statuses = Counter(status for status, timing in results)
+        timings = sorted(timing for status, timing in results)
+        self.stdout.write(
+            "%s requests in %.2fs, %.1f requests/second"
+            % (len(results), elapsed, len(results) / elapsed)
+        )
+        self.stdout.write(
+            "p50 %.2fms  p95 %.2fms  p99 %.2fms  worst %.2fms"
+            % (
+                timings[len(timings) // 2],
+                timings[int(len(timings) * 0.95) - 1],
+                timings[int(len(timings) * 0.99) - 1],
+                timings[-1],
+            )
+        )
+        self.stdout.write(
+            "status "
+            + "  ".join(
+                "%s: %s" % (status, count) for status, count in sorted(statuses.items())
+            )
+        )
+
+        if not options["keep"]:
+            guest_user = User.objects.get(username__iexact=CONFIG.get("GUEST_USER"))
+            deleted = Host.objects.filter(mac__in=macs, is_guest=True).delete(
+                user=guest_user
+            )
+            self.stdout.write("Deleted %s registered hosts" % deleted)
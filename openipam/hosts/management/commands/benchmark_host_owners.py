@@ -0,0 +1,111 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.auth.models import Permission
+from django.db import connection, transaction
+
+from guardian.shortcuts import get_objects_for_user
+
+from openipam.hosts.models import Host, User
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Compare the guardian materialized and subquery host owner lookups. "
+        "Synthetic hosts are created in a transaction that is always rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("-u", "--user", help="User name to look up hosts for")
+        parser.add_argument(
+            "-n",
+            "--synthetic",
+            type=int,
+            default=0,
+            help="Number of synthetic hosts owned by the user to create first",
+        )
+        parser.add_argument(
+            "-r", "--runs", type=int, default=3, help="Number of runs per lookup"
+        )
+
+    def create_synthetic_hosts(self, user, count):
+        content_type = ContentType.objects.get_for_model(Host)
+        permission = Permission.objects.get(
+            content_type=content_type, codename="is_owner_host"
+        )
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                """
+                INSERT INTO hosts (mac, hostname, expires, changed, changed_by)
+                    SELECT lpad(to_hex(i), 12, '0')::macaddr,
+                        'benchmark-' || i || '.invalid', now(), now(), %(user)s
+                    FROM generate_series(1, %(count)s) AS i
+                    ON CONFLICT DO NOTHING
+            """,
+                {"user": user.pk, "count": count},
+            )
+            cursor.execute(
+                """
+                INSERT INTO guardian_userobjectpermission
+                    (object_pk, content_type_id, permission_id, user_id)
+                    SELECT hosts.mac::text, %(content_type)s, %(permission)s, %(user)s
+                    FROM hosts WHERE hosts.hostname LIKE 'benchmark-%%.invalid'
+                    ON CONFLICT DO NOTHING
+            """,
+                {
+                    "user": user.pk,
+                    "content_type": content_type.pk,
+                    "permission": permission.pk,
+                },
+            )
+        finally:
+            cursor.close()
+
+    def legacy_by_owner(self, user):
+        hosts = get_objects_for_user(
+            User.objects.get(pk=user.pk),
+            "hosts.is_owner_host",
+            use_groups=True,
+            with_superuser=False,
+        )
+        return Host.objects.filter(pk__in=[host.pk for host in hosts])
+
+    def time_lookup(self, name, lookup, runs):
+        timings = []
+        for run in range(runs):
+            start = time.time()
+            count = len(list(lookup().values_list("pk", flat=True)))
+            timings.append(time.time() - start)
+        self.stdout.write(
+            "%-10s %8d hosts  best %.3fs  avg %.3fs"
+            % (name, count, min(timings), sum(timings) / len(timings))
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["user"]).first()
+        if not user:
+            raise CommandError("User does not exist")
+
+        with transaction.atomic():
+            if options["synthetic"]:
+                start = time.time()
+                self.create_synthetic_hosts(user, options["synthetic"])
+                self.stdout.write(
+                    "Created %s synthetic hosts in %.2fs"
+                    % (options["synthetic"], time.time() - start)
+                )
+
+            self.time_lookup(
+                "guardian", lambda: self.legacy_by_owner(user), options["runs"]
+            )
+            self.time_lookup(
+                "subquery",
+                lambda: Host.objects.by_owner(user, use_groups=True),
+                options["runs"],
+            )
+
+            transaction.set_rollback(True)
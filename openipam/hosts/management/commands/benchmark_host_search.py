@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from openipam.hosts.models import HostSearch
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Time free-text host searches against the host_search index."
+
+    # Typical operator searches: hostname prefixes, full and partial IPs,
+    # mac prefixes and description words.
+    default_queries = [
+        "a",
+        "lab-",
+        "printer",
+        "www.usu.edu",
+        "129.123.",
+        "129.123.1.1",
+        "10.0.0.",
+        "00:50:56",
+        "f0:de:f1",
+        "server",
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "queries", nargs="*", help="Search terms, defaults to a typical set"
+        )
+        parser.add_argument(
+            "-r", "--runs", type=int, default=5, help="Number of runs per query"
+        )
+
+    def handle(self, *args, **options):
+        queries = options["queries"] or self.default_queries
+        all_timings = []
+
+        for query in queries:
+            timings = []
+            for run in range(options["runs"]):
+                start = time.time()
+                results = HostSearch.objects.search(query)
+                timings.append((time.time() - start) * 1000)
+            all_timings += timings
+            self.stdout.write(
+                "%-20s %6d hosts  best %8.2fms  worst %8.2fms"
+                % (query, len(results), min(timings), max(timings))
+            )
+
+        all_timings.sort()
+        self.stdout.write(
+            "p50 %.2fms  p95 %.2fms"
+            % (
+                all_timings[len(all_timings) // 2],
+                all_timings[int(len(all_timings) * 0.95) - 1],
+            )
+        )
@@ -3,8 +3,8 @@ import sys
 import re
 import os
 
+from openipam.conf.ipam_settings import CONFIG
 from openipam.hosts.models import Host, User
-from django.db import transaction
 
 
 class Command(BaseCommand):
@@ -32,8 +32,14 @@ class Command(BaseCommand):
         parser.add_argument(
             "-uid", "--user-id", help="User id to delete mac addresses with"
         )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=CONFIG.get("HOST_DELETE_BATCH_SIZE"),
+            help="Hosts deleted per transaction",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         if not bool(options["user"]) != bool(options["user_id"]):
             raise Exception("Must specify, exclusively, username or user id")
@@ -79,7 +85,14 @@ class Command(BaseCommand):
         if not mac_addrs:
             raise Exception("Did not specify any mac addresses")
 
-        Host.objects.filter(pk__in=mac_addrs).delete(user)
+        def progress(deleted, total):
+            print(
+                f"{self.CYAN_ANSI_SEQ}Deleted {deleted}/{total} hosts{self.END_ANSI_SEQ}"
+            )
+
+        Host.objects.filter(pk__in=mac_addrs).delete(
+            user, batch_size=options["batch_size"], progress=progress
+        )
 
         print(
             f"{self.CYAN_ANSI_SEQ}Successfully removed (if found) hosts with the following mac addresses:{self.END_ANSI_SEQ}{self.RED_ANSI_SEQ}\n  "
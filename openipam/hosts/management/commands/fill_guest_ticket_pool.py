@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from openipam.conf.ipam_settings import CONFIG
+from openipam.hosts.models import GuestTicket
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Top up the pool of pregenerated guest tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--size",
+            type=int,
+            default=CONFIG.get("GUEST_TICKET_POOL_SIZE"),
+            help="Number of unused tickets to keep in the pool.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.time()
+        added = GuestTicket.objects.fill_pool(options["size"])
+        self.stdout.write(
+            "Added %s guest tickets to the pool in %.2fs" % (added, time.time() - start)
+        )
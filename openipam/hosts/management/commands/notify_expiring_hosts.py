@@ -1,18 +1,20 @@
 # Host expiration notification
 
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail, send_mass_mail, get_connection
+from django.core.mail import EmailMessage, get_connection
 from django.utils import timezone
 
 
 from openipam.conf.ipam_settings import CONFIG
 from openipam.hosts.models import Host
-from openipam.user.utils.user_utils import populate_user_from_ldap
+from openipam.hosts.notifications import ExpiringHostNotices, send_in_batches
+
+import time
 
 
 class Command(BaseCommand):
     args = ""
-    help = "Convert Dns Type Permissions"
+    help = "Notify owners of hosts that are about to expire"
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -37,18 +39,37 @@ class Command(BaseCommand):
             action="store_true",
             dest="noasync",
             default=False,
-            help="This flag will sent using send_mail instead of send_mass_mail",
+            help="Send and report messages one at a time instead of in batches",
+        )
+        parser.add_argument(
+            "-d",
+            "--dry-run",
+            action="store_true",
+            dest="dry_run",
+            default=False,
+            help="Build every notification and report timings, but send nothing",
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            dest="batch_size",
+            default=100,
+            help="Messages sent per batch over the mail connection",
         )
 
     def handle(self, *args, **options):
         test = options["test"]
         count = options["count"]
         noasync = options["noasync"]
-        connection = None
+        dry_run = options["dry_run"]
+        batch_size = 1 if noasync else options["batch_size"]
         if test:
             connection = get_connection(
                 backend="django.core.mail.backends.console.EmailBackend"
             )
+        else:
+            connection = get_connection()
 
         self.stdout.write("Sending Notifications...")
 
@@ -144,73 +165,66 @@ http://usu.service-now.com (Issue Tracking System)
         row_heading = "Hostname:                                MAC:                  Expiring in:   Description:"
         row_fmt = "%(hostname)-40s %(mac)-22s %(days)3s days      %(description)s"
 
+        templates = {
+            "static": (static_subject, static_msg),
+            "dynamic": (dynamic_subject, dynamic_msg),
+        }
+
         # Get list of people who need to be notified.
-        host_qs = Host.objects.prefetch_related("pools").by_expiring(omit_guests=True)
-
-        users_to_notify = {}
-        messages = []
-        bad_users = []
-
-        for host in host_qs:
-            host_users = host.get_owners(users_only=True)
-
-            for user in host_users:
-                if user not in users_to_notify:
-                    users_to_notify[user] = {"static": [], "dynamic": []}
-                if host.is_static:
-                    users_to_notify[user]["static"].append(host)
-                else:
-                    users_to_notify[user]["dynamic"].append(host)
-
-        for user, host_types in list(users_to_notify.items()):
-            if not user.email:
-                e_user = populate_user_from_ldap(user=user)
-            else:
-                e_user = user
-            if e_user and e_user.email:
-                mesg_type = "static" if host_types.get("static") else "dynamic"
-                row_hosts = []
-                for host_type, hosts in list(host_types.items()):
-                    for host in hosts:
-                        row_hosts.append(
-                            row_fmt
-                            % {
-                                "hostname": host.hostname,
-                                "mac": host.mac,
-                                "days": host.expire_days,
-                                "description": host.description,
-                            }
-                        )
-                messages.append(
-                    (
-                        locals()["%s_subject" % mesg_type],
-                        locals()["%s_msg" % mesg_type]
-                        % {
-                            "name": e_user.get_full_name(),
-                            "username": e_user.username,
-                            "rows": "%s\n%s" % (row_heading, "\n".join(row_hosts)),
-                        },
-                        from_address,
-                        [e_user.email],
-                    )
+        host_qs = Host.objects.by_expiring()
+        notices = ExpiringHostNotices(host_qs)
+        notices.load()
+
+        def build_messages():
+            for user, static_hosts, dynamic_hosts in notices.recipients():
+                start = time.time()
+                subject, body = templates["static" if static_hosts else "dynamic"]
+                row_hosts = [
+                    row_fmt
+                    % {
+                        "hostname": host["hostname"],
+                        "mac": host["mac"],
+                        "days": host["expire_days"],
+                        "description": host["description"],
+                    }
+                    for host in static_hosts + dynamic_hosts
+                ]
+                message = EmailMessage(
+                    subject,
+                    body
+                    % {
+                        "name": user.get_full_name(),
+                        "username": user.username,
+                        "rows": "%s\n%s" % (row_heading, "\n".join(row_hosts)),
+                    },
+                    from_address,
+                    [user.email],
+                    connection=connection,
                 )
-            else:
-                bad_users.append(user.username)
+                notices.timings["render"] += time.time() - start
+                if noasync:
+                    self.stdout.write("Sending email to %s..." % user.email)
+                yield message
 
-        if not count:
-            if noasync:
-                for message in messages:
-                    self.stdout.write("Sending email to %s..." % ",".join(message[3]))
-                    send_mail(*message, fail_silently=False, connection=connection)
-            else:
-                send_mass_mail(messages, fail_silently=False, connection=connection)
+        start = time.time()
+        if count or dry_run:
+            sent = sum(1 for message in build_messages())
+        else:
+            sent = send_in_batches(build_messages(), connection, batch_size)
 
             if not test:
-                host_qs.update(last_notified=timezone.now())
+                Host.objects.filter(mac__in=list(notices.hosts)).update(
+                    last_notified=timezone.now()
+                )
+        notices.timings["total"] = time.time() - start + notices.timings["load"]
 
         self.stdout.write(
-            "%s Notifications have been sent for %s hosts"
-            % (len(messages), len(host_qs))
+            "%s Notifications have been sent for %s hosts" % (sent, len(notices.hosts))
         )
-        self.stdout.write("%s users have no email address." % len(bad_users))
-        self.stdout.write("\n".join(bad_users))
+        self.stdout.write("%s users have no email address." % len(notices.bad_users))
+        self.stdout.write("\n".join(notices.bad_users))
+
+        if dry_run:
+            self.stdout.write("Timings (seconds):")
+            for stage in ("load", "ldap", "render", "total"):
+                self.stdout.write("  %-8s %.3f" % (stage, notices.timings[stage]))
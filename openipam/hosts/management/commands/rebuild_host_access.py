@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from openipam.hosts.models import HostAccess
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Rebuild the host access index used for host change permissions."
+
+    def handle(self, *args, **options):
+        start = time.time()
+        HostAccess.objects.rebuild()
+        self.stdout.write(
+            "Rebuilt %s host access rows in %.2fs"
+            % (HostAccess.objects.count(), time.time() - start)
+        )
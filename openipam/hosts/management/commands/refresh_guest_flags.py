@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from openipam.hosts.models import Host
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Re-flag guest hosts from GUEST_HOSTNAME_FORMAT, e.g. after it changes."
+
+    def handle(self, *args, **options):
+        changed = Host.objects.refresh_guest_flags()
+        self.stdout.write("Updated the guest flag on %s hosts" % changed)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from openipam.hosts.models import HostSummary
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Rebuild every row of the host summary used by the host list.  Triggers "
+        "keep it current, this repairs it after bulk loads that bypass them."
+    )
+
+    def handle(self, *args, **options):
+        start = time.time()
+        HostSummary.objects.rebuild()
+        self.stdout.write(
+            "Rebuilt %s host summary rows in %.2fs"
+            % (HostSummary.objects.count(), time.time() - start)
+        )
@@ -13,6 +13,15 @@ class Command(BaseCommand):
         url = options.get("url", None)
 
         if url:
-            import_ouis(manuf=url)
+            stats = import_ouis(manuf=url)
         else:
-            import_ouis()
+            stats = import_ouis()
+
+        self.stdout.write(
+            "Parsed %(parsed)s OUIs in %(parse_time).2fs, loaded in %(load_time).2fs"
+            % stats
+        )
+        self.stdout.write(
+            "Applied in %(apply_time).2fs: %(inserted)s inserted, %(updated)s updated, "
+            "%(deleted)s deleted" % stats
+        )
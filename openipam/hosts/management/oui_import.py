@@ -1,8 +1,10 @@
-from openipam.hosts.models import OUI
-from django.db import transaction
+from openipam.hosts.models import OUI, HostSummary
+from django.db import connection, transaction
 import requests
 
+import io
 import re
+import time
 
 # manuf = 'https://code.wireshark.org/review/gitweb?p=wireshark.git;a=blob_plain;f=manuf'
 manuf = "file:///usr/share/wireshark/manuf"
@@ -10,6 +12,64 @@ manuf = "file:///usr/share/wireshark/manuf"
 maxmask = 0xFFFFFFFFFFFF
 maxbits = 48
 
+# Parsed rows sent to the staging table per COPY.
+chunk_size = 5000
+
+staging_sql = """
+    CREATE TEMPORARY TABLE ouis_staging (
+        line serial,
+        start macaddr NOT NULL,
+        stop macaddr NOT NULL,
+        shortname varchar(255),
+        name varchar(255)
+    ) ON COMMIT DROP
+"""
+
+# Apply the staged file as a diff, so unchanged ranges keep their rows and
+# ids (the newest id wins overlapping ranges) and readers never see an
+# empty table.  Ranges are keyed on (start, stop); the last line wins.
+apply_sql = (
+    """
+    CREATE TEMPORARY TABLE ouis_incoming ON COMMIT DROP AS
+        SELECT DISTINCT ON (start, stop) line, start, stop, shortname, name
+        FROM ouis_staging
+        ORDER BY start, stop, line DESC
+    """,
+    """
+    DELETE FROM ouis
+        WHERE NOT EXISTS (
+                SELECT 1 FROM ouis_incoming
+                WHERE ouis_incoming.start = ouis.start
+                    AND ouis_incoming.stop = ouis.stop
+            )
+            OR EXISTS (
+                SELECT 1 FROM ouis AS newer
+                WHERE newer.start = ouis.start
+                    AND newer.stop = ouis.stop
+                    AND newer.id > ouis.id
+            )
+    """,
+    """
+    UPDATE ouis
+        SET shortname = ouis_incoming.shortname, name = ouis_incoming.name
+        FROM ouis_incoming
+        WHERE ouis_incoming.start = ouis.start
+            AND ouis_incoming.stop = ouis.stop
+            AND (ouis.shortname IS DISTINCT FROM ouis_incoming.shortname
+                OR ouis.name IS DISTINCT FROM ouis_incoming.name)
+    """,
+    """
+    INSERT INTO ouis (start, stop, shortname, name)
+        SELECT start, stop, shortname, name FROM ouis_incoming
+        WHERE NOT EXISTS (
+            SELECT 1 FROM ouis
+            WHERE ouis.start = ouis_incoming.start
+                AND ouis.stop = ouis_incoming.stop
+        )
+        ORDER BY line
+    """,
+)
+
 
 def generate_mask(bits):
     if bits > 48:
@@ -39,58 +99,136 @@ def find_end(mac, bits):
     return int_to_mac((mac_to_int(mac) | (~generate_mask(bits)) & maxmask))
 
 
-@transaction.atomic
-def import_ouis(manuf=manuf):
-    OUI.objects.all().delete()
-
+def read_lines(manuf):
+    """Yields the lines of a manuf file or URL without reading it all in."""
     file_uri_prefix = "file://"
 
-    is_file = True if manuf[len(file_uri_prefix)] == file_uri_prefix else False
-
-    if is_file:
-        filename = manuf[len(file_uri_prefix) :]
-        lines = open(filename).readlines()
+    if manuf.startswith(file_uri_prefix):
+        with open(manuf[len(file_uri_prefix) :]) as manuf_file:
+            for line in manuf_file:
+                yield line
     else:
-        data = requests.get(manuf)
-        lines = data.text.split("\n")
-
-    for line in lines:
-        line = line.strip()
-        if line and line[0] != "#":
-            maskbits = None
-            oui, rest = line.split("\t", 1)
-            if "#" in rest and "[TR" not in rest:
-                shortname, longname = rest.split("#", 1)
-            else:
-                shortname, longname = rest, rest
-
-            if "/" in oui:
-                oui, maskbits = oui.split("/")
-                maskbits = int(maskbits)
-
-            oui = re.sub("[.: \t\n-]", "", oui)
-
-            if maskbits is None:
-                if len(oui) == 6:
-                    maskbits = maxbits / 2
-                elif len(oui) == 12:
-                    maskbits = maxbits
-                else:
-                    raise Exception(
-                        "Failed to find mask for %s (%s, %s)" % (line, oui, maskbits)
-                    )
-
-            if len(oui) < 12:
-                # pad with zeros on the right
-                oui = [oui] + (12 - len(oui)) * ["0"]
-                oui = "".join(oui)
-
-            shortname = shortname.strip()
-            longname = longname.strip()
-
-            OUI.objects.create(
-                start=oui,
-                stop=find_end(oui, maskbits),
-                shortname=shortname,
-                name=longname,
+        response = requests.get(manuf, stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            yield line
+
+
+def parse_line(line):
+    """Returns (start, stop, shortname, name) for a manuf line, or None."""
+    line = line.strip()
+    if not line or line[0] == "#":
+        return None
+
+    maskbits = None
+    oui, rest = line.split("\t", 1)
+    if "#" in rest and "[TR" not in rest:
+        shortname, longname = rest.split("#", 1)
+    elif "\t" in rest:
+        shortname, longname = rest.split("\t", 1)
+    else:
+        shortname, longname = rest, rest
+
+    if "/" in oui:
+        oui, maskbits = oui.split("/")
+        maskbits = int(maskbits)
+
+    oui = re.sub("[.: \t\n-]", "", oui)
+
+    if maskbits is None:
+        if len(oui) == 6:
+            maskbits = maxbits // 2
+        elif len(oui) == 12:
+            maskbits = maxbits
+        else:
+            raise Exception(
+                "Failed to find mask for %s (%s, %s)" % (line, oui, maskbits)
             )
+
+    if len(oui) < 12:
+        # pad with zeros on the right
+        oui = [oui] + (12 - len(oui)) * ["0"]
+        oui = "".join(oui)
+
+    return (
+        oui,
+        find_end(oui, maskbits),
+        shortname.strip()[:255],
+        longname.strip()[:255],
+    )
+
+
+def copy_escape(value):
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(cursor, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(copy_escape(value) for value in row))
+        buf.write("\n")
+    buf.seek(0)
+    cursor.copy_from(
+        buf, "ouis_staging", columns=("start", "stop", "shortname", "name")
+    )
+
+
+@transaction.atomic
+def import_ouis(manuf=manuf):
+    """
+    Streams a manuf file into a staging table in chunks with COPY, then
+    applies only the changed ranges to ouis.  Returns counts and timings.
+    """
+    stats = {"parsed": 0, "deleted": 0, "updated": 0, "inserted": 0}
+    parse_time = load_time = 0.0
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(staging_sql)
+
+        rows = []
+        start = time.time()
+        for line in read_lines(manuf):
+            row = parse_line(line)
+            if row is None:
+                continue
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                parse_time += time.time() - start
+                start = time.time()
+                copy_rows(cursor, rows)
+                load_time += time.time() - start
+                stats["parsed"] += len(rows)
+                rows = []
+                start = time.time()
+        parse_time += time.time() - start
+        if rows:
+            start = time.time()
+            copy_rows(cursor, rows)
+            load_time += time.time() - start
+            stats["parsed"] += len(rows)
+
+        start = time.time()
+        create_sql, delete_sql, update_sql, insert_sql = apply_sql
+        cursor.execute(create_sql)
+        cursor.execute(delete_sql)
+        stats["deleted"] = cursor.rowcount
+        cursor.execute(update_sql)
+        stats["updated"] = cursor.rowcount
+        cursor.execute(insert_sql)
+        stats["inserted"] = cursor.rowcount
+        apply_time = time.time() - start
+    finally:
+        cursor.close()
+
+    if stats["deleted"] or stats["updated"] or stats["inserted"]:
+        HostSummary.objects.refresh_vendors()
+        OUI.objects.invalidate()
+
+    stats.update(parse_time=parse_time, load_time=load_time, apply_time=apply_time)
+    return stats
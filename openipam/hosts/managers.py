@@ -2,28 +2,95 @@ from django.db.models.query import QuerySet
 from django.db.models import Q, Manager
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from django.db import connection
+from django.contrib.admin.models import LogEntry, DELETION
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.db import connection, transaction, IntegrityError
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.utils.encoding import force_text
 
 from openipam.network.models import DhcpGroup, Pool, Network
 from openipam.conf.ipam_settings import CONFIG
+from openipam.core.utils.cache_version import (
+    changes_pending,
+    get_cache_version,
+    invalidate_on_commit,
+)
+from openipam.core.utils.permissions import PermissionSubquery
 from openipam.conf.settings import HOSTNAME_VALIDATION_REGEX
 
 from six import string_types
 
-from functools import reduce
+from guardian.shortcuts import get_users_with_perms
 
-from guardian.shortcuts import (
-    get_objects_for_user,
-    get_objects_for_group,
-    get_users_with_perms,
-)
+from netaddr import EUI
 
 # from netfields import NetManager
 
-import operator
 import re
+import bisect
+import heapq
+import random
+import string
+
+
+def generate_guest_ticket():
+    """Generates a human-readable string for a ticket."""
+    vowels = ("a", "e", "i", "o", "u")
+    consonants = [a for a in string.ascii_lowercase if a not in vowels]
+    groups = ("th", "ch", "sh", "kl", "gr", "br")
+
+    num_vowels = len(vowels) - 1
+    num_consonants = len(consonants) - 1
+    num_groups = len(groups) - 1
+
+    vowel = []
+    cons = []
+    group = []
+
+    for i in range(4):
+        vowel.append(vowels[random.randint(0, num_vowels)])
+        cons.append(consonants[random.randint(0, num_consonants)])
+        group.append(groups[random.randint(0, num_groups)])
+
+    structure = []
+    structure.append(
+        "%s%s%s%s%s%s%s%s"
+        % (
+            cons[0],
+            vowel[0],
+            cons[1],
+            cons[2],
+            vowel[1],
+            cons[3],
+            vowel[2],
+            group[0],
+        )
+    )
+    structure.append(
+        "%s%s%s%s%s%s" % (group[0], vowel[0], cons[0], cons[1], vowel[1], group[1])
+    )
+    structure.append("%s%s%s%s%s" % (group[0], vowel[0], cons[0], vowel[1], "s"))
+    structure.append("%s%s%s%s%s" % (vowel[0], group[0], vowel[1], cons[0], vowel[2]))
+    structure.append("%s%s%s%s%s" % (group[0], vowel[0], cons[0], vowel[1], group[1]))
+    structure.append("%s%s%s%s" % (vowel[0], group[0], vowel[1], group[1]))
+    structure.append(
+        "%s%s%s%s%s%s%s%s"
+        % (
+            cons[0],
+            vowel[0],
+            cons[1],
+            vowel[1],
+            cons[2],
+            vowel[2],
+            cons[3],
+            vowel[2],
+        )
+    )
+    structure.append("%s%s%s%s%s" % (group[0], vowel[1], group[1], vowel[1], cons[0]))
+
+    return structure[random.randint(0, len(structure) - 1)]
 
 
 class HostQuerySet(QuerySet):
@@ -32,40 +99,35 @@ class HostQuerySet(QuerySet):
             select={
                 "vendor": """
             SELECT ouis.shortname from ouis
-                WHERE hosts.mac >= ouis.start AND hosts.mac <= ouis.stop
+                WHERE macaddr_range(ouis.start, ouis.stop, '[]') @> hosts.mac
                 ORDER BY ouis.id DESC LIMIT 1"""
             }
         )
 
     def by_owner(self, user, use_groups=False, ids_only=False):
-        User = get_user_model()
-
-        # Temporarily set superuser to false so we can get only permission relations
-        perm_user = User.objects.get(pk=user.pk)
-
-        hosts = get_objects_for_user(
-            perm_user,
-            "hosts.is_owner_host",
+        hosts = PermissionSubquery(
+            self.model,
+            ["hosts.is_owner_host"],
+            user=user,
             use_groups=use_groups,
             with_superuser=False,
-        )
+        ).filter(self)
 
         if ids_only:
-            return tuple([host.pk for host in hosts])
+            return tuple(hosts.values_list("pk", flat=True))
         else:
-            return self.filter(pk__in=[host.pk for host in hosts])
+            return hosts
 
     def by_group(self, group):
-        hosts = get_objects_for_group(group, "hosts.is_owner_host")
-        return self.filter(pk__in=[host.pk for host in hosts])
+        return self.by_groups([group])
 
     def by_groups(self, groups):
-        hosts = []
-        for group in groups:
-            hosts.append(
-                obj.pk for obj in get_objects_for_group(group, "hosts.is_owner_host")
-            )
-        return self.filter(pk__in=hosts)
+        if not groups:
+            return self.none()
+
+        return PermissionSubquery(
+            self.model, ["hosts.is_owner_host"], groups=groups
+        ).filter(self)
 
     def by_change_perms(self, user, pk=None, ids_only=False):
         # If global permission set, then return all.
@@ -76,61 +138,34 @@ class HostQuerySet(QuerySet):
             else:
                 return self.all()
         else:
-            host_perms = get_objects_for_user(
-                user, ["hosts.is_owner_host", "hosts.change_host"], any_perm=True
-            ).values_list("mac", flat=True)
-            domain_perms = get_objects_for_user(
-                user, ["dns.is_owner_domain", "dns.change_domain"], any_perm=True
-            ).values_list("name", flat=True)
-            network_perms = get_objects_for_user(
-                user,
-                ["network.is_owner_network", "network.change_network"],
-                any_perm=True,
-            ).values_list("network", flat=True)
-
-            perms_q_list = [Q(hostname__endswith=name) for name in domain_perms]
-            perms_q_list.append(Q(mac__in=host_perms))
-            perms_q_list.append(Q(addresses__network__in=network_perms))
-
-            qs = self.filter(reduce(operator.or_, perms_q_list))
+            # Host, domain and network object permissions are precomputed
+            # into host_access, see HostAccessManager.
+            qs = self.filter(user_access__user=user)
 
             if pk:
-                qs = qs.filter(pk=pk).first()
+                return qs.filter(pk=pk).first()
 
             if ids_only:
-                return tuple([host.pk for host in qs])
+                return tuple(qs.values_list("pk", flat=True))
             else:
                 return qs
 
-    def by_expiring(self, ids_only=False, omit_guests=False):
-        cursor = connection.cursor()
-        try:
-            cursor.execute(
-                """
-                SELECT DISTINCT h.mac from hosts h
-                    CROSS JOIN notifications n
-                    WHERE h.expires > now()
-                        AND (h.last_notified IS NULL OR (now() - n.notification) > h.last_notified)
-                        AND (h.expires - n.notification) < now()
-                        AND UPPER(h.hostname::text) NOT LIKE UPPER('g-%%')
-                        AND UPPER(h.hostname::text) NOT LIKE UPPER('%%.guests.usu.edu')
-            """
-            )
-            hosts = [host[0] for host in cursor.fetchall()]
-        finally:
-            cursor.close()
+    # notify_due is maintained by triggers (see the host_notify_due
+    # migration); hosts can only be due within the longest notification
+    # interval before they expire, which bounds the index range scan.
+    expiring_where = [
+        "hosts.notify_due < now()",
+        "hosts.notify_due > now() - (SELECT max(notification) FROM notifications)",
+        "hosts.expires > now()",
+    ]
 
+    def by_expiring(self, ids_only=False, omit_guests=True):
+        hosts = self.extra(where=self.expiring_where)
         if omit_guests is True:
-            guest_hostname_prefix = CONFIG.get("GUEST_HOSTNAME_FORMAT")[0]
-            guest_hostname_suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")[1]
-
-            hosts = self.filter(mac__in=hosts).exclude(
-                hostname__istartswith=guest_hostname_prefix,
-                hostname__iendswith=guest_hostname_suffix,
-            )
+            hosts = hosts.filter(is_guest=False)
 
-        if ids_only is False:
-            hosts = self.filter(mac__in=hosts)
+        if ids_only is True:
+            return list(hosts.values_list("mac", flat=True))
 
         return hosts
 
@@ -165,17 +200,646 @@ class HostQuerySet(QuerySet):
         except self.model.DoesNotExist:
             return None
 
-    def delete(self, user=None, **kwargs):
+    # Removes everything hanging off a batch of hosts, then the hosts.  The
+    # changed_by stamps are written first so the log triggers record who
+    # deleted the rows.
+    bulk_delete_sql = (
+        """
+        UPDATE dns_records SET changed = %(now)s, changed_by = %(user)s
+            WHERE mac = ANY(%(macs)s::macaddr[])
+        """,
+        "DELETE FROM dns_records WHERE mac = ANY(%(macs)s::macaddr[])",
+        "DELETE FROM dhcp_dns_records WHERE name = ANY(%(hostnames)s)",
+        "DELETE FROM freeform_attributes_to_hosts WHERE mac = ANY(%(macs)s::macaddr[])",
+        "DELETE FROM structured_attributes_to_hosts WHERE mac = ANY(%(macs)s::macaddr[])",
+        "DELETE FROM hosts_to_pools WHERE mac = ANY(%(macs)s::macaddr[])",
+        "DELETE FROM leases WHERE mac = ANY(%(macs)s::macaddr[])",
+        """
+        DELETE FROM guardian_userobjectpermission
+            WHERE content_type_id = %(content_type)s
+                AND object_pk = ANY(%(macs)s::macaddr[]::text[])
+        """,
+        """
+        DELETE FROM guardian_groupobjectpermission
+            WHERE content_type_id = %(content_type)s
+                AND object_pk = ANY(%(macs)s::macaddr[]::text[])
+        """,
+        "DELETE FROM host_access WHERE mac = ANY(%(macs)s::macaddr[])",
+        """
+        UPDATE hosts SET changed = %(now)s, changed_by = %(user)s
+            WHERE mac = ANY(%(macs)s::macaddr[])
+        """,
+        "DELETE FROM hosts WHERE mac = ANY(%(macs)s::macaddr[])",
+    )
+
+    def delete(self, user=None, batch_size=None, progress=None, **kwargs):
+        """
+        Deletes the hosts set-wise, committing every batch_size hosts.  Per
+        batch the addresses are released in one statement, a DELETION
+        LogEntry is bulk created for each host, and each kind of related row
+        is removed with a single statement.  progress, if given, is called
+        with (deleted, total) after each batch.  Returns the number deleted.
+        """
         from openipam.network.models import Address
 
         if not user:
             raise Exception("A User must be given to delete hosts.")
 
-        # Release all addresses for host in queryset
-        Address.objects.filter(host__in=self.all()).release(user=user)
+        batch_size = batch_size or CONFIG.get("HOST_DELETE_BATCH_SIZE")
+        content_type = ContentType.objects.get_for_model(self.model)
+        macs = [str(mac) for mac in self.order_by("mac").values_list("mac", flat=True)]
+        total = len(macs)
+        deleted = 0
+
+        for start in range(0, total, batch_size):
+            batch = macs[start : start + batch_size]
+            with transaction.atomic():
+                hosts = list(
+                    self.model.objects.filter(mac__in=batch).select_for_update()
+                )
+                if hosts:
+                    Address.objects.filter(host__in=batch).release(user=user)
+
+                    now = timezone.now()
+                    LogEntry.objects.bulk_create(
+                        [
+                            LogEntry(
+                                action_time=now,
+                                user_id=user.pk,
+                                content_type_id=content_type.pk,
+                                object_id=str(host.pk),
+                                object_repr=force_text(host)[:200],
+                                action_flag=DELETION,
+                                change_message=serializers.serialize("json", [host]),
+                            )
+                            for host in hosts
+                        ]
+                    )
+
+                    params = {
+                        "now": now,
+                        "user": user.pk,
+                        "content_type": content_type.pk,
+                        "macs": [str(host.mac) for host in hosts],
+                        "hostnames": [host.hostname for host in hosts],
+                    }
+                    cursor = connection.cursor()
+                    try:
+                        for sql in self.bulk_delete_sql:
+                            cursor.execute(sql, params)
+                    finally:
+                        cursor.close()
 
-        for host in self.all():
-            host.delete(user=user)
+            deleted += len(hosts)
+            if progress:
+                progress(deleted, total)
+
+        return deleted
+
+
+class GuestTicketManager(Manager):
+    """
+    Issues guest tickets from a pool of unused tickets generated ahead of
+    time, so handing one out is a single statement instead of a generate
+    and check loop.  When the pool runs dry, issue and take_ticket refill it
+    and try again, a bounded number of times.
+    """
+
+    fill_pool_sql = """
+        INSERT INTO guest_ticket_pool (ticket)
+            SELECT candidate FROM unnest(%s::text[]) AS candidate
+            WHERE NOT EXISTS (
+                SELECT 1 FROM guest_tickets WHERE guest_tickets.ticket = candidate
+            )
+        ON CONFLICT (ticket) DO NOTHING
+    """
+
+    take_sql = """
+        DELETE FROM guest_ticket_pool
+            WHERE ticket = (
+                SELECT ticket FROM guest_ticket_pool
+                LIMIT 1 FOR UPDATE SKIP LOCKED
+            )
+            RETURNING ticket
+    """
+
+    issue_sql = (
+        """
+        WITH taken AS (%s)
+        INSERT INTO guest_tickets (uid, ticket, starts, ends, description)
+            SELECT %%s, ticket, %%s, %%s, %%s FROM taken
+        ON CONFLICT (ticket) DO NOTHING
+        RETURNING id, ticket
+    """
+        % take_sql
+    )
+
+    max_attempts = 3
+
+    def fill_pool(self, size=None):
+        """Tops the pool up to size unused tickets.  Returns the number added."""
+        size = size or CONFIG.get("GUEST_TICKET_POOL_SIZE")
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT count(*) FROM guest_ticket_pool")
+            missing = size - cursor.fetchone()[0]
+            added = 0
+            # The word space is small, so some candidates are always taken.
+            for attempt in range(10):
+                if added >= missing:
+                    break
+                candidates = set()
+                while len(candidates) < (missing - added) * 2:
+                    candidates.add(generate_guest_ticket())
+                cursor.execute(self.fill_pool_sql, [list(candidates)])
+                added += cursor.rowcount
+            return added
+        finally:
+            cursor.close()
+
+    def take_ticket(self):
+        """
+        Removes and returns an unused ticket from the pool, refilling the
+        pool first when it has run dry.
+        """
+        cursor = connection.cursor()
+        try:
+            for attempt in range(2):
+                cursor.execute(self.take_sql)
+                row = cursor.fetchone()
+                if row:
+                    return row[0]
+                # One set-based insert instead of testing candidates one by one.
+                self.fill_pool()
+        finally:
+            cursor.close()
+        raise ValidationError("No unused guest tickets could be generated.")
+
+    def issue(self, user, starts, ends, description=None):
+        """
+        Creates a ticket for user in one statement, refilling the pool and
+        trying again when it has run dry.
+        """
+        params = [user.pk, starts, ends, description]
+        cursor = connection.cursor()
+        try:
+            for attempt in range(self.max_attempts):
+                cursor.execute(self.issue_sql, params)
+                row = cursor.fetchone()
+                if row:
+                    break
+                self.fill_pool()
+            else:
+                raise ValidationError("No unused guest tickets could be generated.")
+        finally:
+            cursor.close()
+
+        return self.model(
+            id=row[0],
+            user=user,
+            ticket=row[1],
+            starts=starts,
+            ends=ends,
+            description=description,
+        )
+
+
+class GuestHostManager(Manager):
+    """
+    The guest registration fast path.  The guest user, group, pool and owner
+    permission are looked up once per process and kept until their cached
+    version moves, hostnames come from a sequence instead of a scan under a
+    lock, and the host is upserted by MAC, so registering the same device
+    twice extends its guest host rather than failing.
+    """
+
+    version_key = "ipam_guest_lookups_version"
+    sequence = "guest_hostname_seq"
+    max_attempts = 5
+    _lookups = {"key": None}
+
+    # Only guest hosts are taken over; any other unexpired host keeps its mac.
+    upsert_sql = """
+        INSERT INTO hosts (mac, hostname, description, expires, changed, changed_by, is_guest)
+            VALUES (
+                %(mac)s,
+                %(prefix)s || nextval('guest_hostname_seq') || %(suffix)s,
+                %(description)s, %(expires)s, %(now)s, %(user)s, TRUE
+            )
+        ON CONFLICT (mac) DO UPDATE
+            SET description = EXCLUDED.description,
+                expires = EXCLUDED.expires,
+                changed = EXCLUDED.changed,
+                changed_by = EXCLUDED.changed_by
+            WHERE hosts.is_guest
+        RETURNING hostname, xmax = 0
+    """
+
+    reset_owners_sql = """
+        DELETE FROM hosts_to_pools WHERE mac = %(mac)s AND pool_id <> %(pool)s;
+        DELETE FROM guardian_userobjectpermission
+            WHERE content_type_id = %(content_type)s
+                AND permission_id = %(permission)s
+                AND object_pk = %(mac)s::macaddr::text;
+        DELETE FROM guardian_groupobjectpermission
+            WHERE content_type_id = %(content_type)s
+                AND permission_id = %(permission)s
+                AND object_pk = %(mac)s::macaddr::text;
+    """
+
+    attach_sql = """
+        INSERT INTO hosts_to_pools (mac, pool_id, changed, changed_by)
+            SELECT %(mac)s, %(pool)s, %(now)s, %(user)s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM hosts_to_pools WHERE mac = %(mac)s AND pool_id = %(pool)s
+            );
+        INSERT INTO guardian_userobjectpermission
+                (object_pk, content_type_id, permission_id, user_id)
+            VALUES (%(mac)s::macaddr::text, %(content_type)s, %(permission)s, %(owner)s)
+            ON CONFLICT DO NOTHING;
+        INSERT INTO guardian_groupobjectpermission
+                (object_pk, content_type_id, permission_id, group_id)
+            VALUES (%(mac)s::macaddr::text, %(content_type)s, %(permission)s, %(group)s)
+            ON CONFLICT DO NOTHING;
+    """
+
+    last_index_sql = """
+        SELECT max(
+            substring(hostname FROM %(start)s FOR length(hostname) - %(trim)s)::bigint
+        )
+        FROM hosts
+        WHERE is_guest
+            AND substring(hostname FROM %(start)s FOR length(hostname) - %(trim)s) ~ '^[0-9]+$'
+    """
+
+    def invalidate(self):
+        self.reset()
+        invalidate_on_commit(self.version_key)
+
+    def reset(self):
+        self._lookups.clear()
+        self._lookups["key"] = None
+
+    def _load_lookups(self):
+        from django.contrib.auth.models import Permission
+
+        User = get_user_model()
+
+        content_type = ContentType.objects.get_for_model(self.model)
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        return {
+            "user": User.objects.get(username__iexact=CONFIG.get("GUEST_USER")).pk,
+            "group": Group.objects.get(name=CONFIG.get("GUEST_GROUP")).pk,
+            "pool": Pool.objects.get(name=CONFIG.get("GUEST_POOL")).pk,
+            "content_type": content_type.pk,
+            "permission": Permission.objects.get(
+                content_type=content_type, codename="is_owner_host"
+            ).pk,
+            "prefix": prefix.lower(),
+            "suffix": suffix.lower(),
+        }
+
+    def get_lookups(self):
+        if changes_pending(self.version_key):
+            return self._load_lookups()
+        key = (
+            get_cache_version(self.version_key),
+            CONFIG.get("GUEST_USER"),
+            CONFIG.get("GUEST_GROUP"),
+            CONFIG.get("GUEST_POOL"),
+            tuple(CONFIG.get("GUEST_HOSTNAME_FORMAT")),
+        )
+        lookups = self._lookups
+        if lookups["key"] != key:
+            lookups.update(self._load_lookups(), key=key)
+        return lookups
+
+    def reset_hostname_sequence(self):
+        """Moves the hostname sequence past the highest guest hostname in use."""
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.last_index_sql,
+                {"start": len(prefix) + 1, "trim": len(prefix) + len(suffix)},
+            )
+            last_index = cursor.fetchone()[0]
+            if last_index:
+                cursor.execute("SELECT setval(%s, %s)", [self.sequence, last_index])
+        finally:
+            cursor.close()
+
+    def register(self, mac, expires, description, owner_id):
+        """
+        Registers mac as a guest host in the guest pool, owned by owner_id
+        and the guest group.  Returns (hostname, created).
+        """
+        from openipam.hosts.models import HostAccess
+
+        User = get_user_model()
+
+        params = dict(self.get_lookups())
+        params.update(
+            mac=str(mac).lower(),
+            expires=expires,
+            description=description,
+            owner=owner_id,
+            now=timezone.now(),
+        )
+
+        with transaction.atomic():
+            # An expired host of any kind gives up its mac, as on the full path.
+            expired = self.model.objects.filter(
+                mac=params["mac"], expires__lt=params["now"]
+            )
+            if expired.exists():
+                expired.delete(user=User.objects.get(pk=params["user"]))
+
+            cursor = connection.cursor()
+            try:
+                for attempt in range(self.max_attempts):
+                    # A hostname taken outside the sequence only costs a retry.
+                    try:
+                        with transaction.atomic():
+                            cursor.execute(self.upsert_sql, params)
+                    except IntegrityError:
+                        if attempt == self.max_attempts - 1:
+                            raise
+                    else:
+                        break
+
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValidationError(
+                        "The MAC Address for this guest is already registered "
+                        "on the network. MAC: %s" % params["mac"]
+                    )
+
+                hostname, created = row
+                if not created:
+                    cursor.execute(self.reset_owners_sql, params)
+                cursor.execute(self.attach_sql, params)
+            finally:
+                cursor.close()
+
+            HostAccess.objects.refresh_hosts([params["mac"]])
+
+        return hostname, created
+
+
+class HostAccessManager(Manager):
+    """
+    Maintains the host_access table, a precomputed (user, mac) index of every host
+    a user can change through host, domain or network object permissions.
+    """
+
+    # Object permissions that grant change access to a host.
+    change_perms = (
+        ("hosts", "is_owner_host"),
+        ("hosts", "change_host"),
+        ("dns", "is_owner_domain"),
+        ("dns", "change_domain"),
+        ("network", "is_owner_network"),
+        ("network", "change_network"),
+    )
+
+    access_sql = """
+        WITH perms AS (
+            SELECT auth_permission.id, django_content_type.app_label
+                FROM auth_permission
+                INNER JOIN django_content_type
+                    ON auth_permission.content_type_id = django_content_type.id
+                WHERE (django_content_type.app_label, auth_permission.codename) IN %%(perms)s
+        ),
+        object_perms AS (
+            SELECT uop.user_id, uop.object_pk, perms.app_label
+                FROM guardian_userobjectpermission AS uop
+                INNER JOIN perms ON uop.permission_id = perms.id
+                WHERE %(user_where)s
+
+            UNION
+
+            SELECT users_groups.user_id, gop.object_pk, perms.app_label
+                FROM guardian_groupobjectpermission AS gop
+                INNER JOIN perms ON gop.permission_id = perms.id
+                INNER JOIN users_groups ON gop.group_id = users_groups.group_id
+                WHERE %(group_user_where)s
+        )
+        SELECT object_perms.user_id, hosts.mac FROM object_perms
+            INNER JOIN hosts ON hosts.mac::text = object_perms.object_pk
+            WHERE object_perms.app_label = 'hosts' AND %(host_where)s
+
+        UNION
+
+        SELECT object_perms.user_id, hosts.mac FROM object_perms
+            INNER JOIN domains ON domains.id::text = object_perms.object_pk
+            INNER JOIN hosts ON right(hosts.hostname, length(domains.name)) = domains.name
+            WHERE object_perms.app_label = 'dns' AND %(host_where)s
+
+        UNION
+
+        SELECT object_perms.user_id, hosts.mac FROM object_perms
+            INNER JOIN networks ON networks.network::text = object_perms.object_pk
+            INNER JOIN addresses ON addresses.network = networks.network
+            INNER JOIN hosts ON addresses.mac = hosts.mac
+            WHERE object_perms.app_label = 'network' AND %(host_where)s
+    """
+
+    def _refresh(self, delete_where, user_ids=None, macs=None):
+        user_where = group_user_where = host_where = "TRUE"
+        params = {"perms": tuple(self.change_perms)}
+
+        if user_ids is not None:
+            user_where = "uop.user_id IN %(user_ids)s"
+            group_user_where = "users_groups.user_id IN %(user_ids)s"
+            params["user_ids"] = tuple(user_ids)
+        if macs is not None:
+            host_where = "hosts.mac IN %(macs)s"
+            params["macs"] = tuple(str(mac) for mac in macs)
+
+        sql = self.access_sql % {
+            "user_where": user_where,
+            "group_user_where": group_user_where,
+            "host_where": host_where,
+        }
+
+        with transaction.atomic():
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    "DELETE FROM host_access WHERE %s" % delete_where, params
+                )
+                cursor.execute(
+                    "INSERT INTO host_access (user_id, mac) %s" % sql, params
+                )
+            finally:
+                cursor.close()
+
+    def refresh_users(self, user_ids):
+        user_ids = set(user_ids)
+        if user_ids:
+            self._refresh("user_id IN %(user_ids)s", user_ids=user_ids)
+
+    def refresh_hosts(self, macs):
+        macs = set(str(mac).lower() for mac in macs if mac)
+        if macs:
+            self._refresh("mac IN %(macs)s", macs=macs)
+
+    def refresh_group(self, group_id):
+        User = get_user_model()
+
+        self.refresh_users(
+            User.objects.filter(groups__pk=group_id).values_list("pk", flat=True)
+        )
+
+    def refresh_object_users(self, content_type_id, object_pk):
+        from guardian.models import UserObjectPermission, GroupObjectPermission
+
+        User = get_user_model()
+
+        filters = Q(content_type_id=content_type_id, object_pk=str(object_pk))
+        user_ids = set(
+            UserObjectPermission.objects.filter(filters).values_list(
+                "user_id", flat=True
+            )
+        )
+        group_ids = GroupObjectPermission.objects.filter(filters).values_list(
+            "group_id", flat=True
+        )
+        user_ids.update(
+            User.objects.filter(groups__pk__in=group_ids).values_list("pk", flat=True)
+        )
+        self.refresh_users(user_ids)
+
+    def rebuild(self):
+        self._refresh("TRUE")
+
+
+class HostSearchManager(Manager):
+    """
+    Free-text host lookups against the trigger maintained host_search table.
+    """
+
+    search_sql = """
+        SELECT mac FROM (
+            SELECT mac, max(
+                CASE
+                    WHEN term = %(search)s THEN 3
+                    WHEN term LIKE %(prefix)s THEN 2
+                    ELSE 1
+                END
+            ) AS rank
+            FROM host_search
+            WHERE term = %(search)s
+                OR (kind NOT IN ('ip', 'lease') AND term LIKE %(prefix)s)
+                OR (kind = 'description' AND term LIKE %(contains)s)
+            GROUP BY mac
+        ) AS matches
+        ORDER BY rank DESC, mac
+        LIMIT %(limit)s
+    """
+
+    def search(self, search, limit=None):
+        """Returns the macs of hosts matching search, best matches first."""
+        search = search.strip().lower()
+        if not search:
+            return []
+
+        like_search = (
+            search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.search_sql,
+                {
+                    "search": search,
+                    "prefix": like_search + "%",
+                    "contains": "%" + like_search + "%",
+                    "limit": limit or CONFIG.get("HOST_SEARCH_LIMIT"),
+                },
+            )
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+
+class HostSummaryManager(Manager):
+    """
+    Maintenance for the host_summary table.  Addresses, leases and vendors
+    are kept current by triggers and bulk OUI changes are refreshed here.
+    Lease ends and the ARP last seen stamps change on every DHCP renewal and
+    ARP sweep, so they are not kept in the summary but read live for the
+    hosts on one page.
+    """
+
+    activity_sql = """
+        SELECT
+            hosts.mac,
+            ARRAY(SELECT host(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac
+                ORDER BY leases.address),
+            ARRAY(SELECT leases.ends FROM leases
+                WHERE leases.mac = hosts.mac
+                ORDER BY leases.address),
+            (SELECT max(gul_recent_arp_byaddress.stopstamp)
+                FROM addresses
+                INNER JOIN gul_recent_arp_byaddress
+                    ON gul_recent_arp_byaddress.address = addresses.address
+                WHERE addresses.mac = hosts.mac),
+            (SELECT max(gul_recent_arp_bymac.stopstamp)
+                FROM gul_recent_arp_bymac
+                WHERE gul_recent_arp_bymac.mac = hosts.mac)
+        FROM hosts
+        WHERE hosts.mac = ANY(%s::macaddr[])
+    """
+
+    vendors_sql = """
+        UPDATE host_summary
+        SET vendor = host_summary_rows.vendor
+        FROM host_summary_rows
+        WHERE host_summary.mac = host_summary_rows.mac
+            AND host_summary.vendor IS DISTINCT FROM host_summary_rows.vendor
+    """
+
+    rebuild_sql = """
+        DELETE FROM host_summary;
+        INSERT INTO host_summary (mac, first_address, addresses, leases, vendor)
+            SELECT mac, first_address, addresses, leases, vendor
+            FROM host_summary_rows;
+    """
+
+    def _execute(self, sql):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def page_activity(self, macs):
+        """
+        Returns {mac: (lease addresses, lease ends, ip stamp, mac stamp)} for
+        the hosts of one page, current as of this query.
+        """
+        macs = [str(mac) for mac in macs]
+        if not macs:
+            return {}
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.activity_sql, [macs])
+            return dict((EUI(row[0]), row[1:]) for row in cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def refresh_vendors(self):
+        """Re-resolves vendors after the OUI table changes."""
+        return self._execute(self.vendors_sql)
+
+    def rebuild(self):
+        with transaction.atomic():
+            self._execute(self.rebuild_sql)
+            self._execute(self.stamps_sql)
 
 
 class HostManager(Manager):
@@ -188,6 +852,39 @@ class HostManager(Manager):
         )
         return qs
 
+    guest_flags_sql = """
+        UPDATE hosts SET is_guest = NOT is_guest
+        WHERE is_guest <> (lower(hostname) LIKE %s AND lower(hostname) LIKE %s)
+    """
+
+    @staticmethod
+    def is_guest_hostname(hostname):
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        hostname = hostname.lower()
+        return hostname.startswith(prefix.lower()) and hostname.endswith(suffix.lower())
+
+    def refresh_guest_flags(self):
+        """Re-flags guest hosts, e.g. after GUEST_HOSTNAME_FORMAT changes."""
+
+        def like_escape(value):
+            return (
+                value.lower()
+                .replace("\\", "\\\\")
+                .replace("%", "\\%")
+                .replace("_", "\\_")
+            )
+
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.guest_flags_sql,
+                [like_escape(prefix) + "%", "%" + like_escape(suffix)],
+            )
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
     def get_owners(self, mac):
         host = self.get(mac=mac)
         owners = get_users_with_perms(host, attach_perms=True, with_group_users=False)
@@ -342,3 +1039,73 @@ class HostManager(Manager):
         instance.reset_state()
 
         return instance
+
+
+class OUIManager(Manager):
+    """
+    Resolves macs to vendors against an in-process copy of the OUI ranges.
+    Overlapping ranges are flattened into disjoint segments owned by the
+    newest OUI, matching the ouis.id DESC tie break used in SQL, so each
+    lookup is a bisect.  The copy is reloaded when OUI imports and edits bump
+    its version, which every process sees once committed (see
+    core.utils.cache_version).
+    """
+
+    version_key = "ipam_oui_version"
+    _segments = {"version": None, "starts": [], "ouis": []}
+
+    def invalidate(self):
+        self.reset()
+        invalidate_on_commit(self.version_key)
+
+    def reset(self):
+        self._segments.update(version=None, starts=[], ouis=[])
+
+    def _load_segments(self):
+        ouis = sorted(
+            (int(oui.start), int(oui.stop), oui) for oui in self.get_queryset()
+        )
+        boundaries = sorted(
+            set([start for start, stop, oui in ouis])
+            | set([stop + 1 for start, stop, oui in ouis])
+        )
+
+        starts = []
+        owners = []
+        active = []
+        index = 0
+        for boundary in boundaries:
+            while index < len(ouis) and ouis[index][0] <= boundary:
+                start, stop, oui = ouis[index]
+                heapq.heappush(active, (-oui.pk, stop, oui))
+                index += 1
+            # Drop ranges that ended before this segment.
+            while active and active[0][1] < boundary:
+                heapq.heappop(active)
+            owner = active[0][2] if active else None
+            if not owners or owners[-1] is not owner:
+                starts.append(boundary)
+                owners.append(owner)
+        return starts, owners
+
+    def _get_segments(self):
+        if changes_pending(self.version_key):
+            return self._load_segments()
+        version = get_cache_version(self.version_key)
+        segments = self._segments
+        if segments["version"] != version:
+            starts, ouis = self._load_segments()
+            segments.update(version=version, starts=starts, ouis=ouis)
+        return segments["starts"], segments["ouis"]
+
+    def resolve_many(self, macs):
+        """Returns a dict of each mac to its OUI, or None if unregistered."""
+        starts, ouis = self._get_segments()
+        resolved = {}
+        for mac in macs:
+            index = bisect.bisect_right(starts, int(EUI(mac))) - 1
+            resolved[mac] = ouis[index] if index >= 0 else None
+        return resolved
+
+    def resolve(self, mac):
+        return self.resolve_many([mac])[mac]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_host_access(apps, schema_editor):
+    from openipam.hosts.managers import HostAccessManager
+
+    HostAccessManager().rebuild()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("hosts", "0013_attribute_multiple"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HostAccess",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "host",
+                    models.ForeignKey(
+                        db_column="mac",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="user_access",
+                        to="hosts.Host",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_column="user_id",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="host_access",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={"db_table": "host_access"},
+        ),
+        migrations.AlterUniqueTogether(
+            name="hostaccess", unique_together=set([("user", "host")])
+        ),
+        # Rows follow mac changes made by Host.set_mac_address and go away with
+        # their host or user.
+        migrations.RunSQL(
+            """
+            ALTER TABLE host_access ADD CONSTRAINT host_access_mac_fkey
+                FOREIGN KEY (mac) REFERENCES hosts(mac)
+                ON UPDATE CASCADE ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED;
+            ALTER TABLE host_access ADD CONSTRAINT host_access_user_id_fkey
+                FOREIGN KEY (user_id) REFERENCES users(id)
+                ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED;
+            """,
+            """
+            ALTER TABLE host_access DROP CONSTRAINT host_access_mac_fkey;
+            ALTER TABLE host_access DROP CONSTRAINT host_access_user_id_fkey;
+            """,
+        ),
+        migrations.RunPython(populate_host_access, migrations.RunPython.noop),
+    ]
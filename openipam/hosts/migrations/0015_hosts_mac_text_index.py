@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0014_hostaccess")]
+
+    operations = [
+        # Guardian stores host object_pk as mac::text, index the cast so owner
+        # lookups can join on it.
+        migrations.RunSQL(
+            "CREATE INDEX hosts_mac_text_idx ON hosts ((mac::text));",
+            "DROP INDEX IF EXISTS hosts_mac_text_idx;",
+        )
+    ]
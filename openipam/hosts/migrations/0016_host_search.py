@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Every searchable term of a host: mac, hostname, description, static and
+# leased IPs, DNS names on the host or its addresses, and CNAMEs pointing
+# at those names.
+host_search_sql = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE host_search (
+    id bigserial PRIMARY KEY,
+    mac macaddr NOT NULL,
+    kind varchar(16) NOT NULL,
+    term text NOT NULL
+);
+CREATE INDEX host_search_mac_idx ON host_search (mac);
+CREATE INDEX host_search_term_idx ON host_search (term text_pattern_ops);
+CREATE INDEX host_search_term_trgm_idx ON host_search USING gin (term gin_trgm_ops);
+
+CREATE VIEW host_search_terms AS
+    SELECT hosts.mac, 'mac'::varchar AS kind, hosts.mac::text AS term FROM hosts
+    UNION
+    SELECT hosts.mac, 'hostname', hosts.hostname FROM hosts
+    UNION
+    SELECT hosts.mac, 'description', lower(hosts.description) FROM hosts
+        WHERE hosts.description IS NOT NULL AND hosts.description <> ''
+    UNION
+    SELECT hosts.mac, 'ip', host(addresses.address) FROM hosts
+        INNER JOIN addresses ON addresses.mac = hosts.mac
+    UNION
+    SELECT hosts.mac, 'lease', host(leases.address) FROM hosts
+        INNER JOIN leases ON leases.mac = hosts.mac
+    UNION
+    SELECT hosts.mac, 'dns', dns_records.name FROM hosts
+        INNER JOIN dns_records ON dns_records.mac = hosts.mac
+    UNION
+    SELECT hosts.mac, 'dns', dns_records.name FROM hosts
+        INNER JOIN addresses ON addresses.mac = hosts.mac
+        INNER JOIN dns_records ON dns_records.ip_content = addresses.address
+    UNION
+    SELECT hosts.mac, 'cname', cname.name FROM hosts
+        INNER JOIN dns_records ON dns_records.mac = hosts.mac
+        INNER JOIN dns_records AS cname
+            ON cname.text_content = dns_records.name AND cname.tid = 5;
+
+CREATE FUNCTION host_search_refresh(target macaddr) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    DELETE FROM host_search WHERE mac = target;
+    INSERT INTO host_search (mac, kind, term)
+        SELECT mac, kind, term FROM host_search_terms WHERE mac = target;
+END;
+$$ LANGUAGE plpgsql;
+
+-- OLD and NEW are only referenced on the operations that define them.
+CREATE FUNCTION host_search_mac_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM host_search_refresh(NEW.mac);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM host_search_refresh(OLD.mac);
+    ELSE
+        PERFORM host_search_refresh(OLD.mac);
+        IF NEW.mac IS DISTINCT FROM OLD.mac THEN
+            PERFORM host_search_refresh(NEW.mac);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION host_search_refresh_dns(
+    record_mac macaddr, record_tid integer, record_ip inet, record_text text
+) RETURNS void AS $$
+DECLARE
+    affected macaddr;
+BEGIN
+    FOR affected IN
+        SELECT record_mac
+        UNION SELECT addresses.mac FROM addresses
+            WHERE addresses.address = record_ip
+        UNION SELECT dns_records.mac FROM dns_records
+            WHERE record_tid = 5 AND dns_records.name = record_text
+    LOOP
+        PERFORM host_search_refresh(affected);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION host_search_dns_records_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM host_search_refresh_dns(
+            OLD.mac, OLD.tid, OLD.ip_content, OLD.text_content
+        );
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM host_search_refresh_dns(
+            NEW.mac, NEW.tid, NEW.ip_content, NEW.text_content
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER host_search_hosts
+    AFTER INSERT OR DELETE OR UPDATE OF mac, hostname, description ON hosts
+    FOR EACH ROW EXECUTE PROCEDURE host_search_mac_trigger();
+CREATE TRIGGER host_search_addresses
+    AFTER INSERT OR DELETE OR UPDATE OF mac ON addresses
+    FOR EACH ROW EXECUTE PROCEDURE host_search_mac_trigger();
+CREATE TRIGGER host_search_leases
+    AFTER INSERT OR DELETE OR UPDATE OF mac, address ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_search_mac_trigger();
+CREATE TRIGGER host_search_dns_records
+    AFTER INSERT OR DELETE OR UPDATE OF name, mac, tid, ip_content, text_content
+    ON dns_records
+    FOR EACH ROW EXECUTE PROCEDURE host_search_dns_records_trigger();
+
+INSERT INTO host_search (mac, kind, term)
+    SELECT mac, kind, term FROM host_search_terms;
+"""
+
+reverse_host_search_sql = """
+DROP TRIGGER IF EXISTS host_search_hosts ON hosts;
+DROP TRIGGER IF EXISTS host_search_addresses ON addresses;
+DROP TRIGGER IF EXISTS host_search_leases ON leases;
+DROP TRIGGER IF EXISTS host_search_dns_records ON dns_records;
+DROP FUNCTION IF EXISTS host_search_mac_trigger();
+DROP FUNCTION IF EXISTS host_search_dns_records_trigger();
+DROP FUNCTION IF EXISTS host_search_refresh_dns(macaddr, integer, inet, text);
+DROP FUNCTION IF EXISTS host_search_refresh(macaddr);
+DROP VIEW IF EXISTS host_search_terms;
+DROP TABLE IF EXISTS host_search;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hosts", "0015_hosts_mac_text_index"),
+        ("network", "0008_auto_20190723_1515"),
+        ("dns", "0006_auto_20170324_1644"),
+    ]
+
+    operations = [
+        migrations.RunSQL(host_search_sql, reverse_host_search_sql),
+        migrations.CreateModel(
+            name="HostSearch",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "host",
+                    models.ForeignKey(
+                        db_column="mac",
+                        db_constraint=False,
+                        on_delete=models.deletion.DO_NOTHING,
+                        related_name="search_terms",
+                        to="hosts.Host",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=16)),
+                ("term", models.TextField()),
+            ],
+            options={"db_table": "host_search", "managed": False},
+        ),
+    ]
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import migrations, models
+import netfields.fields
+
+
+# One row per host with everything the host list renders besides the host
+# itself.  Addresses, leases and vendor are kept current by triggers; the
+# last seen stamps come from the ARP collector tables and are refreshed by
+# the refresh_host_summary command.
+host_summary_sql = """
+CREATE TABLE host_summary (
+    mac macaddr PRIMARY KEY,
+    first_address inet,
+    addresses text[] NOT NULL DEFAULT '{}',
+    leases text[] NOT NULL DEFAULT '{}',
+    lease_ends timestamp with time zone[] NOT NULL DEFAULT '{}',
+    vendor varchar(255),
+    ip_stamp timestamp with time zone,
+    mac_stamp timestamp with time zone
+);
+CREATE INDEX host_summary_first_address_idx ON host_summary (first_address);
+
+CREATE VIEW host_summary_rows AS
+    SELECT
+        hosts.mac,
+        coalesce(
+            (SELECT min(addresses.address) FROM addresses
+                WHERE addresses.mac = hosts.mac),
+            (SELECT min(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac)
+        ) AS first_address,
+        ARRAY(SELECT host(addresses.address) FROM addresses
+            WHERE addresses.mac = hosts.mac
+            ORDER BY addresses.address) AS addresses,
+        ARRAY(SELECT host(leases.address) FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS leases,
+        ARRAY(SELECT leases.ends FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS lease_ends,
+        (SELECT ouis.shortname FROM ouis
+            WHERE hosts.mac >= ouis.start AND hosts.mac <= ouis.stop
+            ORDER BY ouis.id DESC LIMIT 1) AS vendor
+    FROM hosts;
+
+CREATE FUNCTION host_summary_refresh(target macaddr) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM hosts WHERE mac = target) THEN
+        DELETE FROM host_summary WHERE mac = target;
+        RETURN;
+    END IF;
+    -- Upsert so the last seen stamps survive address and lease changes.
+    INSERT INTO host_summary (
+        mac, first_address, addresses, leases, lease_ends, vendor
+    )
+        SELECT mac, first_address, addresses, leases, lease_ends, vendor
+        FROM host_summary_rows WHERE mac = target
+    ON CONFLICT (mac) DO UPDATE SET
+        first_address = EXCLUDED.first_address,
+        addresses = EXCLUDED.addresses,
+        leases = EXCLUDED.leases,
+        lease_ends = EXCLUDED.lease_ends,
+        vendor = EXCLUDED.vendor;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION host_summary_mac_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM host_summary_refresh(NEW.mac);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM host_summary_refresh(OLD.mac);
+    ELSE
+        PERFORM host_summary_refresh(OLD.mac);
+        IF NEW.mac IS DISTINCT FROM OLD.mac THEN
+            PERFORM host_summary_refresh(NEW.mac);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER host_summary_hosts
+    AFTER INSERT OR DELETE OR UPDATE OF mac ON hosts
+    FOR EACH ROW EXECUTE PROCEDURE host_summary_mac_trigger();
+CREATE TRIGGER host_summary_addresses
+    AFTER INSERT OR DELETE OR UPDATE OF mac ON addresses
+    FOR EACH ROW EXECUTE PROCEDURE host_summary_mac_trigger();
+CREATE TRIGGER host_summary_leases
+    AFTER INSERT OR DELETE OR UPDATE OF mac, address, ends ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_summary_mac_trigger();
+
+INSERT INTO host_summary (mac, first_address, addresses, leases, lease_ends, vendor)
+    SELECT mac, first_address, addresses, leases, lease_ends, vendor
+    FROM host_summary_rows;
+"""
+
+reverse_host_summary_sql = """
+DROP TRIGGER IF EXISTS host_summary_hosts ON hosts;
+DROP TRIGGER IF EXISTS host_summary_addresses ON addresses;
+DROP TRIGGER IF EXISTS host_summary_leases ON leases;
+DROP FUNCTION IF EXISTS host_summary_mac_trigger();
+DROP FUNCTION IF EXISTS host_summary_refresh(macaddr);
+DROP VIEW IF EXISTS host_summary_rows;
+DROP TABLE IF EXISTS host_summary;
+"""
+
+# Last seen stamps as of the migration; 0023 drops them for live reads.
+populate_stamps_sql = """
+UPDATE host_summary
+SET ip_stamp = stamps.ip_stamp, mac_stamp = stamps.mac_stamp
+FROM (
+    SELECT
+        hosts.mac,
+        (SELECT max(gul_recent_arp_byaddress.stopstamp)
+            FROM addresses
+            INNER JOIN gul_recent_arp_byaddress
+                ON gul_recent_arp_byaddress.address = addresses.address
+            WHERE addresses.mac = hosts.mac) AS ip_stamp,
+        (SELECT max(gul_recent_arp_bymac.stopstamp)
+            FROM gul_recent_arp_bymac
+            WHERE gul_recent_arp_bymac.mac = hosts.mac) AS mac_stamp
+    FROM hosts
+) AS stamps
+WHERE host_summary.mac = stamps.mac
+    AND (host_summary.ip_stamp IS DISTINCT FROM stamps.ip_stamp
+        OR host_summary.mac_stamp IS DISTINCT FROM stamps.mac_stamp)
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0016_host_search")]
+
+    operations = [
+        migrations.RunSQL(host_summary_sql, reverse_host_summary_sql),
+        migrations.RunSQL(populate_stamps_sql, migrations.RunSQL.noop),
+        migrations.CreateModel(
+            name="HostSummary",
+            fields=[
+                (
+                    "host",
+                    models.OneToOneField(
+                        db_column="mac",
+                        db_constraint=False,
+                        on_delete=models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="hosts.Host",
+                    ),
+                ),
+                (
+                    "first_address",
+                    netfields.fields.InetAddressField(
+                        max_length=39, null=True, store_prefix_length=False
+                    ),
+                ),
+                ("addresses", ArrayField(models.TextField(), default=list)),
+                ("leases", ArrayField(models.TextField(), default=list)),
+                ("lease_ends", ArrayField(models.DateTimeField(), default=list)),
+                ("vendor", models.CharField(max_length=255, null=True)),
+                ("ip_stamp", models.DateTimeField(null=True)),
+                ("mac_stamp", models.DateTimeField(null=True)),
+            ],
+            options={"db_table": "host_summary", "managed": False},
+        ),
+    ]
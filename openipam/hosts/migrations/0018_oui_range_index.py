@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Vendor lookups match a mac against the ranges in ouis.  A GiST index on a
+# macaddr range turns that into an index probe instead of a range scan of
+# every OUI per host.
+oui_range_sql = """
+CREATE TYPE macaddr_range AS RANGE (subtype = macaddr);
+CREATE INDEX ouis_range_idx ON ouis USING gist (macaddr_range(start, stop, '[]'));
+
+CREATE OR REPLACE VIEW host_summary_rows AS
+    SELECT
+        hosts.mac,
+        coalesce(
+            (SELECT min(addresses.address) FROM addresses
+                WHERE addresses.mac = hosts.mac),
+            (SELECT min(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac)
+        ) AS first_address,
+        ARRAY(SELECT host(addresses.address) FROM addresses
+            WHERE addresses.mac = hosts.mac
+            ORDER BY addresses.address) AS addresses,
+        ARRAY(SELECT host(leases.address) FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS leases,
+        ARRAY(SELECT leases.ends FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS lease_ends,
+        (SELECT ouis.shortname FROM ouis
+            WHERE macaddr_range(ouis.start, ouis.stop, '[]') @> hosts.mac
+            ORDER BY ouis.id DESC LIMIT 1) AS vendor
+    FROM hosts;
+"""
+
+reverse_oui_range_sql = """
+CREATE OR REPLACE VIEW host_summary_rows AS
+    SELECT
+        hosts.mac,
+        coalesce(
+            (SELECT min(addresses.address) FROM addresses
+                WHERE addresses.mac = hosts.mac),
+            (SELECT min(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac)
+        ) AS first_address,
+        ARRAY(SELECT host(addresses.address) FROM addresses
+            WHERE addresses.mac = hosts.mac
+            ORDER BY addresses.address) AS addresses,
+        ARRAY(SELECT host(leases.address) FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS leases,
+        ARRAY(SELECT leases.ends FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS lease_ends,
+        (SELECT ouis.shortname FROM ouis
+            WHERE hosts.mac >= ouis.start AND hosts.mac <= ouis.stop
+            ORDER BY ouis.id DESC LIMIT 1) AS vendor
+    FROM hosts;
+
+DROP INDEX IF EXISTS ouis_range_idx;
+DROP TYPE IF EXISTS macaddr_range;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0017_host_summary")]
+
+    operations = [migrations.RunSQL(oui_range_sql, reverse_oui_range_sql)]
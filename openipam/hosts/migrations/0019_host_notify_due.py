@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# A host is due for an expiration notice once now() passes, for some
+# notification interval n, both expires - n and last_notified + n, and
+# until it expires.  notify_due keeps the earliest such time per host, or
+# NULL when no interval is left before expiry, so finding due hosts is a
+# range scan.
+host_notify_due_sql = """
+DO $$
+BEGIN
+    -- Notification intervals are an interval column in the openIPAM schema,
+    -- but databases built by these migrations made it a date.
+    IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'notifications' AND column_name = 'notification'
+        ) = 'date' THEN
+        ALTER TABLE notifications ALTER COLUMN notification TYPE interval
+            USING (notification - date '1970-01-01') * interval '1 day';
+    END IF;
+END;
+$$;
+
+CREATE FUNCTION host_notify_due(
+    expires timestamp with time zone,
+    last_notified timestamp with time zone
+) RETURNS timestamp with time zone AS $$
+    SELECT min(greatest(expires - notification, last_notified + notification))
+    FROM notifications
+    WHERE greatest(expires - notification, last_notified + notification) < expires
+$$ LANGUAGE sql STABLE;
+
+CREATE FUNCTION host_notify_due_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.notify_due := host_notify_due(NEW.expires, NEW.last_notified);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION notifications_notify_due_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE hosts SET notify_due = host_notify_due(expires, last_notified)
+        WHERE expires > now()
+            AND notify_due IS DISTINCT FROM host_notify_due(expires, last_notified);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER host_notify_due
+    BEFORE INSERT OR UPDATE OF expires, last_notified ON hosts
+    FOR EACH ROW EXECUTE PROCEDURE host_notify_due_trigger();
+CREATE TRIGGER notifications_notify_due
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON notifications
+    FOR EACH STATEMENT EXECUTE PROCEDURE notifications_notify_due_trigger();
+
+UPDATE hosts SET notify_due = host_notify_due(expires, last_notified)
+    WHERE expires > now();
+
+CREATE INDEX hosts_notify_due_idx ON hosts (notify_due)
+    WHERE notify_due IS NOT NULL AND NOT is_guest;
+"""
+
+reverse_host_notify_due_sql = """
+DROP INDEX IF EXISTS hosts_notify_due_idx;
+DROP TRIGGER IF EXISTS host_notify_due ON hosts;
+DROP TRIGGER IF EXISTS notifications_notify_due ON notifications;
+DROP FUNCTION IF EXISTS host_notify_due_trigger();
+DROP FUNCTION IF EXISTS notifications_notify_due_trigger();
+DROP FUNCTION IF EXISTS host_notify_due(
+    timestamp with time zone, timestamp with time zone
+);
+"""
+
+
+def populate_guest_flags(apps, schema_editor):
+    from openipam.hosts.managers import HostManager
+
+    HostManager().refresh_guest_flags()
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0018_oui_range_index")]
+
+    operations = [
+        migrations.AddField(
+            model_name="host",
+            name="notify_due",
+            field=models.DateTimeField(blank=True, null=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="host",
+            name="is_guest",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(populate_guest_flags, migrations.RunPython.noop),
+        migrations.RunSQL(
+            host_notify_due_sql,
+            reverse_host_notify_due_sql,
+            state_operations=[
+                migrations.AlterField(
+                    model_name="notification",
+                    name="notification",
+                    field=models.DurationField(),
+                )
+            ],
+        ),
+    ]
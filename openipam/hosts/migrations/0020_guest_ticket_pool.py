@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_guest_ticket_pool(apps, schema_editor):
+    from openipam.hosts.managers import GuestTicketManager
+
+    GuestTicketManager().fill_pool()
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0019_host_notify_due")]
+
+    operations = [
+        migrations.CreateModel(
+            name="GuestTicketPool",
+            fields=[
+                (
+                    "ticket",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                )
+            ],
+            options={"db_table": "guest_ticket_pool"},
+        ),
+        migrations.RunPython(fill_guest_ticket_pool, migrations.RunPython.noop),
+    ]
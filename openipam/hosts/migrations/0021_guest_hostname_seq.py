@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def reset_guest_hostname_seq(apps, schema_editor):
+    from openipam.hosts.managers import GuestHostManager
+
+    GuestHostManager().reset_hostname_sequence()
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0020_guest_ticket_pool")]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE guest_hostname_seq",
+            "DROP SEQUENCE IF EXISTS guest_hostname_seq",
+        ),
+        migrations.RunPython(reset_guest_hostname_seq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Lease renewals rewrite starts and ends on every DHCP request, so only a
+# change of mac or address touches host_search, and then only the lease
+# term it changes, not every term of the host.  A lease address belongs to
+# one lease at a time, so its term is removed and added by address.
+host_search_leases_sql = """
+CREATE FUNCTION host_search_leases_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.mac IS NOT NULL THEN
+        DELETE FROM host_search
+            WHERE mac = OLD.mac AND kind = 'lease' AND term = host(OLD.address);
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.mac IS NOT NULL THEN
+        INSERT INTO host_search (mac, kind, term)
+            SELECT hosts.mac, 'lease', host(NEW.address) FROM hosts
+            WHERE hosts.mac = NEW.mac
+                AND NOT EXISTS (
+                    SELECT 1 FROM host_search
+                    WHERE host_search.mac = NEW.mac
+                        AND host_search.kind = 'lease'
+                        AND host_search.term = host(NEW.address)
+                );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS host_search_leases ON leases;
+CREATE TRIGGER host_search_leases
+    AFTER INSERT OR DELETE ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_search_leases_trigger();
+CREATE TRIGGER host_search_leases_update
+    AFTER UPDATE OF mac, address ON leases
+    FOR EACH ROW
+    WHEN (OLD.mac IS DISTINCT FROM NEW.mac OR OLD.address IS DISTINCT FROM NEW.address)
+    EXECUTE PROCEDURE host_search_leases_trigger();
+"""
+
+reverse_host_search_leases_sql = """
+DROP TRIGGER IF EXISTS host_search_leases_update ON leases;
+DROP TRIGGER IF EXISTS host_search_leases ON leases;
+DROP FUNCTION IF EXISTS host_search_leases_trigger();
+CREATE TRIGGER host_search_leases
+    AFTER INSERT OR DELETE OR UPDATE OF mac, address ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_search_mac_trigger();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0021_guest_hostname_seq")]
+
+    operations = [
+        migrations.RunSQL(host_search_leases_sql, reverse_host_search_leases_sql)
+    ]
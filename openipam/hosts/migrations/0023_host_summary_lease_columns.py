@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Lease renewals move ends on every DHCP request, so host_summary no longer
+# keeps lease ends or the ARP last seen stamps; the host list reads those
+# for the page it shows (see HostSummaryManager.page_activity).  What is
+# left derives from a lease's mac and address only, and the leases trigger
+# fires only when one of them actually changes.
+host_summary_leases_sql = """
+DROP TRIGGER IF EXISTS host_summary_leases ON leases;
+CREATE TRIGGER host_summary_leases
+    AFTER INSERT OR DELETE ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_summary_mac_trigger();
+CREATE TRIGGER host_summary_leases_update
+    AFTER UPDATE OF mac, address ON leases
+    FOR EACH ROW
+    WHEN (OLD.mac IS DISTINCT FROM NEW.mac OR OLD.address IS DISTINCT FROM NEW.address)
+    EXECUTE PROCEDURE host_summary_mac_trigger();
+
+DROP VIEW IF EXISTS host_summary_rows;
+CREATE VIEW host_summary_rows AS
+    SELECT
+        hosts.mac,
+        coalesce(
+            (SELECT min(addresses.address) FROM addresses
+                WHERE addresses.mac = hosts.mac),
+            (SELECT min(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac)
+        ) AS first_address,
+        ARRAY(SELECT host(addresses.address) FROM addresses
+            WHERE addresses.mac = hosts.mac
+            ORDER BY addresses.address) AS addresses,
+        ARRAY(SELECT host(leases.address) FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS leases,
+        (SELECT ouis.shortname FROM ouis
+            WHERE macaddr_range(ouis.start, ouis.stop, '[]') @> hosts.mac
+            ORDER BY ouis.id DESC LIMIT 1) AS vendor
+    FROM hosts;
+
+CREATE OR REPLACE FUNCTION host_summary_refresh(target macaddr) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM hosts WHERE mac = target) THEN
+        DELETE FROM host_summary WHERE mac = target;
+        RETURN;
+    END IF;
+    INSERT INTO host_summary (mac, first_address, addresses, leases, vendor)
+        SELECT mac, first_address, addresses, leases, vendor
+        FROM host_summary_rows WHERE mac = target
+    ON CONFLICT (mac) DO UPDATE SET
+        first_address = EXCLUDED.first_address,
+        addresses = EXCLUDED.addresses,
+        leases = EXCLUDED.leases,
+        vendor = EXCLUDED.vendor;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE host_summary
+    DROP COLUMN lease_ends,
+    DROP COLUMN ip_stamp,
+    DROP COLUMN mac_stamp;
+"""
+
+reverse_host_summary_leases_sql = """
+ALTER TABLE host_summary
+    ADD COLUMN lease_ends timestamp with time zone[] NOT NULL DEFAULT '{}',
+    ADD COLUMN ip_stamp timestamp with time zone,
+    ADD COLUMN mac_stamp timestamp with time zone;
+
+DROP VIEW IF EXISTS host_summary_rows;
+CREATE VIEW host_summary_rows AS
+    SELECT
+        hosts.mac,
+        coalesce(
+            (SELECT min(addresses.address) FROM addresses
+                WHERE addresses.mac = hosts.mac),
+            (SELECT min(leases.address) FROM leases
+                WHERE leases.mac = hosts.mac)
+        ) AS first_address,
+        ARRAY(SELECT host(addresses.address) FROM addresses
+            WHERE addresses.mac = hosts.mac
+            ORDER BY addresses.address) AS addresses,
+        ARRAY(SELECT host(leases.address) FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS leases,
+        ARRAY(SELECT leases.ends FROM leases
+            WHERE leases.mac = hosts.mac
+            ORDER BY leases.address) AS lease_ends,
+        (SELECT ouis.shortname FROM ouis
+            WHERE macaddr_range(ouis.start, ouis.stop, '[]') @> hosts.mac
+            ORDER BY ouis.id DESC LIMIT 1) AS vendor
+    FROM hosts;
+
+CREATE OR REPLACE FUNCTION host_summary_refresh(target macaddr) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM hosts WHERE mac = target) THEN
+        DELETE FROM host_summary WHERE mac = target;
+        RETURN;
+    END IF;
+    INSERT INTO host_summary (
+        mac, first_address, addresses, leases, lease_ends, vendor
+    )
+        SELECT mac, first_address, addresses, leases, lease_ends, vendor
+        FROM host_summary_rows WHERE mac = target
+    ON CONFLICT (mac) DO UPDATE SET
+        first_address = EXCLUDED.first_address,
+        addresses = EXCLUDED.addresses,
+        leases = EXCLUDED.leases,
+        lease_ends = EXCLUDED.lease_ends,
+        vendor = EXCLUDED.vendor;
+END;
+$$ LANGUAGE plpgsql;
+
+UPDATE host_summary SET lease_ends = host_summary_rows.lease_ends
+    FROM host_summary_rows WHERE host_summary.mac = host_summary_rows.mac;
+
+DROP TRIGGER IF EXISTS host_summary_leases_update ON leases;
+DROP TRIGGER IF EXISTS host_summary_leases ON leases;
+CREATE TRIGGER host_summary_leases
+    AFTER INSERT OR DELETE OR UPDATE OF mac, address, ends ON leases
+    FOR EACH ROW EXECUTE PROCEDURE host_summary_mac_trigger();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [("hosts", "0022_host_search_leases")]
+
+    operations = [
+        migrations.RunSQL(host_summary_leases_sql, reverse_host_summary_leases_sql),
+        migrations.RemoveField(model_name="hostsummary", name="lease_ends"),
+        migrations.RemoveField(model_name="hostsummary", name="ip_stamp"),
+        migrations.RemoveField(model_name="hostsummary", name="mac_stamp"),
+    ]
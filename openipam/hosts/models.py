@@ -4,15 +4,23 @@ from django.utils.timezone import utc
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db.models import Q
 from django.contrib.auth import get_user_model
-from django.db.models.signals import pre_delete
+from django.contrib.auth.models import Group
+from django.db.models.signals import (
+    pre_delete,
+    post_save,
+    post_delete,
+    post_init,
+    m2m_changed,
+)
 from django.db import connection
 from django.core.validators import validate_ipv46_address
 from django.utils.functional import cached_property
 from django.contrib.contenttypes.models import ContentType
 from django.db.utils import DatabaseError
 from django.db import transaction
+from django.contrib.postgres.fields import ArrayField
 
-from netfields import MACAddressField, NetManager
+from netfields import MACAddressField, InetAddressField, NetManager
 
 from djorm_pgfulltext.fields import VectorField
 from djorm_pgfulltext.models import SearchManager
@@ -22,15 +30,34 @@ from guardian.models import UserObjectPermission, GroupObjectPermission
 
 from openipam.core.mixins import DirtyFieldsMixin
 from openipam.hosts.validators import validate_hostname
-from openipam.hosts.managers import HostManager, HostQuerySet
+from openipam.hosts.managers import (
+    HostManager,
+    HostQuerySet,
+    GuestHostManager,
+    GuestTicketManager,
+    HostAccessManager,
+    HostSearchManager,
+    HostSummaryManager,
+    OUIManager,
+)
 from openipam.user.signals import remove_obj_perms_connected_with_user
-from openipam.dns.models import DhcpDnsRecord
+from openipam.hosts.signals import (
+    refresh_host_access_for_host,
+    refresh_host_access_for_address,
+    track_address_host,
+    refresh_host_access_for_permission,
+    refresh_host_access_for_domain,
+    track_host_access_for_delete,
+    refresh_host_access_for_delete,
+    refresh_host_access_for_membership,
+    invalidate_guest_lookups,
+    invalidate_ouis,
+)
+from openipam.dns.models import DhcpDnsRecord, Domain
+from openipam.network.models import Address, Network, Pool
 
 from datetime import datetime, timedelta
 
-import string
-import random
-
 from six import string_types
 
 User = get_user_model()
@@ -142,85 +169,29 @@ class GuestTicket(models.Model):
     ends = models.DateTimeField()
     description = models.TextField(blank=True, null=True)
 
+    objects = GuestTicketManager()
+
     def __str__(self):
         return self.ticket
 
     def set_ticket(self):
-        """Generates a human-readable string for a ticket."""
-
-        def generate_random_ticket():
-            vowels = ("a", "e", "i", "o", "u")
-            consonants = [a for a in string.ascii_lowercase if a not in vowels]
-            groups = ("th", "ch", "sh", "kl", "gr", "br")
-
-            num_vowels = len(vowels) - 1
-            num_consonants = len(consonants) - 1
-            num_groups = len(groups) - 1
-
-            vowel = []
-            cons = []
-            group = []
-
-            for i in range(4):
-                vowel.append(vowels[random.randint(0, num_vowels)])
-                cons.append(consonants[random.randint(0, num_consonants)])
-                group.append(groups[random.randint(0, num_groups)])
-
-            structure = []
-            structure.append(
-                "%s%s%s%s%s%s%s%s"
-                % (
-                    cons[0],
-                    vowel[0],
-                    cons[1],
-                    cons[2],
-                    vowel[1],
-                    cons[3],
-                    vowel[2],
-                    group[0],
-                )
-            )
-            structure.append(
-                "%s%s%s%s%s%s"
-                % (group[0], vowel[0], cons[0], cons[1], vowel[1], group[1])
-            )
-            structure.append(
-                "%s%s%s%s%s" % (group[0], vowel[0], cons[0], vowel[1], "s")
-            )
-            structure.append(
-                "%s%s%s%s%s" % (vowel[0], group[0], vowel[1], cons[0], vowel[2])
-            )
-            structure.append(
-                "%s%s%s%s%s" % (group[0], vowel[0], cons[0], vowel[1], group[1])
-            )
-            structure.append("%s%s%s%s" % (vowel[0], group[0], vowel[1], group[1]))
-            structure.append(
-                "%s%s%s%s%s%s%s%s"
-                % (
-                    cons[0],
-                    vowel[0],
-                    cons[1],
-                    vowel[1],
-                    cons[2],
-                    vowel[2],
-                    cons[3],
-                    vowel[2],
-                )
-            )
-            structure.append(
-                "%s%s%s%s%s" % (group[0], vowel[1], group[1], vowel[1], cons[0])
-            )
+        """Sets a human-readable ticket, taken from the pregenerated pool."""
+        self.ticket = GuestTicket.objects.take_ticket()
+
+    class Meta:
+        db_table = "guest_tickets"
 
-            return structure[random.randint(0, len(structure) - 1)]
 
-        ticket = generate_random_ticket()
-        while GuestTicket.objects.filter(ticket=ticket):
-            ticket = generate_random_ticket()
+class GuestTicketPool(models.Model):
+    """Unused tickets, generated ahead of time by GuestTicketManager.fill_pool."""
 
-        self.ticket = ticket
+    ticket = models.CharField(max_length=255, primary_key=True)
+
+    def __str__(self):
+        return self.ticket
 
     class Meta:
-        db_table = "guest_tickets"
+        db_table = "guest_ticket_pool"
 
 
 class GulRecentArpByaddress(models.Model):
@@ -315,6 +286,78 @@ class HostGroupView(models.Model):
         db_table = "hosts_to_auth_groups_v"
 
 
+class HostAccess(models.Model):
+    user = models.ForeignKey(
+        User,
+        db_column="user_id",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="host_access",
+    )
+    host = models.ForeignKey(
+        "Host",
+        db_column="mac",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="user_access",
+    )
+
+    objects = HostAccessManager()
+
+    def __str__(self):
+        return "%s %s" % (self.user_id, self.host_id)
+
+    class Meta:
+        db_table = "host_access"
+        unique_together = (("user", "host"),)
+
+
+class HostSearch(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    host = models.ForeignKey(
+        "Host",
+        db_column="mac",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_terms",
+    )
+    kind = models.CharField(max_length=16)
+    term = models.TextField()
+
+    objects = HostSearchManager()
+
+    def __str__(self):
+        return "%s %s: %s" % (self.host_id, self.kind, self.term)
+
+    class Meta:
+        managed = False
+        db_table = "host_search"
+
+
+class HostSummary(models.Model):
+    host = models.OneToOneField(
+        "Host",
+        on_delete=models.DO_NOTHING,
+        db_column="mac",
+        db_constraint=False,
+        related_name="summary",
+        primary_key=True,
+    )
+    first_address = InetAddressField(null=True, store_prefix_length=False)
+    addresses = ArrayField(models.TextField(), default=list)
+    leases = ArrayField(models.TextField(), default=list)
+    vendor = models.CharField(max_length=255, null=True)
+
+    objects = HostSummaryManager()
+
+    def __str__(self):
+        return "%s" % self.pk
+
+    class Meta:
+        managed = False
+        db_table = "host_summary"
+
+
 class Host(DirtyFieldsMixin, models.Model):
     mac = MACAddressField("Mac Address", primary_key=True)
     hostname = models.CharField(
@@ -347,8 +390,13 @@ class Host(DirtyFieldsMixin, models.Model):
     changed = models.DateTimeField(auto_now=True)
     changed_by = models.ForeignKey(User, db_column="changed_by")
     last_notified = models.DateTimeField(blank=True, null=True)
+    # Maintained by a database trigger, see HostQuerySet.by_expiring.
+    notify_due = models.DateTimeField(blank=True, null=True, editable=False)
+    # Set on save from GUEST_HOSTNAME_FORMAT.
+    is_guest = models.BooleanField(default=False, editable=False)
 
     objects = HostManager.from_queryset(HostQuerySet)()
+    guests = GuestHostManager()
 
     search_index = VectorField()
     searcher = SearchManager(
@@ -648,9 +696,7 @@ class Host(DirtyFieldsMixin, models.Model):
 
     @property
     def oui(self):
-        return OUI.objects.extra(
-            where=["'%s' >= ouis.start and '%s' <= ouis.stop" % (self.mac, self.mac)]
-        ).first()
+        return OUI.objects.resolve(self.mac)
 
     @cached_property
     def master_ip_address(self):
@@ -678,8 +724,9 @@ class Host(DirtyFieldsMixin, models.Model):
         # Release address
         address.release(user=user)
 
+    @transaction.atomic
     def add_ip_address(self, user=None, ip_address=None, network=None, hostname=None):
-        from openipam.network.models import Network, Address
+        from openipam.network.models import Network, Address, FreeAddress
         from openipam.dns.models import DnsRecord, DnsType
 
         user = user or self._user
@@ -730,25 +777,15 @@ class Host(DirtyFieldsMixin, models.Model):
                 )
 
             try:
-                network_address = (
-                    Address.objects.filter(
-                        Q(pool__in=user_pools) | Q(pool__isnull=True),
-                        Q(leases__isnull=True)
-                        | Q(leases__abandoned=True)
-                        | Q(leases__ends__lte=timezone.now())
-                        | Q(leases__host=self),
-                        network=network,
-                        host__isnull=True,
-                        reserved=False,
-                    )
-                    .order_by("address")
-                    .first()
+                # Addresses being taken by concurrent registrations are skipped.
+                network_address = FreeAddress.objects.allocate(
+                    1, network, pools=user_pools, host=self
                 )
 
                 if not network_address:
                     raise Address.DoesNotExist
                 else:
-                    address = network_address
+                    address = network_address[0]
 
             except ValidationError:
                 raise ValidationError("The network '%s' is invalid." % network)
@@ -786,6 +823,10 @@ class Host(DirtyFieldsMixin, models.Model):
                     address=ip_address,
                     reserved=False,
                 )
+                # Lock it and make sure nobody took it since.
+                address = Address.objects.select_for_update().get(
+                    Q(host__isnull=True) | Q(host=self), pk=address.pk
+                )
             except ValidationError:
                 raise ValidationError(
                     "There IP Address %s is not available." % ip_address
@@ -894,6 +935,7 @@ class Host(DirtyFieldsMixin, models.Model):
 
     def add_dns_records(self, user=None, hostname=None, address=None):
         from openipam.dns.models import DnsRecord, DnsType
+        from openipam.dns.validation import DnsRecordContext
         from openipam.network.models import Address
 
         user = user or self._user
@@ -910,6 +952,9 @@ class Host(DirtyFieldsMixin, models.Model):
             elif not address:
                 address = Address.objects.filter(address=self.master_ip_address).first()
 
+            # Both records validate against the same loaded permissions.
+            validation_context = DnsRecordContext(user, hosts=[self])
+
             # Add Associated PTR
             DnsRecord.objects.add_or_update_record(
                 user=user,
@@ -917,6 +962,7 @@ class Host(DirtyFieldsMixin, models.Model):
                 content=hostname,
                 dns_type=DnsType.objects.PTR,
                 host=self,
+                validation_context=validation_context,
             )
 
             # Add Associated A or AAAA record
@@ -934,6 +980,7 @@ class Host(DirtyFieldsMixin, models.Model):
                 else DnsType.objects.AAAA,
                 host=self,
                 record=arecord if arecord else None,
+                validation_context=validation_context,
             )
 
         # Reset dns deleted flag if this is the master hostname
@@ -1109,6 +1156,7 @@ class Host(DirtyFieldsMixin, models.Model):
 
         # Make sure hostname is lowercase
         self.hostname = self.hostname.lower()
+        self.is_guest = Host.objects.is_guest_hostname(self.hostname)
         # Make sure mac is lowercase
         self.mac = str(self.mac).lower()
 
@@ -1284,7 +1332,7 @@ class MacOui(models.Model):
 
 
 class Notification(models.Model):
-    notification = models.DateField()
+    notification = models.DurationField()
 
     def __str__(self):
         return "%s" % self.notification
@@ -1333,6 +1381,8 @@ class OUI(models.Model):
     shortname = models.CharField(max_length=255, blank=True, null=True)
     name = models.CharField(max_length=255, blank=True, null=True)
 
+    objects = OUIManager()
+
     def __str__(self):
         return "%s: %s" % (self.pk, self.shortname)
 
@@ -1342,3 +1392,22 @@ class OUI(models.Model):
 
 # Host signals
 pre_delete.connect(remove_obj_perms_connected_with_user, sender=Host)
+post_save.connect(refresh_host_access_for_host, sender=Host)
+post_init.connect(track_address_host, sender=Address)
+post_save.connect(refresh_host_access_for_address, sender=Address)
+post_save.connect(refresh_host_access_for_permission, sender=UserObjectPermission)
+post_delete.connect(refresh_host_access_for_permission, sender=UserObjectPermission)
+post_save.connect(refresh_host_access_for_permission, sender=GroupObjectPermission)
+post_delete.connect(refresh_host_access_for_permission, sender=GroupObjectPermission)
+post_save.connect(refresh_host_access_for_domain, sender=Domain)
+pre_delete.connect(track_host_access_for_delete, sender=Domain)
+post_delete.connect(refresh_host_access_for_delete, sender=Domain)
+pre_delete.connect(track_host_access_for_delete, sender=Network)
+post_delete.connect(refresh_host_access_for_delete, sender=Network)
+m2m_changed.connect(refresh_host_access_for_membership, sender=User.groups.through)
+post_save.connect(invalidate_guest_lookups, sender=Pool)
+post_delete.connect(invalidate_guest_lookups, sender=Pool)
+post_save.connect(invalidate_guest_lookups, sender=Group)
+post_delete.connect(invalidate_guest_lookups, sender=Group)
+post_save.connect(invalidate_ouis, sender=OUI)
+post_delete.connect(invalidate_ouis, sender=OUI)
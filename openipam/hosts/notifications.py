@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from openipam.hosts.models import HostUserView, HostGroupView
+from openipam.user.utils.user_utils import populate_user_from_ldap
+
+from collections import defaultdict
+from itertools import islice
+
+import time
+
+User = get_user_model()
+
+
+def expiring_host_owners(host_qs):
+    """
+    Returns {user id: [mac, ...]} for every user owning one of the hosts,
+    directly or through one of their groups, in a single query.
+    """
+    direct = HostUserView.objects.filter(host__in=host_qs).values_list("user", "host")
+    from_groups = HostGroupView.objects.filter(
+        host__in=host_qs, group_id__user__isnull=False
+    ).values_list("group_id__user", "host")
+
+    owners = defaultdict(list)
+    for user_id, mac in direct.union(from_groups):
+        owners[user_id].append(mac)
+    return owners
+
+
+def send_in_batches(messages, connection, batch_size=100):
+    """
+    Sends messages over one open connection, batch_size at a time, pulling
+    them from the iterable as it goes.  Returns the number sent.
+    """
+    messages = iter(messages)
+    sent = 0
+    connection.open()
+    try:
+        while True:
+            batch = list(islice(messages, batch_size))
+            if not batch:
+                break
+            sent += connection.send_messages(batch) or 0
+    finally:
+        connection.close()
+    return sent
+
+
+class ExpiringHostNotices(object):
+    """
+    Groups expiring hosts by owning user.  Hosts, owners and users are each
+    loaded in one query, then recipients are handed out one at a time so
+    their messages can be streamed to the mail server.
+    """
+
+    in_pool_sql = (
+        "EXISTS (SELECT 1 FROM hosts_to_pools WHERE hosts_to_pools.mac = hosts.mac)"
+    )
+
+    def __init__(self, host_qs):
+        self.host_qs = host_qs
+        self.hosts = {}
+        self.owners = {}
+        self.users = {}
+        self.bad_users = []
+        self.timings = defaultdict(float)
+
+    def load(self):
+        start = time.time()
+        now = timezone.now()
+        hosts = self.host_qs.extra(select={"in_pool": self.in_pool_sql}).values(
+            "mac", "hostname", "expires", "description", "in_pool"
+        )
+        for host in hosts:
+            days = (host["expires"] - now).days
+            host["expire_days"] = days if days > 0 else None
+            self.hosts[host["mac"]] = host
+        self.owners = expiring_host_owners(self.host_qs)
+        self.users = User.objects.in_bulk(list(self.owners))
+        self.timings["load"] += time.time() - start
+
+    def recipients(self):
+        """Yields (user, static hosts, dynamic hosts) for each owner with an email."""
+        for user_id, macs in self.owners.items():
+            user = self.users[user_id]
+            if not user.email:
+                start = time.time()
+                e_user = populate_user_from_ldap(user=user)
+                self.timings["ldap"] += time.time() - start
+            else:
+                e_user = user
+            if not (e_user and e_user.email):
+                self.bad_users.append(user.username)
+                continue
+
+            static, dynamic = [], []
+            for mac in macs:
+                host = self.hosts.get(mac)
+                if host is None:
+                    continue
+                (dynamic if host["in_pool"] else static).append(host)
+            static.sort(key=lambda host: host["expires"])
+            dynamic.sort(key=lambda host: host["expires"])
+            yield e_user, static, dynamic
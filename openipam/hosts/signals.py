@@ -0,0 +1,116 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+
+HOST_ACCESS_MODELS = (("hosts", "host"), ("dns", "domain"), ("network", "network"))
+
+
+# Refresh the host access index when a host is created or renamed,
+# since domain permissions are matched against the hostname.
+def refresh_host_access_for_host(sender, instance, created, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    if created or "hostname" in instance.get_dirty_fields():
+        HostAccess.objects.refresh_hosts([instance.mac])
+
+
+# Keep the host and network an address was loaded with, so a release or a
+# move to another network can refresh it.
+def track_address_host(sender, instance, **kwargs):
+    instance._original_host_id = instance.__dict__.get("host_id")
+    instance._original_network_id = instance.__dict__.get("network_id")
+
+
+# Refresh the host access index for the old and new host of an address,
+# since network permissions are matched through assigned addresses.
+def refresh_host_access_for_address(sender, instance, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    original_host_id = getattr(instance, "_original_host_id", None)
+    original_network_id = getattr(instance, "_original_network_id", None)
+    if original_host_id != instance.host_id:
+        HostAccess.objects.refresh_hosts([original_host_id, instance.host_id])
+    elif original_network_id != instance.network_id:
+        HostAccess.objects.refresh_hosts([instance.host_id])
+    instance._original_host_id = instance.host_id
+    instance._original_network_id = instance.network_id
+
+
+def refresh_host_access_for_permission(sender, instance, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    content_type = ContentType.objects.get_for_id(instance.content_type_id)
+    if (content_type.app_label, content_type.model) not in HOST_ACCESS_MODELS:
+        return
+
+    if content_type.model == "host":
+        HostAccess.objects.refresh_hosts([instance.object_pk])
+    elif getattr(instance, "user_id", None):
+        HostAccess.objects.refresh_users([instance.user_id])
+    else:
+        HostAccess.objects.refresh_group(instance.group_id)
+
+
+def refresh_host_access_for_domain(sender, instance, created, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    if not created:
+        HostAccess.objects.refresh_object_users(
+            ContentType.objects.get_for_model(instance).pk, instance.pk
+        )
+
+
+# A deleted domain or network stops granting its hosts, but its object
+# permissions may be removed before it, so the users with access to those
+# hosts are found before the delete and refreshed after it.
+def track_host_access_for_delete(sender, instance, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    if sender._meta.model_name == "domain":
+        hosts = Q(host__hostname__endswith=instance.name)
+    else:
+        hosts = Q(host__addresses__network=instance.pk)
+    instance._host_access_user_ids = list(
+        HostAccess.objects.filter(hosts).values_list("user_id", flat=True).distinct()
+    )
+
+
+def refresh_host_access_for_delete(sender, instance, **kwargs):
+    from openipam.hosts.models import HostAccess
+
+    HostAccess.objects.refresh_users(getattr(instance, "_host_access_user_ids", []))
+
+
+def refresh_host_access_for_membership(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    from openipam.hosts.models import HostAccess
+
+    if action == "pre_clear":
+        # pk_set is not given on clear, so remember who is affected.
+        if reverse:
+            instance._host_access_clear_ids = list(
+                instance.user_set.values_list("pk", flat=True)
+            )
+        else:
+            instance._host_access_clear_ids = [instance.pk]
+    elif action == "post_clear":
+        HostAccess.objects.refresh_users(
+            getattr(instance, "_host_access_clear_ids", [])
+        )
+    elif action in ("post_add", "post_remove"):
+        HostAccess.objects.refresh_users(pk_set if reverse else [instance.pk])
+
+
+# The guest registration path caches the guest pool and group ids; other
+# processes reload them once the change is visible.
+def invalidate_guest_lookups(sender, instance, **kwargs):
+    from openipam.hosts.models import Host
+
+    Host.guests.invalidate()
+
+
+# Vendor lookups resolve against an in-process copy of the OUI ranges;
+# other processes reload it once the change is visible.
+def invalidate_ouis(sender, instance, **kwargs):
+    sender.objects.invalidate()
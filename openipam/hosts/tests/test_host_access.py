@@ -0,0 +1,178 @@
+from django.contrib.auth.models import Group
+
+from guardian.shortcuts import assign_perm, get_objects_for_user, remove_perm
+
+from openipam.core.tests.test_models import IPAMTestCase
+from openipam.dns.models import Domain
+from openipam.hosts.models import Host, HostAccess
+from openipam.network.models import Address, Network
+from openipam.user.models import User
+
+
+class HostAccessTest(IPAMTestCase):
+    """
+    The host_access rows behind Host.objects.by_change_perms, checked against
+    guardian after each kind of change that moves them.
+    """
+
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            },
+            {"network": "10.0.0.0/29", "name": "rfc1918-10-0-0", "gateway": "10.0.0.1"},
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"}
+            for i in ["valid", "other", "168.192.in-addr.arpa"]
+        ]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.3",
+            },
+            {"hostname": "other-host.other", "mac": "ffffff000001"},
+            {
+                "hostname": "net-host.valid",
+                "mac": "ffffff000002",
+                "address": "10.0.0.2",
+            },
+        ]
+        self.pools = []
+        self.address_types = []
+        super(HostAccessTest, self).setUp()
+
+        self.user = User.objects.create(username="access-user")
+        self.group = Group.objects.create(name="access-group")
+        self.static_host = Host.objects.get(pk="ffffff000000")
+        self.other_host = Host.objects.get(pk="ffffff000001")
+        self.net_host = Host.objects.get(pk="ffffff000002")
+
+    def net_host_network(self):
+        return Network.objects.get(network="10.0.0.0/29")
+
+    def expected_macs(self, user):
+        def objects(perms, klass):
+            return get_objects_for_user(
+                user,
+                perms,
+                klass=klass,
+                any_perm=True,
+                with_superuser=False,
+                accept_global_perms=False,
+            )
+
+        hosts = objects(["hosts.is_owner_host", "hosts.change_host"], Host)
+        domains = objects(["dns.is_owner_domain", "dns.change_domain"], Domain)
+        networks = objects(
+            ["network.is_owner_network", "network.change_network"], Network
+        )
+
+        macs = set(str(host.mac) for host in hosts)
+        for host in Host.objects.all():
+            if any(host.hostname.endswith(domain.name) for domain in domains):
+                macs.add(str(host.mac))
+        macs.update(
+            str(mac)
+            for mac in Host.objects.filter(
+                addresses__network__in=list(networks)
+            ).values_list("mac", flat=True)
+        )
+        return macs
+
+    def assertAccess(self, macs):
+        user = User.objects.get(pk=self.user.pk)
+        expected = self.expected_macs(user)
+        self.assertEqual(expected, set(str(mac) for mac in macs))
+        self.assertEqual(
+            set(str(mac) for mac in Host.objects.by_change_perms(user, ids_only=True)),
+            expected,
+        )
+        self.assertEqual(
+            set(
+                str(mac)
+                for mac in HostAccess.objects.filter(user=user).values_list(
+                    "host", flat=True
+                )
+            ),
+            expected,
+        )
+
+    def test_user_object_permission(self):
+        assign_perm("hosts.is_owner_host", self.user, self.static_host)
+        self.assertAccess([self.static_host.mac])
+
+        remove_perm("hosts.is_owner_host", self.user, self.static_host)
+        self.assertAccess([])
+
+    def test_group_object_permission(self):
+        self.user.groups.add(self.group)
+
+        assign_perm("dns.is_owner_domain", self.group, Domain.objects.get(name="other"))
+        self.assertAccess([self.other_host.mac])
+
+        remove_perm("dns.is_owner_domain", self.group, Domain.objects.get(name="other"))
+        self.assertAccess([])
+
+    def test_group_membership(self):
+        assign_perm("network.is_owner_network", self.group, self.net_host_network())
+
+        self.user.groups.add(self.group)
+        self.assertAccess([self.net_host.mac])
+
+        self.user.groups.remove(self.group)
+        self.assertAccess([])
+
+        self.group.user_set.add(self.user)
+        self.assertAccess([self.net_host.mac])
+
+        self.group.user_set.clear()
+        self.assertAccess([])
+
+    def test_rename_into_and_out_of_domain(self):
+        assign_perm("dns.is_owner_domain", self.user, Domain.objects.get(name="other"))
+        self.assertAccess([self.other_host.mac])
+
+        self.static_host.hostname = "static-host.other"
+        self.static_host.save(user=self.user_model, add_dns=False)
+        self.assertAccess([self.other_host.mac, self.static_host.mac])
+
+        self.static_host.hostname = "static-host.valid"
+        self.static_host.save(user=self.user_model, add_dns=False)
+        self.assertAccess([self.other_host.mac])
+
+    def test_move_address_between_networks(self):
+        supernet = Network.objects.create(
+            network="192.168.0.0/23", changed_by=self.user_model
+        )
+        assign_perm("network.is_owner_network", self.user, supernet)
+        self.assertAccess([])
+
+        address = Address.objects.get(address="192.168.0.3")
+        address.network = supernet
+        address.save()
+        self.assertAccess([self.static_host.mac])
+
+        address.network = Network.objects.get(network="192.168.0.0/24")
+        address.save()
+        self.assertAccess([])
+
+    def test_delete_domain(self):
+        domain = Domain.objects.get(name="other")
+        assign_perm("dns.is_owner_domain", self.user, domain)
+        self.assertAccess([self.other_host.mac])
+
+        domain.delete()
+        self.assertAccess([])
+
+    def test_delete_network(self):
+        network = self.net_host_network()
+        assign_perm("network.change_network", self.user, network)
+        self.assertAccess([self.net_host.mac])
+
+        network.delete()
+        self.assertAccess([])
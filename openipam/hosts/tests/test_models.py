@@ -1,20 +1,41 @@
 # import unittest
 # import ipaddr
-# from django.test import TestCase
-
-from openipam.hosts.models import Host
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from guardian.models import UserObjectPermission
+from guardian.shortcuts import assign_perm, get_objects_for_group, get_objects_for_user
+
+from openipam.conf.ipam_settings import CONFIG
+from openipam.hosts.models import (
+    GuestTicket,
+    GuestTicketPool,
+    Host,
+    HostAccess,
+    Notification,
+)
+from openipam.network.models import Address, Pool
 
 # from openipam.network.models import Network, Address, Pool, HostToPool, AddressType, NetworkRange
 # from openipam.dns.models import Domain, DnsRecord, DnsType
 from openipam.dns.models import DnsRecord
 
 # from openipam.user.models import User
-from openipam.core.tests.test_models import IPAMTestCase
-
-# from django.utils import timezone
+from openipam.core.tests.test_models import (
+    IPAMTestCase,
+    PermissionLookupMixin,
+    reset_in_process_caches,
+)
+from openipam.core.utils.permissions import PermissionSubquery
+from openipam.user.models import User
+
+from django.utils import timezone
 from django.db import IntegrityError
 
-# import datetime
+import datetime
 
 
 class HostTest(IPAMTestCase):
@@ -240,3 +261,277 @@ class HostTest(IPAMTestCase):
             str(DnsRecord.objects.get(name="new-ip-additional.valid").ip_content),
             "192.168.1.20",
         )
+
+
+class HostDeleteTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            }
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"} for i in ["valid", "168.192.in-addr.arpa"]
+        ]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "host-%s.valid" % i,
+                "mac": "ffffff00000%s" % i,
+                "address": "192.168.0.%s" % (i + 10),
+            }
+            for i in range(5)
+        ]
+        self.pools = []
+        self.address_types = []
+        super(HostDeleteTest, self).setUp()
+
+        self.owner = User.objects.create(username="host-owner")
+        self.hosts = list(Host.objects.order_by("mac"))
+        assign_perm("hosts.is_owner_host", self.owner, self.hosts[0])
+        self._add_dns_record(
+            {
+                "name": "host-0.valid",
+                "dns_type": "A",
+                "ip_content": "192.168.0.10",
+                "host": self.hosts[0],
+            },
+            self.user_model,
+        )
+
+    def test_delete_in_batches(self):
+        progress = []
+        deleted = Host.objects.all().delete(
+            user=self.user_model,
+            batch_size=2,
+            progress=lambda done, total: progress.append((done, total)),
+        )
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        self.assertFalse(Host.objects.exists())
+        self.assertFalse(
+            Address.objects.filter(
+                address__in=["192.168.0.%s" % (i + 10) for i in range(5)],
+                host__isnull=False,
+            ).exists()
+        )
+        self.assertFalse(DnsRecord.objects.filter(name="host-0.valid").exists())
+        self.assertFalse(UserObjectPermission.objects.filter(user=self.owner).exists())
+        self.assertFalse(HostAccess.objects.filter(user=self.owner).exists())
+
+    def test_log_entries(self):
+        Host.objects.filter(pk=self.hosts[0].pk).delete(user=self.user_model)
+
+        entry = LogEntry.objects.get(
+            content_type=ContentType.objects.get_for_model(Host),
+            object_id=str(self.hosts[0].pk),
+        )
+        self.assertEqual(entry.action_flag, DELETION)
+        self.assertEqual(entry.user, self.user_model)
+        self.assertEqual(entry.object_repr, "host-0.valid")
+        self.assertIn("host-0.valid", entry.change_message)
+        self.assertEqual(Host.objects.count(), 4)
+
+    def test_user_required(self):
+        with self.assertRaises(Exception):
+            Host.objects.all().delete()
+        self.assertEqual(Host.objects.count(), 5)
+
+
+class ExpiringHostTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="expiring-admin")
+        Notification.objects.create(notification=datetime.timedelta(days=7))
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        self.hosts = dict(
+            (name, self.add_host(hostname, mac, days))
+            for name, hostname, mac, days in [
+                ("soon", "soon.valid", "ffffff000000", 3),
+                ("later", "later.valid", "ffffff000001", 30),
+                ("expired", "expired.valid", "ffffff000002", -1),
+                ("guest", "%s1%s" % (prefix, suffix), "ffffff000003", 3),
+            ]
+        )
+
+    def add_host(self, hostname, mac, days):
+        return Host.objects.create(
+            changed_by=self.user,
+            hostname=hostname,
+            mac=mac,
+            expires=timezone.now() + datetime.timedelta(days=days),
+        )
+
+    def expiring(self, **kwargs):
+        return set(
+            str(mac) for mac in Host.objects.by_expiring(ids_only=True, **kwargs)
+        )
+
+    def macs(self, *names):
+        return set(str(self.hosts[name].mac) for name in names)
+
+    def test_due_hosts(self):
+        self.assertEqual(self.expiring(), self.macs("soon"))
+        self.assertEqual(
+            set(str(host.mac) for host in Host.objects.by_expiring()),
+            self.macs("soon"),
+        )
+
+    def test_guests_omitted_by_default(self):
+        self.assertTrue(Host.objects.get(pk=self.hosts["guest"].pk).is_guest)
+        self.assertEqual(self.expiring(omit_guests=False), self.macs("soon", "guest"))
+
+    def test_notified_host_not_due_again(self):
+        Host.objects.filter(pk=self.hosts["soon"].pk).update(
+            last_notified=timezone.now() - datetime.timedelta(days=1)
+        )
+        self.assertEqual(self.expiring(), set())
+
+    def test_new_notification_interval(self):
+        Notification.objects.create(notification=datetime.timedelta(days=60))
+        self.assertEqual(self.expiring(), self.macs("soon", "later"))
+
+
+class GuestRegisterTest(TestCase):
+    def setUp(self):
+        reset_in_process_caches()
+        User.objects.create(username=CONFIG.get("GUEST_USER"))
+        self.group = Group.objects.get_or_create(name=CONFIG.get("GUEST_GROUP"))[0]
+        self.pool = Pool.objects.create(name=CONFIG.get("GUEST_POOL"), lease_time=1800)
+        self.owner = User.objects.create(username="guest-owner")
+        self.other_owner = User.objects.create(username="other-guest-owner")
+        self.mac = "ffffff000010"
+
+    def register(self, owner, days=1, description="guest device"):
+        return Host.guests.register(
+            self.mac,
+            timezone.now() + datetime.timedelta(days=days),
+            description,
+            owner.pk,
+        )
+
+    def owned(self, user):
+        return set(
+            str(host.mac)
+            for host in get_objects_for_user(
+                user, "hosts.is_owner_host", klass=Host, with_superuser=False
+            )
+        )
+
+    def test_register(self):
+        hostname, created = self.register(self.owner)
+
+        self.assertTrue(created)
+        prefix, suffix = CONFIG.get("GUEST_HOSTNAME_FORMAT")
+        self.assertTrue(hostname.startswith(prefix) and hostname.endswith(suffix))
+        host = Host.objects.get(pk=self.mac)
+        self.assertEqual(host.hostname, hostname)
+        self.assertTrue(host.is_guest)
+        self.assertEqual(list(host.pools.all()), [self.pool])
+        self.assertEqual(self.owned(self.owner), set([str(host.mac)]))
+        self.assertIn(
+            host, get_objects_for_group(self.group, "hosts.is_owner_host", klass=Host)
+        )
+        self.assertTrue(HostAccess.objects.filter(user=self.owner, host=host).exists())
+
+    def test_register_again(self):
+        hostname, created = self.register(self.owner)
+
+        again, created = self.register(
+            self.other_owner, days=3, description="same device"
+        )
+        self.assertFalse(created)
+        self.assertEqual(again, hostname)
+        host = Host.objects.get(pk=self.mac)
+        self.assertEqual(host.description, "same device")
+        self.assertGreater(host.expires, timezone.now() + datetime.timedelta(days=2))
+        self.assertEqual(list(host.pools.all()), [self.pool])
+        self.assertEqual(self.owned(self.owner), set())
+        self.assertEqual(self.owned(self.other_owner), set([str(host.mac)]))
+
+    def test_refuses_registered_host(self):
+        Host.objects.create(
+            changed_by=self.owner,
+            hostname="printer.valid",
+            mac=self.mac,
+            expires=timezone.now() + datetime.timedelta(days=7),
+        )
+
+        with self.assertRaises(ValidationError):
+            self.register(self.owner)
+        host = Host.objects.get(pk=self.mac)
+        self.assertEqual(host.hostname, "printer.valid")
+        self.assertFalse(host.is_guest)
+
+    def test_takes_over_expired_host(self):
+        Host.objects.create(
+            changed_by=self.owner,
+            hostname="printer.valid",
+            mac=self.mac,
+            expires=timezone.now() - datetime.timedelta(days=1),
+        )
+
+        hostname, created = self.register(self.owner)
+        self.assertTrue(created)
+        self.assertEqual(Host.objects.get(pk=self.mac).hostname, hostname)
+
+
+class GuestTicketTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="guest-sponsor")
+        self.starts = timezone.now()
+        self.ends = self.starts + datetime.timedelta(days=1)
+
+    def test_issue_from_empty_pool(self):
+        GuestTicketPool.objects.all().delete()
+
+        ticket = GuestTicket.objects.issue(self.user, self.starts, self.ends, "visitor")
+
+        self.assertTrue(
+            GuestTicket.objects.filter(
+                pk=ticket.pk, ticket=ticket.ticket, user=self.user
+            ).exists()
+        )
+        # The pool was topped up, and the issued ticket is no longer in it.
+        self.assertTrue(GuestTicketPool.objects.exists())
+        self.assertFalse(GuestTicketPool.objects.filter(ticket=ticket.ticket).exists())
+
+    def test_issue_from_pool(self):
+        GuestTicket.objects.fill_pool(5)
+        pooled = set(GuestTicketPool.objects.values_list("ticket", flat=True))
+
+        ticket = GuestTicket.objects.issue(self.user, self.starts, self.ends)
+
+        self.assertIn(ticket.ticket, pooled)
+        self.assertEqual(GuestTicketPool.objects.count(), len(pooled) - 1)
+
+
+class HostPermissionLookupTest(PermissionLookupMixin, TestCase):
+    model = Host
+    owner_perm = "hosts.is_owner_host"
+    change_perms = ["hosts.is_owner_host", "hosts.change_host"]
+
+    def create_objects(self, user):
+        return [
+            Host.objects.create(
+                changed_by=user,
+                hostname="perm-%s.valid" % i,
+                mac="ffffff00010%s" % i,
+                expires=timezone.now() + datetime.timedelta(days=7),
+            )
+            for i in range(3)
+        ]
+
+    def owned(self, user, use_groups):
+        return Host.objects.by_owner(user, use_groups=use_groups)
+
+    def owned_by_group(self, group):
+        return Host.objects.by_group(group)
+
+    def changeable(self, user):
+        # The host condition DnsRecord.objects.by_change_perms embeds.
+        return PermissionSubquery(Host, self.change_perms, user=user).filter(
+            Host.objects.all()
+        )
@@ -0,0 +1,169 @@
+from openipam.core.tests.test_models import IPAMTestCase
+from openipam.dns.models import DnsRecord
+from openipam.hosts.models import Host, HostSearch, HostSummary
+from openipam.network.models import Address, Lease
+
+from django.utils import timezone
+
+import datetime
+
+
+class TriggerTestCase(IPAMTestCase):
+    """A static host on 192.168.0.0/24 and a dynamic one, for the trigger tests."""
+
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.{}.0/24".format(i),
+                "name": "rfc1918-192-168-{}".format(i),
+                "gateway": "192.168.{}.1".format(i),
+            }
+            for i in range(2)
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"} for i in ["valid", "168.192.in-addr.arpa"]
+        ]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.3",
+            },
+            {"hostname": "dynamic-host.valid", "mac": "ffffff000001"},
+        ]
+        self.pools = []
+        self.address_types = []
+        super(TriggerTestCase, self).setUp()
+
+        self.static_host = Host.objects.get(pk="ffffff000000")
+        self.dynamic_host = Host.objects.get(pk="ffffff000001")
+
+    def add_lease(self, address, host, ends=None):
+        now = timezone.now()
+        return Lease.objects.create(
+            address=Address.objects.get(address=address),
+            host=host,
+            starts=now,
+            ends=ends or now + datetime.timedelta(hours=1),
+        )
+
+
+class HostSummaryTriggerTest(TriggerTestCase):
+    def summary(self, host):
+        return HostSummary.objects.get(host=host)
+
+    def test_address_follows_host(self):
+        self.assertEqual(self.summary(self.static_host).addresses, ["192.168.0.3"])
+        self.assertEqual(
+            str(self.summary(self.static_host).first_address), "192.168.0.3"
+        )
+
+        Address.objects.filter(address="192.168.0.3").update(host=None)
+        self.assertEqual(self.summary(self.static_host).addresses, [])
+
+    def test_lease_added_and_moved(self):
+        lease = self.add_lease("192.168.1.10", self.dynamic_host)
+        self.assertEqual(self.summary(self.dynamic_host).leases, ["192.168.1.10"])
+
+        Lease.objects.filter(pk=lease.pk).update(host=self.static_host)
+        self.assertEqual(self.summary(self.dynamic_host).leases, [])
+        self.assertIn("192.168.1.10", self.summary(self.static_host).leases)
+
+        Lease.objects.filter(pk=lease.pk).delete()
+        self.assertNotIn("192.168.1.10", self.summary(self.static_host).leases)
+
+    def test_renewal_does_not_refresh_summary(self):
+        lease = self.add_lease("192.168.1.10", self.dynamic_host)
+        # A marker the trigger would overwrite if it recomputed the row.
+        HostSummary.objects.filter(host=self.dynamic_host).update(vendor="marker")
+
+        ends = timezone.now() + datetime.timedelta(days=1)
+        Lease.objects.filter(pk=lease.pk).update(ends=ends)
+        Lease.objects.filter(pk=lease.pk).update(host=self.dynamic_host)
+
+        self.assertEqual(self.summary(self.dynamic_host).vendor, "marker")
+
+    def test_page_activity_is_live(self):
+        lease = self.add_lease("192.168.1.10", self.dynamic_host)
+        ends = timezone.now() + datetime.timedelta(days=1)
+        Lease.objects.filter(pk=lease.pk).update(ends=ends)
+
+        activity = HostSummary.objects.page_activity(
+            [self.dynamic_host.mac, self.static_host.mac]
+        )
+        leases, lease_ends, ip_stamp, mac_stamp = activity[self.dynamic_host.mac]
+        self.assertEqual(leases, ["192.168.1.10"])
+        self.assertEqual(lease_ends, [ends])
+        self.assertEqual(activity[self.static_host.mac][0], [])
+
+
+class HostSearchTriggerTest(TriggerTestCase):
+    def terms(self, host, kind):
+        return set(
+            HostSearch.objects.filter(host=host, kind=kind).values_list(
+                "term", flat=True
+            )
+        )
+
+    def search(self, term):
+        return [str(mac) for mac in HostSearch.objects.search(term)]
+
+    def test_host_terms(self):
+        self.assertEqual(
+            self.terms(self.static_host, "hostname"), {"static-host.valid"}
+        )
+        self.assertEqual(self.search("static-host.valid"), [str(self.static_host.mac)])
+
+        Host.objects.filter(pk=self.static_host.pk).update(
+            hostname="renamed-host.valid", description="Lab Printer"
+        )
+        self.assertEqual(
+            self.terms(self.static_host, "hostname"), {"renamed-host.valid"}
+        )
+        self.assertEqual(self.search("static-host"), [])
+        self.assertEqual(self.search("renamed"), [str(self.static_host.mac)])
+        self.assertEqual(self.search("printer"), [str(self.static_host.mac)])
+
+    def test_address_terms(self):
+        self.assertEqual(self.terms(self.static_host, "ip"), {"192.168.0.3"})
+        self.assertEqual(self.search("192.168.0.3"), [str(self.static_host.mac)])
+
+        Address.objects.filter(address="192.168.0.3").update(host=self.dynamic_host)
+        self.assertEqual(self.terms(self.static_host, "ip"), set())
+        self.assertEqual(self.search("192.168.0.3"), [str(self.dynamic_host.mac)])
+
+        Address.objects.filter(address="192.168.0.3").update(host=None)
+        self.assertEqual(self.search("192.168.0.3"), [])
+
+    def test_lease_terms(self):
+        lease = self.add_lease("192.168.1.10", self.dynamic_host)
+        self.assertEqual(self.terms(self.dynamic_host, "lease"), {"192.168.1.10"})
+
+        # A renewal leaves the terms alone.
+        Lease.objects.filter(pk=lease.pk).update(
+            ends=timezone.now() + datetime.timedelta(days=1)
+        )
+        self.assertEqual(self.search("192.168.1.10"), [str(self.dynamic_host.mac)])
+
+        Lease.objects.filter(pk=lease.pk).update(host=self.static_host)
+        self.assertEqual(self.terms(self.dynamic_host, "lease"), set())
+        self.assertEqual(self.search("192.168.1.10"), [str(self.static_host.mac)])
+
+        Lease.objects.filter(pk=lease.pk).delete()
+        self.assertEqual(self.search("192.168.1.10"), [])
+
+    def test_dns_terms(self):
+        record = self._add_dns_record(
+            {"name": "alias.valid", "dns_type": "A", "ip_content": "192.168.0.3"},
+            self.user_model,
+        )
+        self.assertIn("alias.valid", self.terms(self.static_host, "dns"))
+        self.assertEqual(self.search("alias"), [str(self.static_host.mac)])
+
+        DnsRecord.objects.filter(pk=record.pk).update(name="other-alias.valid")
+        self.assertEqual(self.search("alias"), [])
+        self.assertEqual(self.search("other-alias"), [str(self.static_host.mac)])
+
+        DnsRecord.objects.filter(pk=record.pk).delete()
+        self.assertEqual(self.search("other-alias"), [])
@@ -0,0 +1,46 @@
+from openipam.core.tests.test_models import IPAMTestCase
+from openipam.hosts.exports import HostExport
+from openipam.hosts.models import Host
+
+import json
+
+
+class HostExportTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            }
+        ]
+        self.dns_domains = [{"name": "valid", "type": "NATIVE"}]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.3",
+            }
+        ]
+        self.pools = []
+        self.address_types = []
+        return super(HostExportTest, self).setUp()
+
+    def stream(self, export_format):
+        response = HostExport(Host.objects.order_by("mac")).response(export_format)
+        return b"".join(response.streaming_content).decode()
+
+    def test_json_export_static_host(self):
+        hosts = json.loads(self.stream("json"))
+
+        self.assertEqual(len(hosts), 1)
+        self.assertEqual(hosts[0]["hostname"], "static-host.valid")
+        self.assertEqual(hosts[0]["ip_address"].split("/")[0], "192.168.0.3")
+
+    def test_csv_export_static_host(self):
+        lines = self.stream("csv").splitlines()
+
+        self.assertEqual(len(lines), 2)
+        self.assertIn("static-host.valid", lines[1])
+        self.assertIn("192.168.0.3", lines[1])
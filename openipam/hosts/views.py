@@ -19,13 +19,12 @@ from django.db.models import Q
 from django.db.utils import DatabaseError
 from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
 from django.contrib.contenttypes.models import ContentType
-from django.db import connection
 from django.core import serializers
 from django.forms.forms import NON_FIELD_ERRORS
 from django.forms.utils import ErrorList, ErrorDict
 
 from openipam.core.utils.messages import process_errors
-from openipam.core.views import BaseDatatableView
+from openipam.core.views import BaseDatatableView, SeekPagingMixin
 from openipam.hosts.decorators import permission_change_host
 from openipam.hosts.forms import (
     HostForm,
@@ -37,7 +36,14 @@ from openipam.hosts.forms import (
     HostDhcpGroupForm,
     HostNetworkForm,
 )
-from openipam.hosts.models import Host, Disabled, Attribute, FreeformAttributeToHost
+from openipam.hosts.models import (
+    Host,
+    HostSearch,
+    HostSummary,
+    Disabled,
+    Attribute,
+    FreeformAttributeToHost,
+)
 from openipam.network.models import Address, AddressType
 from openipam.hosts.actions import (
     delete_hosts,
@@ -57,6 +63,8 @@ from openipam.conf.ipam_settings import CONFIG
 
 from braces.views import PermissionRequiredMixin, SuperuserRequiredMixin
 
+from netaddr import EUI
+
 from itertools import zip_longest
 
 import json
@@ -67,17 +75,20 @@ import collections
 User = get_user_model()
 
 
-class HostListJson(PermissionRequiredMixin, BaseDatatableView):
+class HostListJson(PermissionRequiredMixin, SeekPagingMixin, BaseDatatableView):
     permission_required = "hosts.view_host"
 
-    order_columns = ("pk", "hostname", "mac", "expires", "addresses")
+    order_columns = ("pk", "hostname", "mac", "expires", "summary__first_address")
+
+    seek_columns = {1: "hostname", 2: "mac"}
+    seek_filter_params = ("search_filter", "owner_filter")
 
     # set max limit of records returned, this is used to protect our site if someone tries to attack our site
     # and make it return huge amount of data
     max_display_length = 3000
 
     def get_initial_queryset(self):
-        qs = Host.objects.all()
+        qs = Host.objects.select_related("summary")
         return qs
 
     def filter_queryset(self, qs):
@@ -164,51 +175,10 @@ class HostListJson(PermissionRequiredMixin, BaseDatatableView):
                 elif search_item.startswith("atype:"):
                     qs = qs.filter(address_type_id=search_str)
                 elif search_item:
-                    like_search_term = search_item + "%"
-                    cursor = connection.cursor()
-
                     if re.match("([0-9a-f]{2}[:.-]?){5}[0-9a-f]{2}", search_item):
-                        omni_sql = """
-                            SELECT hosts.mac from hosts
-                                WHERE hosts.mac = %(search)s
-                        """
+                        qs = qs.filter(mac=search_item)
                     else:
-                        omni_sql = """
-                            SELECT hosts.mac from <hosts>   </hosts>
-                                WHERE hosts.mac::text LIKE %(lsearch)s OR hosts.hostname LIKE %(lsearch)s
-
-                            UNION
-
-                            SELECT hosts.mac from hosts
-                                WHERE hosts.search_index @@ plainto_tsquery('pg_catalog.english', %(search)s)
-
-                            UNION
-
-                            SELECT DISTINCT dns_records.mac from dns_records
-                                LEFT OUTER JOIN dns_records as d2 ON (dns_records.name = d2.text_content AND d2.tid = 5)
-                                WHERE dns_records.name LIKE %(lsearch)s OR d2.name LIKE %(lsearch)s
-
-                            UNION
-
-                            SELECT addresses.mac from addresses
-                                WHERE HOST(addresses.address) = %(search)s
-
-                            UNION
-
-                            SELECT DISTINCT addresses.mac from addresses
-                                INNER JOIN dns_records ON addresses.address = dns_records.ip_content
-                                WHERE dns_records.name LIKE %(lsearch)s
-
-                            UNION
-
-                            SELECT leases.mac from leases
-                                WHERE HOST(leases.address) = %(search)s
-                        """
-                    cursor.execute(
-                        omni_sql, {"lsearch": like_search_term, "search": search_item}
-                    )
-                    search_hosts = cursor.fetchall()
-                    qs = qs.filter(mac__in=[host[0] for host in search_hosts])
+                        qs = qs.filter(mac__in=HostSearch.objects.search(search_item))
 
             if host_search:
                 if host_search.startswith("^"):
@@ -230,13 +200,7 @@ class HostListJson(PermissionRequiredMixin, BaseDatatableView):
                 )
                 qs = qs.filter(mac__startswith=mac_str.lower())
             if vendor_search:
-                qs = qs.extra(
-                    where=[
-                        "hosts.mac >= ouis.start and hosts.mac <= ouis.stop AND ouis.shortname ILIKE %s"
-                    ],
-                    params=["%%%s%%" % vendor_search],
-                    tables=["ouis"],
-                )
+                qs = qs.filter(summary__vendor__icontains=vendor_search)
             if ip_search:
                 if re.search("[a-zA-Z]", ip_search):
                     qs = qs.none()
@@ -301,80 +265,48 @@ class HostListJson(PermissionRequiredMixin, BaseDatatableView):
 
         return qs
 
-    def raw_ordering(self):
-        order_columns = (
-            "hosts.mac",
-            "hosts.hostname",
-            "hosts.mac",
-            "hosts.expires",
-            "first_address",
-        )
-
-        # Number of columns that are used in sorting
-        order_data = self.json_data.get("order", [])
-
-        order = []
-        for item in order_data:
-            column = item["column"]
-            column_dir = item["dir"]
-            sdir = "DESC" if column_dir == "desc" else "ASC"
-            sortcol = order_columns[column]
-            order.append("%s %s" % (sortcol, sdir))
-
-        if order:
-            return ",".join(order)
-        else:
-            return "hosts.hostname"
-
     def prepare_results(self, qs):
-        qs_macs = [str(q.mac) for q in qs]
-
-        if not qs_macs:
-            value_qs = []
-        else:
-
-            def dictfetchall(cursor):
-                "Returns all rows from a cursor as a dict"
-                desc = cursor.description
-                return [
-                    dict(list(zip([col[0] for col in desc], row)))
-                    for row in cursor.fetchall()
-                ]
-
-            c = connection.cursor()
-            c.execute(
-                """
-                SELECT
-                    hosts.mac, hosts.hostname, hosts.expires, disabled.mac AS disabled,
-                    array_agg(host(addresses.address)) AS address, array_agg(host(leases.address)) AS lease,
-                    coalesce(min(addresses.address), min(leases.address)) as first_address,
-                    array_agg(leases.ends) AS ends, array_agg(gul_recent_arp_byaddress.stopstamp) AS ip_stamp,
-                    (SELECT ouis.shortname from ouis
-                        WHERE hosts.mac >= ouis.start AND hosts.mac <= ouis.stop
-                        ORDER BY ouis.id DESC LIMIT 1) AS vendor,
-                    (SELECT MAX(stopstamp) FROM gul_recent_arp_bymac
-                        WHERE hosts.mac = gul_recent_arp_bymac.mac) AS mac_stamp
-                FROM hosts
-                    LEFT OUTER JOIN addresses ON hosts.mac = addresses.mac
-                    LEFT OUTER JOIN gul_recent_arp_byaddress ON addresses.address = gul_recent_arp_byaddress.address
-                    LEFT OUTER JOIN leases ON hosts.mac = leases.mac
-                    LEFT OUTER JOIN disabled ON hosts.mac = disabled.mac
-                    LEFT OUTER JOIN ouis ON hosts.mac >= ouis.start AND hosts.mac <= ouis.stop
-                WHERE hosts.mac IN %%s
-                GROUP BY hosts.mac, hosts.hostname, hosts.expires, disabled.mac
-                ORDER BY %s
-            """
-                % self.raw_ordering(),
-                [tuple(qs_macs)],
+        qs = list(qs)
+        # Leases and last seen stamps move constantly, so they are read live
+        # for this page rather than kept in the summary.
+        activity = HostSummary.objects.page_activity([host.mac for host in qs])
+        value_qs = []
+        for host in qs:
+            try:
+                summary = host.summary
+            except HostSummary.DoesNotExist:
+                summary = HostSummary(host=host)
+            leases, lease_ends, ip_stamp, mac_stamp = activity.get(
+                EUI(host.mac), ([], [], None, None)
+            )
+            value_qs.append(
+                {
+                    "mac": str(host.mac),
+                    "hostname": host.hostname,
+                    "expires": host.expires,
+                    "disabled": host.is_disabled,
+                    "address": summary.addresses,
+                    "lease": leases,
+                    "ends": lease_ends,
+                    "vendor": summary.vendor,
+                    "ip_stamp": ip_stamp,
+                    "mac_stamp": mac_stamp,
+                }
             )
-            value_qs = dictfetchall(c)
+        qs_macs = [host["mac"] for host in value_qs]
 
         user = self.request.user
-        user_change_permissions = Host.objects.filter(pk__in=qs_macs).by_change_perms(
-            user, ids_only=True
-        )
         global_delete_permission = user.has_perm("hosts.delete_host")
         global_change_permission = user.has_perm("hosts.change_host")
+        if global_change_permission or not qs_macs:
+            user_change_permissions = ()
+        else:
+            user_change_permissions = [
+                str(mac)
+                for mac in Host.objects.filter(pk__in=qs_macs).by_change_perms(
+                    user, ids_only=True
+                )
+            ]
 
         def get_last_mac_stamp(host):
             mac_stamp = host["mac_stamp"]
@@ -110,40 +110,7 @@ class NetworkAdmin(ChangedAdmin):
                 network=form.cleaned_data["network"]
             ).first()
 
-            addresses = []
-            existing_addresses = [
-                address.address
-                for address in Address.objects.filter(
-                    address__net_contained_or_equal=new_network
-                )
-            ]
-
-            for address in new_network.network:
-                if address not in existing_addresses:
-                    reserved = False
-                    if address in (
-                        new_network.gateway,
-                        new_network.network[0],
-                        new_network.network[-1],
-                    ):
-                        reserved = True
-                    pool = (
-                        DefaultPool.objects.get_pool_default(address)
-                        if not reserved
-                        else None
-                    )
-                    addresses.append(
-                        # TODO: Need to set pool eventually.
-                        Address(
-                            address=address,
-                            network=new_network,
-                            reserved=reserved,
-                            pool=pool,
-                            changed_by=request.user,
-                        )
-                    )
-            if addresses:
-                Address.objects.bulk_create(addresses)
+            Address.objects.populate_network(new_network, request.user)
 
             messages.success(
                 request, "Network: %s was successfully increased." % new_network.network
@@ -177,7 +144,6 @@ class NetworkAdmin(ChangedAdmin):
         super(NetworkAdmin, self).save_model(request, obj, form, change)
 
         if not change:
-            addresses = []
             existing_addresses = [
                 address.address
                 for address in Address.objects.filter(
@@ -191,27 +157,7 @@ class NetworkAdmin(ChangedAdmin):
                     % ",".join(str(e) for e in existing_addresses)
                 )
 
-            for address in obj.network:
-                reserved = False
-                if address in (obj.gateway, obj.network[0], obj.network[-1]):
-                    reserved = True
-                pool = (
-                    DefaultPool.objects.get_pool_default(address)
-                    if not reserved
-                    else None
-                )
-                addresses.append(
-                    # TODO: Need to set pool eventually.
-                    Address(
-                        address=address,
-                        network=obj,
-                        reserved=reserved,
-                        pool=pool,
-                        changed_by=request.user,
-                    )
-                )
-            if addresses:
-                Address.objects.bulk_create(addresses)
+            Address.objects.populate_network(obj, request.user)
 
     def get_search_results(self, request, queryset, search_term):
         queryset, use_distinct = super(NetworkAdmin, self).get_search_results(
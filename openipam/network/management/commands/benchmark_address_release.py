@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from openipam.network.models import Address, DefaultPool
+
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Compare the per address and set based address release. "
+        "Both run in savepoints of a transaction that is always rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-u", "--user", help="User name to release addresses as", required=True
+        )
+        parser.add_argument(
+            "-n",
+            "--count",
+            type=int,
+            default=1000,
+            help="Number of assigned addresses to release",
+        )
+
+    def legacy_release(self, addresses, user):
+        # The release loop as it was before AddressQuerySet.release was set based.
+        for address in addresses:
+            address.host = None
+            address.pool = DefaultPool.objects.get_pool_default(address=address.address)
+            address.changed_by = user
+            address.changed = timezone.now()
+            address.save()
+
+    def time_release(self, name, release, pks, user):
+        sid = transaction.savepoint()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            release(Address.objects.filter(pk__in=pks), user)
+            elapsed = time.time() - start
+        transaction.savepoint_rollback(sid)
+        self.stdout.write(
+            "%-8s %8d addresses  %.3fs  %d queries"
+            % (name, len(pks), elapsed, len(queries))
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["user"]).first()
+        if not user:
+            raise CommandError("User does not exist")
+
+        with transaction.atomic():
+            pks = list(
+                Address.objects.filter(host__isnull=False, reserved=False).values_list(
+                    "pk", flat=True
+                )[: options["count"]]
+            )
+            if not pks:
+                raise CommandError("There are no assigned addresses to release")
+
+            self.time_release("loop", self.legacy_release, pks, user)
+            self.time_release(
+                "bulk", lambda addresses, user: addresses.release(user=user), pks, user
+            )
+
+            transaction.set_rollback(True)
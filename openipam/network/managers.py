@@ -1,13 +1,21 @@
 from django.db.models import Model, Manager
 from django.db.models.query import QuerySet
 from django.db.models import Q
-from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from openipam.core.utils.cache_version import (
+    changes_pending,
+    get_cache_version,
+    invalidate_on_commit,
+)
+from openipam.core.utils.permissions import PermissionSubquery
 
 from guardian.shortcuts import get_objects_for_user
 
 from functools import reduce
+from ipaddress import ip_interface, ip_network
 
 # from netfields import NetManager
 
@@ -16,38 +24,36 @@ import operator
 
 class NetworkQuerySet(QuerySet):
     def can_view(self, user, use_groups=False, ids_only=False):
-        User = get_user_model()
-
-        # Temporarily set superuser to false so we can get only permission relations
-        perm_user = User.objects.get(pk=user.pk)
-
-        networks = get_objects_for_user(
-            perm_user,
-            "network.view_network",
+        # Only object permission relations, whether or not user is a superuser.
+        networks = PermissionSubquery(
+            self.model,
+            ["network.view_network"],
+            user=user,
             use_groups=use_groups,
             with_superuser=False,
-        )
+        ).filter(self)
 
         if ids_only:
-            return tuple([str(network.network) for network in networks])
+            return tuple(
+                [str(network) for network in networks.values_list("pk", flat=True)]
+            )
         else:
             return networks
 
     def by_owner(self, user, use_groups=False, ids_only=False):
-        User = get_user_model()
-
-        # Temporarily set superuser to false so we can get only permission relations
-        perm_user = User.objects.get(pk=user.pk)
-
-        networks = get_objects_for_user(
-            perm_user,
-            "network.is_owner_network",
+        # Only object permission relations, whether or not user is a superuser.
+        networks = PermissionSubquery(
+            self.model,
+            ["network.is_owner_network"],
+            user=user,
             use_groups=use_groups,
             with_superuser=False,
-        )
+        ).filter(self)
 
         if ids_only:
-            return tuple([str(network.network) for network in networks])
+            return tuple(
+                [str(network) for network in networks.values_list("pk", flat=True)]
+            )
         else:
             return networks
 
@@ -61,19 +67,17 @@ class NetworkQuerySet(QuerySet):
             else:
                 return self.all()
         else:
-            network_perms = get_objects_for_user(
-                user,
+            qs = PermissionSubquery(
+                self.model,
                 ["network.is_owner_network", "network.change_network"],
-                any_perm=True,
-            ).values_list("pk", flat=True)
-
-            qs = self.filter(network__in=list(network_perms))
+                user=user,
+            ).filter(self)
 
             if pk:
                 qs = qs.filter(pk=pk).first()
 
             if ids_only:
-                return tuple([network.network for network in qs])
+                return tuple(qs.values_list("pk", flat=True))
             else:
                 return qs
 
@@ -127,26 +131,73 @@ class AddressTypeManager(Manager):
 
 
 class AddressQuerySet(QuerySet):
+    release_sql = """
+        UPDATE addresses
+            SET mac = NULL, pool = released.pool, changed = %s, changed_by = %s
+            FROM unnest(%s::text[], %s::integer[]) AS released(address, pool)
+            WHERE addresses.address = released.address::inet
+    """
+
     def release(self, user=None, pool=False):
-        from openipam.network.models import DefaultPool, Pool
+        """
+        Unassigns the addresses in one UPDATE ... FROM, putting each in its
+        default pool, or in pool (a Pool or its id) if given.  Reserved
+        addresses are left without a pool, as clean() requires.  Does the
+        work of the per address save signals: leases on addresses left
+        without a pool are removed and the host access index is refreshed for
+        the hosts released from.
+        """
+        from openipam.network.models import DefaultPool, Lease
+        from openipam.hosts.models import HostAccess
 
         if not user:
             raise ValidationError("A user is required to delete hosts.")
 
-        # Loop through addresses and release them
-        for address in self:
-            # Get default pool if false
-            if pool is False:
-                obj_pool = DefaultPool.objects.get_pool_default(address=address.address)
-            # Assume an int if not Model
-            elif not isinstance(pool, Model):
-                obj_pool = Pool.objects.get(pk=pool)
-
-            address.host = None
-            address.pool = obj_pool
-            address.changed_by = user
-            address.changed = timezone.now()
-            address.save()
+        released = list(self.values_list("address", "host_id", "reserved"))
+        if not released:
+            return self
+
+        if pool is False:
+            default_pools = DefaultPool.objects.get_pool_defaults(
+                [address for address, host_id, reserved in released]
+            )
+            pool_ids = dict(
+                (address, default_pool.pk if default_pool else None)
+                for address, default_pool in default_pools.items()
+            )
+        else:
+            pool_id = pool.pk if isinstance(pool, Model) else int(pool)
+            pool_ids = dict(
+                (address, pool_id) for address, host_id, reserved in released
+            )
+
+        # Reserved addresses may not be in a pool.
+        addresses = [str(address) for address, host_id, reserved in released]
+        pools = [
+            None if reserved else pool_ids[address]
+            for address, host_id, reserved in released
+        ]
+
+        with transaction.atomic():
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    self.release_sql, [timezone.now(), user.pk, addresses, pools]
+                )
+            finally:
+                cursor.close()
+
+            Lease.objects.filter(
+                address__in=[
+                    address
+                    for address, address_pool in zip(addresses, pools)
+                    if address_pool is None
+                ]
+            ).delete()
+
+            HostAccess.objects.refresh_hosts(
+                set(host_id for address, host_id, reserved in released if host_id)
+            )
 
         return self
 
@@ -185,7 +236,103 @@ class AddressQuerySet(QuerySet):
 
 
 class AddressManager(Manager):
-    pass
+    # Every address of a network in one statement.  The default pools that
+    # overlap the network are found once, and each address takes the pool of
+    # the longest of those prefixes containing it.
+    populate_sql = """
+        WITH net AS (
+            SELECT
+                %(network)s::cidr AS network,
+                host(%(gateway)s::inet)::inet AS gateway,
+                1::bigint << (
+                    CASE WHEN family(%(network)s::cidr) = 4 THEN 32 ELSE 128 END
+                    - masklen(%(network)s::cidr)
+                ) AS size
+        ),
+        pools AS (
+            SELECT default_pools.pool_id, default_pools.cidr
+            FROM default_pools, net
+            WHERE default_pools.cidr && net.network
+        ),
+        candidates AS (
+            SELECT
+                host(network(net.network) + i)::inet AS address,
+                i = 0 OR i = net.size - 1
+                    OR coalesce(host(network(net.network) + i)::inet = net.gateway, false)
+                    AS reserved
+            FROM net, generate_series(0::bigint, net.size - 1) AS i
+        )
+        INSERT INTO addresses (address, network, reserved, pool, changed, changed_by)
+            SELECT
+                candidates.address,
+                net.network,
+                candidates.reserved,
+                CASE WHEN candidates.reserved THEN NULL ELSE (
+                    SELECT pools.pool_id FROM pools
+                    WHERE pools.cidr >>= candidates.address
+                    ORDER BY masklen(pools.cidr) DESC LIMIT 1
+                ) END,
+                now(),
+                %(user)s
+            FROM candidates, net
+        ON CONFLICT (address) DO NOTHING
+    """
+
+    def populate_network(self, network, user):
+        """
+        Creates the addresses of network that do not exist yet, reserving the
+        network, broadcast and gateway addresses and putting the rest in their
+        default pool.  Returns the number of addresses created.
+        """
+        # The size is computed as a bigint, which IPv6 prefixes of /65 or
+        # shorter overflow, and no such network can be populated anyway.
+        if ip_network(str(network.network)).num_addresses >= 1 << 63:
+            raise ValidationError(
+                "Network %s is too large to create its addresses." % network.network
+            )
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                self.populate_sql,
+                {
+                    "network": str(network.network),
+                    "gateway": str(network.gateway) if network.gateway else None,
+                    "user": user.pk,
+                },
+            )
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+class FreeAddressManager(Manager):
+    def available(self, network, pools=None, host=None):
+        """
+        Free addresses in network, in address order.  Addresses in a pool are
+        only included if the pool is in pools, and addresses with an active
+        lease only if the lease belongs to host.
+        """
+        qs = self.filter(network=network)
+        if pools is not None:
+            qs = qs.filter(Q(pool__isnull=True) | Q(pool__in=pools))
+        lease_q = Q(lease_ends__isnull=True) | Q(lease_ends__lte=timezone.now())
+        if host is not None:
+            lease_q |= Q(lease_host=host)
+        return qs.filter(lease_q).order_by("address")
+
+    def allocate(self, n, network, pools=None, host=None):
+        """
+        Locks and returns up to n free addresses in network.  Addresses locked
+        by a concurrent allocation are skipped rather than waited on, so this
+        must run inside a transaction that goes on to assign them.
+        """
+        free = (
+            self.available(network, pools=pools, host=host)
+            .select_related("address")
+            .select_for_update(skip_locked=True)[:n]
+        )
+        return [free_address.address for free_address in free]
 
 
 # class AddressManager(NetManager):
@@ -334,13 +481,71 @@ class AddressManager(Manager):
 
 
 class DefaultPoolManager(Manager):
+    """
+    Resolves the default pool of addresses by longest prefix match against
+    an in-process radix trie of DefaultPool CIDRs.  The trie is loaded on
+    first use and reloaded when DefaultPool changes bump its version, see
+    core.utils.cache_version.  Until a change commits, lookups in its
+    transaction use a trie that is not kept.
+    """
+
+    version_key = "ipam_default_pool_version"
+    _trie = {"version": None, "roots": {}}
+
+    def invalidate(self):
+        self.reset()
+        invalidate_on_commit(self.version_key)
+
+    def reset(self):
+        self._trie.update(version=None, roots={})
+
+    def _load_trie(self):
+        # Nodes are [zero child, one child, (pool,)]; the pool is wrapped so a
+        # default pool row with no pool still overrides shorter prefixes.
+        roots = {}
+        for default_pool in self.get_queryset().select_related("pool"):
+            network = ip_network(str(default_pool.cidr))
+            width = network.max_prefixlen
+            bits = int(network.network_address)
+            node = roots.setdefault(network.version, [None, None, None])
+            for depth in range(network.prefixlen):
+                bit = (bits >> (width - 1 - depth)) & 1
+                if node[bit] is None:
+                    node[bit] = [None, None, None]
+                node = node[bit]
+            node[2] = (default_pool.pool,)
+        return roots
+
+    def _get_roots(self):
+        if changes_pending(self.version_key):
+            return self._load_trie()
+        version = get_cache_version(self.version_key)
+        trie = self._trie
+        if trie["version"] != version:
+            trie.update(version=version, roots=self._load_trie())
+        return trie["roots"]
+
+    def _match(self, roots, address):
+        address = ip_interface(str(address)).ip
+        width = address.max_prefixlen
+        bits = int(address)
+        node = roots.get(address.version)
+        match = None
+        depth = 0
+        while node is not None:
+            if node[2] is not None:
+                match = node[2]
+            if depth == width:
+                break
+            node = node[(bits >> (width - 1 - depth)) & 1]
+            depth += 1
+        return match[0] if match else None
+
+    def get_pool_defaults(self, addresses):
+        """Returns a dict of each address to its default Pool, or None."""
+        roots = self._get_roots()
+        return dict((address, self._match(roots, address)) for address in addresses)
+
     def get_pool_default(self, address):
         # Find most specific DefaultPool for this address and return associated Pool
-        pool = (
-            self.filter(cidr__net_contains_or_equals=address).extra(
-                select={"masklen": "masklen(cidr)"}, order_by=["-masklen"]
-            )
-        ).first()
-        # first one should have the longest mask, which is most specific
-        pool = pool.pool if pool else None
-        return pool
+        return self._match(self._get_roots(), address)
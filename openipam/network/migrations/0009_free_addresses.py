@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Free list of every unassigned, unreserved address, per network, with the
+# state of its lease.  Lease expiry is time based, so the lease end is kept
+# on the row and checked at allocation time.
+free_addresses_sql = """
+CREATE TABLE free_addresses (
+    address inet PRIMARY KEY,
+    network cidr NOT NULL,
+    pool integer,
+    lease_mac macaddr,
+    lease_ends timestamp with time zone
+);
+CREATE INDEX free_addresses_network_idx ON free_addresses (network, address);
+
+CREATE FUNCTION free_addresses_refresh(target inet) RETURNS void AS $$
+BEGIN
+    DELETE FROM free_addresses WHERE address = target;
+    INSERT INTO free_addresses (address, network, pool, lease_mac, lease_ends)
+        SELECT
+            addresses.address, addresses.network, addresses.pool, leases.mac,
+            CASE WHEN leases.abandoned THEN NULL ELSE leases.ends END
+        FROM addresses
+        LEFT OUTER JOIN leases ON leases.address = addresses.address
+        WHERE addresses.address = target
+            AND addresses.mac IS NULL
+            AND NOT addresses.reserved;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION free_addresses_addresses_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM free_addresses_refresh(NEW.address);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM free_addresses_refresh(OLD.address);
+    ELSE
+        PERFORM free_addresses_refresh(OLD.address);
+        IF NEW.address IS DISTINCT FROM OLD.address THEN
+            PERFORM free_addresses_refresh(NEW.address);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Leases renew constantly, so only touch the lease columns of the row.
+CREATE FUNCTION free_addresses_leases_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE free_addresses SET lease_mac = NULL, lease_ends = NULL
+            WHERE address = OLD.address;
+    ELSE
+        IF TG_OP = 'UPDATE' AND NEW.address IS DISTINCT FROM OLD.address THEN
+            UPDATE free_addresses SET lease_mac = NULL, lease_ends = NULL
+                WHERE address = OLD.address;
+        END IF;
+        UPDATE free_addresses
+            SET lease_mac = NEW.mac,
+                lease_ends = CASE WHEN NEW.abandoned THEN NULL ELSE NEW.ends END
+            WHERE address = NEW.address;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER free_addresses_addresses
+    AFTER INSERT OR DELETE OR UPDATE OF address, mac, pool, reserved, network
+    ON addresses
+    FOR EACH ROW EXECUTE PROCEDURE free_addresses_addresses_trigger();
+CREATE TRIGGER free_addresses_leases
+    AFTER INSERT OR DELETE OR UPDATE OF address, mac, ends, abandoned ON leases
+    FOR EACH ROW EXECUTE PROCEDURE free_addresses_leases_trigger();
+
+INSERT INTO free_addresses (address, network, pool, lease_mac, lease_ends)
+    SELECT
+        addresses.address, addresses.network, addresses.pool, leases.mac,
+        CASE WHEN leases.abandoned THEN NULL ELSE leases.ends END
+    FROM addresses
+    LEFT OUTER JOIN leases ON leases.address = addresses.address
+    WHERE addresses.mac IS NULL AND NOT addresses.reserved;
+"""
+
+reverse_free_addresses_sql = """
+DROP TRIGGER IF EXISTS free_addresses_addresses ON addresses;
+DROP TRIGGER IF EXISTS free_addresses_leases ON leases;
+DROP FUNCTION IF EXISTS free_addresses_addresses_trigger();
+DROP FUNCTION IF EXISTS free_addresses_leases_trigger();
+DROP FUNCTION IF EXISTS free_addresses_refresh(inet);
+DROP TABLE IF EXISTS free_addresses;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0008_auto_20190723_1515"),
+        ("hosts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(free_addresses_sql, reverse_free_addresses_sql),
+        migrations.CreateModel(
+            name="FreeAddress",
+            fields=[
+                (
+                    "address",
+                    models.OneToOneField(
+                        db_column="address",
+                        db_constraint=False,
+                        on_delete=models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="free",
+                        serialize=False,
+                        to="network.Address",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        db_column="network",
+                        db_constraint=False,
+                        on_delete=models.deletion.DO_NOTHING,
+                        related_name="free_addresses",
+                        to="network.Network",
+                    ),
+                ),
+                (
+                    "pool",
+                    models.ForeignKey(
+                        db_column="pool",
+                        db_constraint=False,
+                        null=True,
+                        on_delete=models.deletion.DO_NOTHING,
+                        related_name="free_addresses",
+                        to="network.Pool",
+                    ),
+                ),
+                (
+                    "lease_host",
+                    models.ForeignKey(
+                        db_column="lease_mac",
+                        db_constraint=False,
+                        null=True,
+                        on_delete=models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="hosts.Host",
+                    ),
+                ),
+                ("lease_ends", models.DateTimeField(null=True)),
+            ],
+            options={"db_table": "free_addresses", "managed": False},
+        ),
+    ]
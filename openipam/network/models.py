@@ -1,7 +1,13 @@
 from django.conf import settings
 from django.db import models
 from django.core.exceptions import ValidationError
-from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.utils import timezone
 
 from djorm_pgfulltext.fields import VectorField
@@ -20,6 +26,7 @@ from openipam.network.managers import (
     AddressTypeManager,
     AddressManager,
     AddressQuerySet,
+    FreeAddressManager,
     NetworkManager,
     NetworkQuerySet,
 )
@@ -27,6 +34,7 @@ from openipam.network.signals import (
     validate_address_type,
     release_leases,
     set_default_pool,
+    invalidate_default_pools,
 )
 from openipam.user.signals import remove_obj_perms_connected_with_user
 
@@ -443,6 +451,50 @@ class Address(models.Model):
         verbose_name_plural = "addresses"
 
 
+class FreeAddress(models.Model):
+    address = models.OneToOneField(
+        "Address",
+        on_delete=models.DO_NOTHING,
+        db_column="address",
+        db_constraint=False,
+        related_name="free",
+        primary_key=True,
+    )
+    network = models.ForeignKey(
+        "Network",
+        on_delete=models.DO_NOTHING,
+        db_column="network",
+        db_constraint=False,
+        related_name="free_addresses",
+    )
+    pool = models.ForeignKey(
+        "Pool",
+        on_delete=models.DO_NOTHING,
+        db_column="pool",
+        db_constraint=False,
+        null=True,
+        related_name="free_addresses",
+    )
+    lease_host = models.ForeignKey(
+        "hosts.Host",
+        on_delete=models.DO_NOTHING,
+        db_column="lease_mac",
+        db_constraint=False,
+        null=True,
+        related_name="+",
+    )
+    lease_ends = models.DateTimeField(null=True)
+
+    objects = FreeAddressManager()
+
+    def __str__(self):
+        return "%s" % self.pk
+
+    class Meta:
+        managed = False
+        db_table = "free_addresses"
+
+
 class AddressType(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -477,5 +529,7 @@ class AddressType(models.Model):
 pre_save.connect(set_default_pool, sender=Address)
 m2m_changed.connect(validate_address_type, sender=AddressType.ranges.through)
 post_save.connect(release_leases, sender=Address)
+post_save.connect(invalidate_default_pools, sender=DefaultPool)
+post_delete.connect(invalidate_default_pools, sender=DefaultPool)
 pre_delete.connect(remove_obj_perms_connected_with_user, sender=Network)
 pre_delete.connect(remove_obj_perms_connected_with_user, sender=DhcpOption)
@@ -16,6 +16,11 @@ def set_default_pool(sender, instance, **kwargs):
         instance.pool = pool
 
 
+# Other processes reload their default pool trie once the change is visible.
+def invalidate_default_pools(sender, instance, **kwargs):
+    sender.objects.invalidate()
+
+
 def validate_address_type(sender, instance, action, **kwargs):
     if action == "pre_add":
         if instance.pool:
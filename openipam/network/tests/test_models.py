@@ -1,6 +1,7 @@
 # import unittest
 # import ipaddr
-# from django.test import TestCase
+from django.core.exceptions import ValidationError
+from django.test import TestCase
 
 from openipam.hosts.models import Host
 
@@ -8,11 +9,22 @@ from openipam.hosts.models import Host
 # from openipam.dns.models import Domain, DnsRecord, DnsType
 # from openipam.dns.models import DnsRecord
 # from openipam.user.models import User
-from openipam.core.tests.test_models import IPAMTestCase
+from openipam.core.tests.test_models import IPAMTestCase, PermissionLookupMixin
+from openipam.core.utils.permissions import PermissionSubquery
+from openipam.network.models import (
+    Address,
+    DefaultPool,
+    FreeAddress,
+    Lease,
+    Network,
+    Pool,
+)
+from openipam.user.models import User
+
+from django.utils import timezone
 
-# from django.utils import timezone
 # from django.db import IntegrityError
-# import datetime
+import datetime
 
 
 class AddressTest(IPAMTestCase):
@@ -128,3 +140,197 @@ class AddressTest(IPAMTestCase):
         # assign address
         # check stuff
         self.assertEqual(1, 0)
+
+
+class FreeAddressTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {"network": "10.0.0.0/29", "name": "rfc1918-10-0-0", "gateway": "10.0.0.1"}
+        ]
+        self.dns_domains = [{"name": "valid", "type": "NATIVE"}]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "10.0.0.3",
+            },
+            {"hostname": "dynamic-host.valid", "mac": "ffffff000001"},
+            {"hostname": "other-host.valid", "mac": "ffffff000002"},
+        ]
+        self.pools = [{"name": "pool1", "description": "", "lease_time": 1800}]
+        self.address_types = []
+        super(FreeAddressTest, self).setUp()
+
+        self.network = Network.objects.get(network="10.0.0.0/29")
+        self.pool = Pool.objects.get(name="pool1")
+        self.dynamic_host = Host.objects.get(pk="ffffff000001")
+        self.other_host = Host.objects.get(pk="ffffff000002")
+
+    def available(self, **kwargs):
+        return [
+            str(free.address_id)
+            for free in FreeAddress.objects.available(self.network, **kwargs)
+        ]
+
+    def add_lease(self, address, host, ends):
+        return Lease.objects.create(
+            address=Address.objects.get(address=address),
+            host=host,
+            starts=timezone.now() - datetime.timedelta(hours=1),
+            ends=ends,
+        )
+
+    def test_unassigned_unreserved_addresses(self):
+        self.assertEqual(
+            self.available(), ["10.0.0.2", "10.0.0.4", "10.0.0.5", "10.0.0.6"]
+        )
+
+        Address.objects.filter(address="10.0.0.4").update(host=self.dynamic_host)
+        Address.objects.filter(address="10.0.0.3").update(host=None)
+        self.assertEqual(
+            self.available(), ["10.0.0.2", "10.0.0.3", "10.0.0.5", "10.0.0.6"]
+        )
+
+    def test_pools(self):
+        Address.objects.filter(address="10.0.0.2").update(pool=self.pool)
+        self.assertNotIn("10.0.0.2", self.available(pools=[]))
+        self.assertIn("10.0.0.2", self.available(pools=[self.pool]))
+
+    def test_leases(self):
+        now = timezone.now()
+        self.add_lease("10.0.0.2", self.dynamic_host, now + datetime.timedelta(hours=1))
+        self.add_lease("10.0.0.4", self.dynamic_host, now - datetime.timedelta(hours=1))
+
+        self.assertEqual(self.available(), ["10.0.0.4", "10.0.0.5", "10.0.0.6"])
+        self.assertEqual(
+            self.available(host=self.dynamic_host),
+            ["10.0.0.2", "10.0.0.4", "10.0.0.5", "10.0.0.6"],
+        )
+        self.assertNotIn("10.0.0.2", self.available(host=self.other_host))
+
+        Lease.objects.filter(address="10.0.0.2").delete()
+        self.assertIn("10.0.0.2", self.available())
+
+    def test_allocate(self):
+        self.assertEqual(
+            [
+                str(address.address)
+                for address in FreeAddress.objects.allocate(2, self.network)
+            ],
+            ["10.0.0.2", "10.0.0.4"],
+        )
+
+
+class ReleaseAddressTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.0.0/24",
+                "name": "rfc1918-192-168-0",
+                "gateway": "192.168.0.1",
+            }
+        ]
+        self.dns_domains = [{"name": "valid", "type": "NATIVE"}]
+        self.dns_records = []
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.3",
+            }
+        ]
+        self.pools = [
+            {"name": name, "description": "", "lease_time": 1800}
+            for name in ["default-pool", "other-pool"]
+        ]
+        self.address_types = []
+        super(ReleaseAddressTest, self).setUp()
+
+        self.default_pool = Pool.objects.get(name="default-pool")
+        self.other_pool = Pool.objects.get(name="other-pool")
+        DefaultPool.objects.create(pool=self.default_pool, cidr="192.168.0.0/24")
+        self.addresses = Address.objects.filter(address="192.168.0.3")
+
+    def released(self):
+        address = Address.objects.get(address="192.168.0.3")
+        self.assertIsNone(address.host)
+        return address
+
+    def test_release_to_default_pool(self):
+        self.addresses.release(user=self.user_model)
+        self.assertEqual(self.released().pool, self.default_pool)
+
+    def test_release_to_given_pool(self):
+        self.addresses.release(user=self.user_model, pool=self.other_pool)
+        self.assertEqual(self.released().pool, self.other_pool)
+
+    def test_release_to_given_pool_id(self):
+        self.addresses.release(user=self.user_model, pool=self.other_pool.pk)
+        self.assertEqual(self.released().pool, self.other_pool)
+
+    def test_release_reserved_address(self):
+        self.addresses.update(reserved=True)
+        self.addresses.release(user=self.user_model)
+        self.assertIsNone(self.released().pool)
+
+
+class PopulateNetworkTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="network-admin")
+
+    def populate(self, network, gateway=None):
+        network = Network.objects.create(
+            network=network, gateway=gateway, changed_by=self.user
+        )
+        return network, Address.objects.populate_network(network, self.user)
+
+    def test_ipv4_network(self):
+        network, created = self.populate("10.0.0.0/29", gateway="10.0.0.1")
+        self.assertEqual(created, 8)
+        self.assertEqual(
+            sorted(
+                str(address)
+                for address in Address.objects.filter(
+                    network=network, reserved=True
+                ).values_list("address", flat=True)
+            ),
+            ["10.0.0.0", "10.0.0.1", "10.0.0.7"],
+        )
+
+    def test_small_ipv6_network(self):
+        network, created = self.populate("2001:db8::/120")
+        self.assertEqual(created, 256)
+
+    def test_large_ipv6_network_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.populate("2001:db8::/64")
+        self.assertFalse(Address.objects.filter(address="2001:db8::1").exists())
+
+
+class NetworkPermissionLookupTest(PermissionLookupMixin, TestCase):
+    model = Network
+    owner_perm = "network.is_owner_network"
+    change_perms = ["network.is_owner_network", "network.change_network"]
+
+    def create_objects(self, user):
+        return [
+            Network.objects.create(
+                changed_by=user,
+                network="10.0.%s.0/24" % i,
+                name="perm-10-0-%s" % i,
+                gateway="10.0.%s.1" % i,
+            )
+            for i in range(3)
+        ]
+
+    def owned(self, user, use_groups):
+        return Network.objects.by_owner(user, use_groups=use_groups)
+
+    def owned_by_group(self, group):
+        return PermissionSubquery(Network, [self.owner_perm], groups=[group]).filter(
+            Network.objects.all()
+        )
+
+    def changeable(self, user):
+        return Network.objects.by_change_perms(user)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from openipam.report.stats import refresh_stats
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "Recompute the cached dashboard stats snapshot, e.g. from cron."
+
+    def handle(self, *args, **options):
+        start = time.time()
+        snapshot = refresh_stats()
+        self.stdout.write(
+            "Refreshed stats as of %s in %.2fs"
+            % (snapshot["as_of"].isoformat(), time.time() - start)
+        )
+        for key, count in sorted(snapshot["counts"].items()):
+            self.stdout.write("%-30s %s" % (key, count))
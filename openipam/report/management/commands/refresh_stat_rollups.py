@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from openipam.report.models import StatRollup
+
+import time
+
+
+class Command(BaseCommand):
+    args = ""
+    help = (
+        "Recount the hourly and daily rollups the stats charts read, e.g. hourly "
+        "from cron."
+    )
+
+    def handle(self, *args, **options):
+        start = time.time()
+        written = StatRollup.objects.refresh_all()
+        for series, buckets in sorted(written.items()):
+            self.stdout.write("%-30s %s buckets" % (series, buckets))
+        self.stdout.write("Refreshed stat rollups in %.2fs" % (time.time() - start))
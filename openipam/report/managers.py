@@ -0,0 +1,146 @@
+from django.apps import apps
+from django.db.models import Manager, Sum, Case, When, IntegerField
+from django.db import connection, transaction
+from django.conf import settings
+from django.utils import timezone
+
+from openipam.conf.ipam_settings import CONFIG
+
+from datetime import datetime, time, timedelta
+
+
+class StatRollupManager(Manager):
+    """
+    Hourly and daily row counts for the charted model columns listed in
+    STATS_ROLLUP_SERIES, so charts read a handful of indexed rows instead
+    of scanning the live table.  The columns can move forward, so each
+    refresh recounts everything the charts read from rollups: the daily
+    buckets of the last STATS_ROLLUP_DAYS days and the hourly buckets since
+    the start of the week or month.  Buckets are local days and hours in
+    settings.TIME_ZONE, as the charts show them.
+    """
+
+    periods = ("hour", "day")
+
+    rollup_sql = """
+        INSERT INTO stat_rollups (series, period, bucket, count)
+            SELECT %%(series)s, %%(period)s,
+                date_trunc(%%(period)s, %(column)s AT TIME ZONE %%(tz)s) AT TIME ZONE %%(tz)s,
+                count(*)
+            FROM %(table)s
+            WHERE %(column)s >= %%(since)s
+            GROUP BY 1, 2, 3
+    """
+
+    @staticmethod
+    def series_name(model, column):
+        return "%s.%s.%s" % (model._meta.app_label, model._meta.object_name, column)
+
+    def get_series(self, model, column):
+        """Returns the series name if model and column are rolled up, else None."""
+        for app_label, model_name, series_column in CONFIG.get("STATS_ROLLUP_SERIES"):
+            if (
+                model._meta.app_label == app_label
+                and model._meta.object_name == model_name
+                and column == series_column
+            ):
+                series = self.series_name(model, column)
+                if self.filter(series=series).exists():
+                    return series
+        return None
+
+    @staticmethod
+    def window_start(period, days=None):
+        """The earliest bucket a refresh recounts for period, in local time."""
+        today = timezone.localtime(timezone.now()).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        if period == "hour":
+            start = min(today.replace(day=1), today - timedelta(days=today.weekday()))
+        else:
+            start = today - timedelta(days=days or CONFIG.get("STATS_ROLLUP_DAYS"))
+        # Rebuilt from the date, so the offset is right across DST changes.
+        return timezone.make_aware(datetime.combine(start.date(), time()))
+
+    def refresh(self, model, column, period):
+        """Recounts one series and period.  Returns the number of buckets written."""
+        series = self.series_name(model, column)
+        since = self.window_start(period)
+
+        sql = self.rollup_sql % {
+            "table": connection.ops.quote_name(model._meta.db_table),
+            "column": connection.ops.quote_name(model._meta.get_field(column).column),
+        }
+
+        with transaction.atomic():
+            self.filter(series=series, period=period).delete()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    sql,
+                    {
+                        "series": series,
+                        "period": period,
+                        "since": since,
+                        "tz": settings.TIME_ZONE,
+                    },
+                )
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def refresh_all(self):
+        """Refreshes every configured series.  Returns {series: buckets written}."""
+        written = {}
+        for app_label, model_name, column in CONFIG.get("STATS_ROLLUP_SERIES"):
+            model = apps.get_model(app_label=app_label, model_name=model_name)
+            series = self.series_name(model, column)
+            written[series] = sum(
+                self.refresh(model, column, period) for period in self.periods
+            )
+        return written
+
+    def covers(self, start):
+        """Whether the daily buckets hold every day from start on."""
+        # A day short of the refreshed window, in case cron has not yet
+        # run since midnight.
+        days = CONFIG.get("STATS_ROLLUP_DAYS") - 1
+        return start >= self.window_start("day", days=days)
+
+    def totals(self, series, day, week, month):
+        """Row counts since the start of the day, week and month, in one query."""
+
+        def since(start):
+            return Sum(
+                Case(
+                    When(bucket__gte=start, then="count"),
+                    default=0,
+                    output_field=IntegerField(),
+                )
+            )
+
+        earliest = min(day, week, month)
+        totals = self.filter(
+            series=series, period="hour", bucket__gte=earliest
+        ).aggregate(day=since(day), week=since(week), month=since(month))
+        return [totals["day"] or 0, totals["week"] or 0, totals["month"] or 0]
+
+    def time_series(self, series, start, end):
+        """[(day, count), ...] for every local day from start to end, zeros included."""
+        date = timezone.localtime(start).date()
+        counts = dict(
+            self.filter(
+                series=series,
+                period="day",
+                bucket__gte=timezone.make_aware(datetime.combine(date, time())),
+                bucket__lte=end,
+            ).values_list("bucket", "count")
+        )
+        days = []
+        day = timezone.make_aware(datetime.combine(date, time()))
+        while day <= end:
+            days.append((day, counts.get(day, 0)))
+            # Rebuilt from the date, so the offset is right across DST changes.
+            date += timedelta(days=1)
+            day = timezone.make_aware(datetime.combine(date, time()))
+        return days
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="StatRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        verbose_name="ID",
+                        serialize=False,
+                        auto_created=True,
+                        primary_key=True,
+                    ),
+                ),
+                ("series", models.CharField(max_length=255)),
+                ("period", models.CharField(max_length=10)),
+                ("bucket", models.DateTimeField()),
+                ("count", models.IntegerField()),
+            ],
+            options={"db_table": "stat_rollups"},
+        ),
+        migrations.AlterUniqueTogether(
+            name="statrollup", unique_together=set([("series", "period", "bucket")])
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import models
+
+from openipam.report.managers import StatRollupManager
+
+
+class StatRollup(models.Model):
+    """Row counts of a charted model per hour or day of one of its date columns."""
+
+    series = models.CharField(max_length=255)
+    period = models.CharField(max_length=10)
+    bucket = models.DateTimeField()
+    count = models.IntegerField()
+
+    objects = StatRollupManager()
+
+    def __str__(self):
+        return "%s %s %s: %s" % (self.series, self.period, self.bucket, self.count)
+
+    class Meta:
+        db_table = "stat_rollups"
+        unique_together = ("series", "period", "bucket")
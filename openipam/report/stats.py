@@ -0,0 +1,190 @@
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from openipam.conf.ipam_settings import CONFIG
+
+from datetime import timedelta
+
+import threading
+
+SNAPSHOT_KEY = "ipam_stats_snapshot"
+REFRESH_LOCK_KEY = "ipam_stats_snapshot_refresh"
+
+# Each table is scanned once, every counter over it is a FILTER on that scan.
+STATS_SQL = """
+    SELECT * FROM
+    (
+        SELECT
+            count(*) AS hosts,
+            count(*) FILTER (WHERE expires <= %(now)s) AS expired_hosts,
+            count(*) FILTER (
+                WHERE expires >= %(now)s
+                    AND EXISTS (SELECT 1 FROM addresses WHERE addresses.mac = hosts.mac)
+            ) AS static_hosts,
+            count(*) FILTER (
+                WHERE expires >= %(now)s
+                    AND EXISTS (
+                        SELECT 1 FROM hosts_to_pools WHERE hosts_to_pools.mac = hosts.mac
+                    )
+            ) AS dynamic_hosts
+        FROM hosts
+    ) AS host_counts,
+    (
+        SELECT
+            count(*) FILTER (WHERE ends >= %(now)s) AS active_leases,
+            count(*) FILTER (WHERE abandoned) AS abandoned_leases
+        FROM leases
+    ) AS lease_counts,
+    (
+        SELECT
+            count(*) AS networks,
+            count(*) FILTER (WHERE dhcp_groups.name = ANY(%(wireless)s)) AS wireless_networks
+        FROM networks
+        LEFT JOIN dhcp_groups ON dhcp_groups.id = networks.dhcp_group
+    ) AS network_counts,
+    (
+        SELECT
+            count(*) AS wireless_addresses,
+            count(*) FILTER (
+                WHERE EXISTS (
+                    SELECT 1 FROM leases
+                    WHERE leases.address = addresses.address AND leases.ends < %(now)s
+                )
+            ) AS wireless_addresses_available
+        FROM addresses
+        INNER JOIN networks ON networks.network = addresses.network
+        INNER JOIN dhcp_groups ON dhcp_groups.id = networks.dhcp_group
+        WHERE dhcp_groups.name = ANY(%(wireless)s)
+    ) AS wireless_counts,
+    (
+        SELECT
+            count(*) FILTER (WHERE dns_types.name IN ('A', 'AAAA')) AS dns_a_records,
+            count(*) FILTER (WHERE dns_types.name = 'CNAME') AS dns_cname_records,
+            count(*) FILTER (WHERE dns_types.name = 'MX') AS dns_mx_records
+        FROM dns_records
+        INNER JOIN dns_types ON dns_types.id = dns_records.tid
+    ) AS dns_counts,
+    (
+        SELECT count(*) FILTER (WHERE last_login >= %(active_since)s) AS active_users
+        FROM users
+    ) AS user_counts
+"""
+
+# (name, counts to show, tip) for each dashboard row.
+DASHBOARD_STATS = (
+    ("All Hosts", ("hosts",), "All hosts in openIPAM."),
+    (
+        "Expired Hosts",
+        ("expired_hosts",),
+        "All hosts who's expiry date is before today's date.",
+    ),
+    ("Static Hosts", ("static_hosts",), "Static hosts which are not expired."),
+    ("Dynamic Hosts", ("dynamic_hosts",), "Dynamic hosts which are not expired."),
+    ("Active Leases", ("active_leases",), "All leases who end in the future."),
+    ("Abandoned Leases", ("abandoned_leases",), "Leases that have been abandoned."),
+    (
+        "Networks: (Total / Wireless)",
+        ("networks", "wireless_networks"),
+        "A total of all networks / wireless networks.",
+    ),
+    (
+        "Available Wireless Addresses",
+        ("wireless_addresses_available",),
+        "A total of wireless addresses available.",
+    ),
+    ("DNS A Records", ("dns_a_records",), "Total of all A records."),
+    ("DNS CNAME Records", ("dns_cname_records",), "Total of all CNAME records."),
+    ("DNS MX Records", ("dns_mx_records",), "Total of all MX records."),
+    (
+        "Active Users Within 1 Year",
+        ("active_users",),
+        "Active Users within the last year.",
+    ),
+)
+
+_local = {"snapshot": None}
+
+
+def compute_stats():
+    """Counts everything the dashboards show in a single query."""
+    now = timezone.now()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            STATS_SQL,
+            {
+                "now": now,
+                "active_since": now - timedelta(days=365),
+                "wireless": list(CONFIG.get("STATS_WIRELESS_DHCP_GROUPS")),
+            },
+        )
+        columns = [column[0] for column in cursor.description]
+        counts = dict(zip(columns, cursor.fetchone()))
+    finally:
+        cursor.close()
+    return {"as_of": now, "counts": counts}
+
+
+def refresh_stats():
+    """Recomputes the snapshot and shares it through the cache."""
+    snapshot = compute_stats()
+    # Kept past the TTL so readers can serve it while a refresh runs.
+    cache.set(SNAPSHOT_KEY, snapshot, CONFIG.get("STATS_CACHE_TTL") * 4)
+    _local["snapshot"] = snapshot
+    return snapshot
+
+
+def _refresh_in_background():
+    # Only one process refreshes at a time, the rest keep serving the old copy.
+    if not cache.add(REFRESH_LOCK_KEY, True, CONFIG.get("STATS_CACHE_TTL")):
+        return
+
+    def refresh():
+        try:
+            refresh_stats()
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+            connection.close()
+
+    thread = threading.Thread(target=refresh, name="ipam-stats-refresh")
+    thread.daemon = True
+    thread.start()
+
+
+def _age(snapshot):
+    return (timezone.now() - snapshot["as_of"]).total_seconds()
+
+
+def get_stats():
+    """
+    Returns the latest snapshot, {"as_of": datetime, "counts": {...}}.  It
+    is served from process memory, then the shared cache, and only computed
+    inline when neither has one.  A snapshot older than STATS_CACHE_TTL is
+    still returned while a fresh one is computed in the background.
+    """
+    ttl = CONFIG.get("STATS_CACHE_TTL")
+    snapshot = _local["snapshot"]
+    if snapshot is None or _age(snapshot) > ttl:
+        snapshot = cache.get(SNAPSHOT_KEY) or snapshot
+        if snapshot is None:
+            return refresh_stats()
+        _local["snapshot"] = snapshot
+    if _age(snapshot) > ttl:
+        _refresh_in_background()
+    return snapshot
+
+
+def dashboard_stats(snapshot):
+    """The snapshot as rows of name, count and tip."""
+    counts = snapshot["counts"]
+    return [
+        {
+            "name": name,
+            "count": " / ".join(str(counts[key]) for key in keys)
+            if len(keys) > 1
+            else counts[keys[0]],
+            "tip": tip,
+        }
+        for name, keys, tip in DASHBOARD_STATS
+    ]
@@ -1 +1,243 @@
-# Create your tests here.
+from django.db.models import Q
+from django.test import TestCase
+from django.utils import timezone
+
+from openipam.conf.ipam_settings import CONFIG
+from openipam.core.tests.test_models import IPAMTestCase
+from openipam.dns.models import DnsRecord
+from openipam.hosts.models import Host
+from openipam.network.models import Address, DhcpGroup, Lease, Network
+from openipam.report.models import StatRollup
+from openipam.report.stats import compute_stats
+from openipam.user.models import User
+
+from datetime import timedelta
+from functools import reduce
+
+import operator
+
+
+class StatsTest(IPAMTestCase):
+    def setUp(self):
+        self.networks = [
+            {
+                "network": "192.168.{}.0/24".format(i),
+                "name": "rfc1918-192-168-{}".format(i),
+                "gateway": "192.168.{}.1".format(i),
+            }
+            for i in range(2)
+        ]
+        self.dns_domains = [
+            {"name": i, "type": "NATIVE"} for i in ["valid", "168.192.in-addr.arpa"]
+        ]
+        self.dns_records = [
+            {
+                "name": "static-host.valid",
+                "dns_type": "A",
+                "ip_content": "192.168.0.10",
+            },
+            {
+                "name": "alias.valid",
+                "dns_type": "CNAME",
+                "text_content": "static-host.valid",
+            },
+            {
+                "name": "valid",
+                "dns_type": "MX",
+                "priority": 10,
+                "text_content": "static-host.valid",
+            },
+        ]
+        self.hosts = [
+            {
+                "hostname": "static-host.valid",
+                "mac": "ffffff000000",
+                "address": "192.168.0.10",
+            },
+            {"hostname": "dynamic-host.valid", "mac": "ffffff000001", "pool": "pool1"},
+            {
+                "hostname": "expired-host.valid",
+                "mac": "ffffff000002",
+                "expires": timezone.now() - timedelta(days=1),
+            },
+        ]
+        self.pools = [{"name": "pool1", "description": "", "lease_time": 1800}]
+        self.address_types = []
+        super(StatsTest, self).setUp()
+
+        # A second address, which the old joins counted the host twice for.
+        Address.objects.filter(address="192.168.0.11").update(host="ffffff000000")
+
+        wireless = DhcpGroup.objects.create(
+            name=CONFIG.get("STATS_WIRELESS_DHCP_GROUPS")[0],
+            changed_by=self.user_model,
+        )
+        Network.objects.filter(network="192.168.1.0/24").update(dhcp_group=wireless)
+
+        now = timezone.now()
+        dynamic_host = Host.objects.get(pk="ffffff000001")
+        for address, ends, abandoned in [
+            ("192.168.1.10", now + timedelta(hours=1), False),
+            ("192.168.1.11", now - timedelta(hours=1), False),
+            ("192.168.1.12", now - timedelta(hours=1), True),
+        ]:
+            Lease.objects.create(
+                address=Address.objects.get(address=address),
+                host=dynamic_host,
+                starts=now - timedelta(hours=2),
+                ends=ends,
+                abandoned=abandoned,
+            )
+
+        User.objects.filter(pk=self.user_model.pk).update(last_login=now)
+
+    def per_count_stats(self):
+        """The counts as the dashboards queried them one at a time."""
+        now = timezone.now()
+        wireless_networks = Network.objects.filter(
+            dhcp_group__name__in=CONFIG.get("STATS_WIRELESS_DHCP_GROUPS")
+        )
+        wireless_addresses = Address.objects.filter(
+            reduce(
+                operator.or_,
+                [
+                    Q(address__net_contained=network.network)
+                    for network in wireless_networks
+                ],
+            )
+        )
+        return {
+            "hosts": Host.objects.all().count(),
+            "expired_hosts": Host.objects.filter(expires__lte=now).count(),
+            # Distinct, as compute_stats counts each host once.
+            "static_hosts": Host.objects.filter(
+                addresses__isnull=False, expires__gte=now
+            )
+            .distinct()
+            .count(),
+            "dynamic_hosts": Host.objects.filter(pools__isnull=False, expires__gte=now)
+            .distinct()
+            .count(),
+            "active_leases": Lease.objects.filter(ends__gte=now).count(),
+            "abandoned_leases": Lease.objects.filter(abandoned=True).count(),
+            "networks": Network.objects.all().count(),
+            "wireless_networks": wireless_networks.count(),
+            "wireless_addresses": wireless_addresses.count(),
+            "wireless_addresses_available": wireless_addresses.filter(
+                leases__ends__lt=now
+            ).count(),
+            "dns_a_records": DnsRecord.objects.filter(
+                dns_type__name__in=["A", "AAAA"]
+            ).count(),
+            "dns_cname_records": DnsRecord.objects.filter(
+                dns_type__name="CNAME"
+            ).count(),
+            "dns_mx_records": DnsRecord.objects.filter(dns_type__name="MX").count(),
+            "active_users": User.objects.filter(
+                last_login__gte=(now - timedelta(days=365))
+            ).count(),
+        }
+
+    def test_matches_per_count_queries(self):
+        self.assertEqual(compute_stats()["counts"], self.per_count_stats())
+
+    def test_counts(self):
+        counts = compute_stats()["counts"]
+        self.assertEqual(counts["static_hosts"], 1)
+        self.assertEqual(counts["dynamic_hosts"], 1)
+        self.assertEqual(counts["expired_hosts"], 1)
+        self.assertEqual(counts["active_leases"], 1)
+        self.assertEqual(counts["abandoned_leases"], 1)
+        self.assertEqual(counts["wireless_networks"], 1)
+        self.assertEqual(counts["wireless_addresses"], 256)
+        self.assertEqual(counts["wireless_addresses_available"], 2)
+
+
+class StatRollupTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.logins = [now, now, now - timedelta(days=2), now - timedelta(days=60)]
+        for i, last_login in enumerate(self.logins):
+            User.objects.create(username="rollup-%s" % i, last_login=last_login)
+        self.series = StatRollup.objects.series_name(User, "last_login")
+
+    def refresh(self):
+        for period in StatRollup.objects.periods:
+            StatRollup.objects.refresh(User, "last_login", period)
+
+    def logins_since(self, start):
+        return User.objects.filter(last_login__gte=start).count()
+
+    def test_get_series(self):
+        self.assertIsNone(StatRollup.objects.get_series(User, "last_login"))
+        self.refresh()
+        self.assertEqual(StatRollup.objects.get_series(User, "last_login"), self.series)
+        self.assertIsNone(StatRollup.objects.get_series(User, "date_joined"))
+
+    def test_daily_buckets(self):
+        self.refresh()
+
+        since = StatRollup.objects.window_start("day")
+        buckets = StatRollup.objects.filter(series=self.series, period="day")
+        self.assertEqual(
+            sum(buckets.values_list("count", flat=True)), self.logins_since(since)
+        )
+        today = timezone.localtime(timezone.now()).date()
+        self.assertEqual(
+            dict(
+                (timezone.localtime(bucket).date(), count)
+                for bucket, count in buckets.values_list("bucket", "count")
+            )[today],
+            2,
+        )
+
+    def test_totals(self):
+        self.refresh()
+
+        today = timezone.localtime(timezone.now()).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        day = today
+        week = today - timedelta(days=today.weekday())
+        month = today.replace(day=1)
+        self.assertEqual(
+            StatRollup.objects.totals(self.series, day, week, month),
+            [self.logins_since(day), self.logins_since(week), self.logins_since(month)],
+        )
+
+    def test_time_series(self):
+        self.refresh()
+
+        end = timezone.now()
+        days = StatRollup.objects.time_series(self.series, end - timedelta(days=3), end)
+        self.assertEqual(len(days), 4)
+        for day, count in days:
+            self.assertEqual(
+                count,
+                len(
+                    [
+                        last_login
+                        for last_login in self.logins
+                        if timezone.localtime(last_login).date() == day.date()
+                    ]
+                ),
+            )
+
+    def test_refresh_recounts(self):
+        self.refresh()
+        User.objects.filter(username="rollup-0").update(
+            last_login=timezone.now() - timedelta(days=2)
+        )
+        self.refresh()
+
+        today = timezone.localtime(timezone.now()).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.assertEqual(
+            StatRollup.objects.totals(self.series, today, today, today)[0], 1
+        )
+
+    def test_covers(self):
+        now = timezone.now()
+        self.assertTrue(StatRollup.objects.covers(now - timedelta(days=5)))
+        self.assertFalse(StatRollup.objects.covers(now - timedelta(days=60)))